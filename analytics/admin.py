@@ -0,0 +1,28 @@
+from django.contrib import admin
+
+from . import models
+
+
+@admin.register(models.SalesRollupWatermark)
+class SalesRollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ["name", "last_order_id", "updated_at"]
+
+
+@admin.register(models.DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ["date", "revenue", "orders_count", "items_sold"]
+    date_hierarchy = "date"
+
+
+@admin.register(models.DailyCategorySales)
+class DailyCategorySalesAdmin(admin.ModelAdmin):
+    list_display = ["date", "category", "revenue", "items_sold"]
+    list_select_related = ["category"]
+    date_hierarchy = "date"
+
+
+@admin.register(models.DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ["date", "product", "revenue", "items_sold"]
+    list_select_related = ["product"]
+    date_hierarchy = "date"
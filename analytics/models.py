@@ -0,0 +1,52 @@
+from django.db import models
+
+from store.models import Category, Product
+
+
+# the rollup tables are only written by the refresh_sales_rollups task,
+# dashboards read from them so their cost depends on the date range
+# and not on how many orders have been placed
+class SalesRollupWatermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    # id of the last order that was added to the rollups
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_order_id}"
+
+
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date"]
+        verbose_name_plural = "daily sales"
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date"]
+        verbose_name_plural = "daily category sales"
+        # the unique index also serves the date range lookups
+        unique_together = [["date", "category"]]
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date"]
+        verbose_name_plural = "daily product sales"
+        unique_together = [["date", "product"]]
@@ -0,0 +1,185 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from store.models import Order, OrderItem
+from .models import (
+    DailyCategorySales,
+    DailyProductSales,
+    DailySales,
+    SalesRollupWatermark,
+)
+
+WATERMARK_NAME = "sales"
+# orders are only rolled up once they are older than this delay so an order
+# that got a smaller id but committed late is not skipped by the watermark
+SETTLE_DELAY = timedelta(minutes=1)
+BATCH_SIZE = 5000
+
+
+def refresh_sales_rollups(batch_size=BATCH_SIZE):
+    """Add every paid order placed since the watermark to the daily rollups.
+
+    Returns the number of orders processed.
+    """
+    processed = 0
+    while True:
+        count = _process_next_batch(batch_size)
+        if not count:
+            return processed
+        processed += count
+
+
+def _lock_watermark():
+    # lock the watermark so two workers never add the same orders twice
+    SalesRollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    return SalesRollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+
+
+def _process_next_batch(batch_size):
+    cutoff = timezone.now() - SETTLE_DELAY
+
+    with transaction.atomic():
+        watermark = _lock_watermark()
+
+        order_ids = list(
+            Order.objects.filter(id__gt=watermark.last_order_id, placed_at__lte=cutoff)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+
+        # only paid orders are sales, the ones paid later are added by
+        # apply_payment_status_change
+        _add_orders(
+            Order.objects.filter(
+                id__gt=watermark.last_order_id,
+                id__lte=order_ids[-1],
+                payment_status=Order.COMPLETED_PAYMENT_STATUS,
+            )
+        )
+
+        watermark.last_order_id = order_ids[-1]
+        watermark.save(update_fields=["last_order_id", "updated_at"])
+
+    return len(order_ids)
+
+
+def apply_payment_status_change(order, old_status):
+    """Add or remove an order the rollups already went past when it is paid or no longer paid.
+
+    The status has to be saved in a transaction, the one the correction is
+    made in: the watermark lock waits for a running batch, and a batch waits
+    for the change to commit, so no batch counts the order with the status
+    the correction is made for.
+    """
+    completed = Order.COMPLETED_PAYMENT_STATUS
+    if (old_status == completed) != (order.payment_status == completed):
+        _correct_order(order, 1 if order.payment_status == completed else -1)
+
+
+def remove_deleted_order(order):
+    """Remove a paid order the rollups already went past before it is deleted."""
+    if order.payment_status == Order.COMPLETED_PAYMENT_STATUS:
+        _correct_order(order, -1)
+
+
+def _correct_order(order, sign):
+    with transaction.atomic():
+        watermark = _lock_watermark()
+        if order.id > watermark.last_order_id:
+            # added with its current status by the next batch
+            return
+        _add_orders(Order.objects.filter(pk=order.pk), sign)
+
+
+def _add_orders(orders, sign=1):
+    items = OrderItem.objects.filter(order__in=orders).annotate(
+        date=TruncDate("order__placed_at")
+    )
+    revenue = Sum(
+        F("quantity") * F("current_price"),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+    orders_per_day = {
+        row["date"]: row["orders_count"]
+        for row in orders.annotate(date=TruncDate("placed_at"))
+        .values("date")
+        .annotate(orders_count=Count("id"))
+    }
+    daily_rows = {
+        (row["date"],): {
+            "revenue": row["revenue"],
+            "items_sold": row["items_sold"],
+            "orders_count": orders_per_day.pop(row["date"], 0),
+        }
+        for row in items.values("date").annotate(
+            revenue=revenue, items_sold=Sum("quantity")
+        )
+    }
+    # orders without items still count as orders
+    for date, orders_count in orders_per_day.items():
+        daily_rows[(date,)] = {
+            "revenue": 0,
+            "items_sold": 0,
+            "orders_count": orders_count,
+        }
+
+    category_rows = {
+        (row["date"], row["product__category_id"]): {
+            "revenue": row["revenue"],
+            "items_sold": row["items_sold"],
+        }
+        for row in items.values("date", "product__category_id").annotate(
+            revenue=revenue, items_sold=Sum("quantity")
+        )
+    }
+    product_rows = {
+        (row["date"], row["product_id"]): {
+            "revenue": row["revenue"],
+            "items_sold": row["items_sold"],
+        }
+        for row in items.values("date", "product_id").annotate(
+            revenue=revenue, items_sold=Sum("quantity")
+        )
+    }
+
+    _merge(DailySales, ["date"], daily_rows, sign)
+    _merge(DailyCategorySales, ["date", "category_id"], category_rows, sign)
+    _merge(DailyProductSales, ["date", "product_id"], product_rows, sign)
+
+
+def _merge(model, key_fields, rows, sign=1):
+    # add (or subtract with sign=-1) the totals to the existing rollup rows and
+    # create the missing ones, the watermark lock guarantees no one else
+    # writes them meanwhile
+    if not rows:
+        return
+
+    dates = {key[0] for key in rows}
+    existing = {
+        tuple(getattr(obj, field) for field in key_fields): obj
+        for obj in model.objects.filter(date__in=dates)
+    }
+
+    to_update, to_create = [], []
+    for key, values in rows.items():
+        obj = existing.get(key)
+        if obj is None:
+            if sign < 0:
+                # nothing was added, nothing to remove
+                continue
+            to_create.append(model(**dict(zip(key_fields, key)), **values))
+        else:
+            for field, value in values.items():
+                setattr(obj, field, getattr(obj, field) + sign * value)
+            to_update.append(obj)
+
+    value_fields = list(next(iter(rows.values())))
+    model.objects.bulk_update(to_update, value_fields, batch_size=1000)
+    model.objects.bulk_create(to_create, batch_size=1000)
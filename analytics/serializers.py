@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+
+# query params of the sales reports
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+    order_by = serializers.ChoiceField(
+        choices=["revenue", "items_sold"], required=False, default="revenue"
+    )
+
+    def validate(self, attrs):
+        # default to the last 30 days
+        attrs.setdefault("end", timezone.localdate())
+        attrs.setdefault("start", attrs["end"] - timedelta(days=29))
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must be before end.")
+        return attrs
+
+
+class DailySalesSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders_count = serializers.IntegerField()
+    items_sold = serializers.IntegerField()
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    title = serializers.CharField(source="product__title")
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    items_sold = serializers.IntegerField()
+
+
+class CategorySalesSerializer(serializers.Serializer):
+    category_id = serializers.IntegerField()
+    title = serializers.CharField(source="category__title")
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    items_sold = serializers.IntegerField()
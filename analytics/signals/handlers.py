@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from analytics.rollups import apply_payment_status_change, remove_deleted_order
+from store.models import Order
+
+
+# orders the sales rollups already went past are corrected when their
+# payment is completed or fails afterwards (or they are deleted)
+
+@receiver(pre_save, sender=Order)
+def remember_payment_status(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        # a new order, added by the next batch
+        instance._saved_payment_status = None
+    elif update_fields is not None and "payment_status" not in update_fields:
+        instance._saved_payment_status = instance.payment_status
+    else:
+        instance._saved_payment_status = (
+            Order.objects.filter(pk=instance.pk).values_list("payment_status", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def correct_sales_rollups(sender, instance, created, **kwargs):
+    if not created:
+        apply_payment_status_change(instance, instance._saved_payment_status)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_from_sales_rollups(sender, instance, **kwargs):
+    remove_deleted_order(instance)
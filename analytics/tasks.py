@@ -0,0 +1,14 @@
+from celery.utils.log import get_task_logger
+
+from core.task_runs import exclusive_task
+from .rollups import refresh_sales_rollups as refresh_rollups
+
+
+logger = get_task_logger(__name__)
+
+
+@exclusive_task()
+def refresh_sales_rollups():
+    processed = refresh_rollups()
+    logger.info("Added %s orders to the sales rollups", processed)
+    return processed
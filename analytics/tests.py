@@ -0,0 +1,135 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from analytics.models import DailySales, SalesRollupWatermark
+from analytics.rollups import refresh_sales_rollups
+from store.models import Order, OrderItem
+from store.testing import QueryBudgetTestCase
+
+
+class SalesReportQueryBudgetTests(QueryBudgetTestCase):
+    def test_reports(self):
+        refresh_sales_rollups()
+        for report in ["daily", "products", "categories"]:
+            with self.subTest(report=report):
+                self.assertMaxQueries(
+                    1, "GET", f"/analytics/sales/{report}/", self.admin, status=200
+                )
+
+    def test_admin_only(self):
+        for report in ["daily", "products", "categories"]:
+            self.assertStatuses("GET", f"/analytics/sales/{report}/", [401, 403, 200])
+
+
+class SalesRollupTests(QueryBudgetTestCase):
+    # every seeded order has 2 of each of the first 4 products (10, 11, 12
+    # and 13, all in the first category): 92 of revenue and 8 items
+    ORDER_REVENUE = 92
+    ORDER_ITEMS = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = timezone.localdate()
+        cls.days = [today - timedelta(days=2), today - timedelta(days=1)]
+        cls.orders = list(Order.objects.order_by("id"))
+        # half of the orders of each day are paid, the others failed
+        for index, order in enumerate(cls.orders):
+            day = cls.days[index * len(cls.days) // len(cls.orders)]
+            Order.objects.filter(pk=order.pk).update(
+                placed_at=cls.at(day),
+                payment_status=(
+                    Order.COMPLETED_PAYMENT_STATUS if index % 2 == 0 else Order.FAILED_PAYMENT_STATUS
+                ),
+            )
+        cls.paid_per_day = len(cls.orders) // len(cls.days) // 2
+
+    @staticmethod
+    def at(day):
+        return timezone.make_aware(datetime.combine(day, time(12)))
+
+    def get_report(self, report, **params):
+        params = {"start": self.days[0], "end": self.days[-1], **params}
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(f"/analytics/sales/{report}/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_daily(self):
+        return [
+            (row["date"], float(row["revenue"]), row["orders_count"], row["items_sold"])
+            for row in self.get_report("daily")
+        ]
+
+    def expected_daily(self, *paid):
+        return [
+            (str(day), float(count * self.ORDER_REVENUE), count, count * self.ORDER_ITEMS)
+            for day, count in zip(self.days, paid)
+        ]
+
+    def test_only_paid_orders_are_sales(self):
+        self.assertEqual(refresh_sales_rollups(), len(self.orders))
+        self.assertEqual(self.get_daily(), self.expected_daily(self.paid_per_day, self.paid_per_day))
+
+        paid = self.paid_per_day * len(self.days)
+        categories = self.get_report("categories")
+        self.assertEqual(
+            [(row["category_id"], float(row["revenue"]), row["items_sold"]) for row in categories],
+            [(self.categories[0].id, float(paid * self.ORDER_REVENUE), paid * self.ORDER_ITEMS)],
+        )
+
+        products = self.get_report("products", limit=2)
+        self.assertEqual(
+            [(row["product_id"], float(row["revenue"]), row["items_sold"]) for row in products],
+            [
+                (product.id, float(paid * 2 * product.price), paid * 2)
+                for product in [self.products[3], self.products[2]]
+            ],
+        )
+
+    def test_incremental_watermark(self):
+        # in batches, each order once
+        self.assertEqual(refresh_sales_rollups(batch_size=5), len(self.orders))
+        self.assertEqual(refresh_sales_rollups(), 0)
+
+        order = Order.objects.create(
+            customer=self.customer, payment_status=Order.COMPLETED_PAYMENT_STATUS
+        )
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, current_price=10)
+        # not settled yet, a transaction could still commit an order before it
+        self.assertEqual(refresh_sales_rollups(), 0)
+
+        Order.objects.filter(pk=order.pk).update(placed_at=self.at(self.days[-1]))
+        self.assertEqual(refresh_sales_rollups(), 1)
+        self.assertEqual(SalesRollupWatermark.objects.get().last_order_id, order.id)
+        sales = DailySales.objects.get(date=self.days[-1])
+        self.assertEqual(sales.orders_count, self.paid_per_day + 1)
+        self.assertEqual(sales.revenue, self.paid_per_day * self.ORDER_REVENUE + 10)
+
+    def test_payment_status_corrections(self):
+        refresh_sales_rollups()
+        first = Order.objects.get(pk=self.orders[0].pk)
+        second = Order.objects.get(pk=self.orders[-1].pk)
+        # a payment that failed after it was rolled up, one that succeeded on a retry
+        first.payment_status = Order.FAILED_PAYMENT_STATUS
+        first.save()
+        second.payment_status = Order.COMPLETED_PAYMENT_STATUS
+        second.save()
+        # saved again without a change
+        second.save()
+        self.assertEqual(
+            self.get_daily(), self.expected_daily(self.paid_per_day - 1, self.paid_per_day + 1)
+        )
+
+        # not rolled up yet, counted with its status by the next refresh
+        order = Order.objects.create(customer=self.customer)
+        Order.objects.filter(pk=order.pk).update(placed_at=self.at(self.days[0]))
+        order.payment_status = Order.COMPLETED_PAYMENT_STATUS
+        order.save(update_fields=["payment_status"])
+        self.assertEqual(DailySales.objects.get(date=self.days[0]).orders_count, self.paid_per_day - 1)
+        refresh_sales_rollups()
+        self.assertEqual(DailySales.objects.get(date=self.days[0]).orders_count, self.paid_per_day)
+
+        order.delete()
+        self.assertEqual(DailySales.objects.get(date=self.days[0]).orders_count, self.paid_per_day - 1)
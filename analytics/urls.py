@@ -0,0 +1,12 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from analytics import views
+
+
+router = DefaultRouter()
+router.register("sales", views.SalesReportViewSet, basename="sales")
+
+urlpatterns = [
+    path("", include(router.urls)),
+]
@@ -0,0 +1,53 @@
+from django.db.models import Sum
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+
+from .models import DailyCategorySales, DailyProductSales, DailySales
+from .serializers import (
+    CategorySalesSerializer,
+    DailySalesSerializer,
+    ProductSalesSerializer,
+    SalesReportQuerySerializer,
+)
+
+
+# all reports read from the rollup tables, never from OrderItem
+class SalesReportViewSet(ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def get_params(self):
+        serializer = SalesReportQuerySerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @action(detail=False, methods=["get"])
+    def daily(self, request):
+        params = self.get_params()
+        queryset = DailySales.objects.filter(
+            date__range=(params["start"], params["end"])
+        ).values("date", "revenue", "orders_count", "items_sold")
+        return Response(DailySalesSerializer(queryset, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def products(self, request):
+        params = self.get_params()
+        queryset = (
+            DailyProductSales.objects.filter(date__range=(params["start"], params["end"]))
+            .values("product_id", "product__title")
+            .annotate(revenue=Sum("revenue"), items_sold=Sum("items_sold"))
+            .order_by(f"-{params['order_by']}", "product_id")[: params["limit"]]
+        )
+        return Response(ProductSalesSerializer(queryset, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def categories(self, request):
+        params = self.get_params()
+        queryset = (
+            DailyCategorySales.objects.filter(date__range=(params["start"], params["end"]))
+            .values("category_id", "category__title")
+            .annotate(revenue=Sum("revenue"), items_sold=Sum("items_sold"))
+            .order_by(f"-{params['order_by']}", "category_id")
+        )
+        return Response(CategorySalesSerializer(queryset, many=True).data)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from .models import TaskRun, User
 
 
 @admin.register(User)
@@ -40,3 +40,16 @@ class UserAdmin(BaseUserAdmin):
 
     # override the filter side menu
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
+
+
+@admin.register(TaskRun)
+class TaskRunAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'started_at', 'duration', 'queue_wait', 'rows', 'retries')
+    list_filter = ('status', 'task')
+    date_hierarchy = 'started_at'
+    search_fields = ('task_id',)
+    # the runs are only written by the tasks
+    readonly_fields = [field.name for field in TaskRun._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,100 @@
+import pickle
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.db_router import PRIMARY
+
+
+TOKEN_CACHE_KEY = "auth:token:{key}"
+TOKEN_CACHE_TIMEOUT = 60 * 15  # 15 minutes
+# the in-process cache can't be evicted by other processes,
+# so its entries live only a few seconds
+LOCAL_CACHE_SIZE = 1024
+LOCAL_CACHE_TIMEOUT = 10
+
+
+class LocalLRUCache:
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_token_cache = LocalLRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TIMEOUT)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that resolves token -> user from the cache
+    (in-process LRU first, then redis) instead of querying Token join User
+    on every request.
+    """
+
+    def authenticate_credentials(self, key):
+        # keep the pickled token so every request gets its own objects
+        data = local_token_cache.get(key)
+        if data is None:
+            cache_key = TOKEN_CACHE_KEY.format(key=key)
+            data = cache.get(cache_key)
+            if data is None:
+                try:
+                    # from the primary, a token created by a login
+                    # a moment ago may not be on the replicas yet
+                    token = (
+                        self.get_model().objects.using(PRIMARY).select_related("user").get(key=key)
+                    )
+                except self.get_model().DoesNotExist:
+                    raise exceptions.AuthenticationFailed("Invalid token.")
+                data = pickle.dumps(token)
+                cache.set(cache_key, data, TOKEN_CACHE_TIMEOUT)
+            local_token_cache.set(key, data)
+
+        token = pickle.loads(data)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+
+        return (token.user, token)
+
+
+def invalidate_token(key):
+    cache.delete(TOKEN_CACHE_KEY.format(key=key))
+    local_token_cache.delete(key)
+
+
+def invalidate_user_tokens(user):
+    for key in Token.objects.filter(user_id=user.pk).values_list("key", flat=True):
+        invalidate_token(key)
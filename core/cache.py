@@ -0,0 +1,87 @@
+import asyncio
+import weakref
+
+import redis.asyncio
+from django.conf import settings
+from django.core.cache import caches
+from django_redis.cache import RedisCache
+from redis.exceptions import RedisError
+
+from core.metrics import current_request_stats
+
+
+_missing = object()
+
+
+def count_cache_access(hit):
+    # hits and misses of the current request for MetricsMiddleware
+    stats = current_request_stats.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class InstrumentedRedisCache(RedisCache):
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, default=_missing, version=version, client=client)
+        count_cache_access(value is not _missing)
+        return default if value is _missing else value
+
+
+# native asyncio redis client for async views, django's cache.aget() runs
+# the sync client in a thread. Clients are bound to their event loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis():
+    """redis.asyncio client of the default cache, None when the cache is not redis."""
+    if not isinstance(caches["default"], RedisCache):
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        location = settings.CACHES["default"]["LOCATION"]
+        if isinstance(location, (list, tuple)):
+            location = location[0]
+        client = _async_clients[loop] = redis.asyncio.from_url(location)
+    return client
+
+
+async def async_cache_get(key):
+    # raw bytes under the raw key, not shared with the sync cache keys
+    client = get_async_redis()
+    if client is None:
+        value = await caches["default"].aget(key)
+    else:
+        try:
+            value = await client.get(key)
+        except RedisError:
+            value = None
+    count_cache_access(value is not None)
+    return value
+
+
+async def async_cache_set(key, value, timeout):
+    client = get_async_redis()
+    if client is None:
+        await caches["default"].aset(key, value, timeout)
+        return
+    try:
+        await client.set(key, value, ex=timeout)
+    except RedisError:
+        pass
+
+
+async def async_cache_get_int(key):
+    # an integer set through django's cache (ex: a version), django_redis
+    # stores integers unpickled under the prefixed key so it can be read raw
+    client = get_async_redis()
+    if client is None:
+        return await caches["default"].aget(key)
+    try:
+        value = await client.get(caches["default"].make_key(key))
+    except RedisError:
+        return None
+    return None if value is None else int(value)
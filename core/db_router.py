@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+PRIMARY = "default"
+# a replica that failed to connect is skipped for this long
+UNHEALTHY_SECONDS = 30
+
+# reads go to the primary while set: for the whole of a write request and,
+# for a client that just wrote, until it can see its own writes on a replica
+pin_primary = ContextVar("pin_primary", default=False)
+# set by the views whose reads can lag a little (use_replica), every other
+# read (tasks, commands, sessions, auth...) goes to the primary
+replica_reads = ContextVar("replica_reads", default=None)
+
+_unhealthy_until = {}
+_unhealthy_lock = threading.Lock()
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+
+def mark_unhealthy(alias):
+    with _unhealthy_lock:
+        _unhealthy_until[alias] = time.monotonic() + UNHEALTHY_SECONDS
+
+
+def is_healthy(alias):
+    until = _unhealthy_until.get(alias)
+    return until is None or until < time.monotonic()
+
+
+def check_connection(alias):
+    # opens the connection the query would open anyway, a no-op once open
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        mark_unhealthy(alias)
+        return False
+    return True
+
+
+class ReplicaReads:
+    # the replica of a request, picked on its first read so that every
+    # query of the response sees the same replica
+    def __init__(self):
+        self.alias = None
+        self.picked = False
+
+    def get_alias(self):
+        if not self.picked:
+            self.alias = pick_replica()
+            self.picked = True
+        return self.alias
+
+
+def pick_replica():
+    """A random healthy replica, None when they are all down."""
+    replicas = [alias for alias in get_replicas() if is_healthy(alias)]
+    random.shuffle(replicas)
+    for alias in replicas:
+        if check_connection(alias):
+            return alias
+    return None
+
+
+@contextmanager
+def use_replica():
+    """Send the reads of the block to a replica, see ReplicaRouter."""
+    token = replica_reads.set(ReplicaReads())
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send the reads made inside use_replica() (the catalog, reviews,
+    favorites and order history views) to one healthy replica per request,
+    and every other query, writes, select_for_update() (a write query for
+    django) and anything inside a transaction to the primary. Without
+    replicas in DATABASES every query goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        reads = replica_reads.get()
+        if reads is None or pin_primary.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        # every replica is down, fail over to the primary
+        return reads.get_alias() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,160 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework import serializers
+
+from core.models import User
+from core.serializers import check_phone_number
+from store.models import Customer
+
+
+USER_FIELDS = ["first_name", "last_name", "email"]
+
+
+def init_worker():
+    # needed when the pool spawns instead of forking (ex: macOS)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+    django.setup()
+
+
+def hash_password(password):
+    # empty passwords get an unusable password like set_unusable_password()
+    return make_password(password or None)
+
+
+def clean_user_fields(row):
+    # the lengths and the email format, postgres would reject the whole batch
+    values = {}
+    for name in USER_FIELDS:
+        value = str(row.get(name) or "")
+        User._meta.get_field(name).run_validators(value)
+        values[name] = value
+    return values
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV (with a header row) or JSON lines file with the "
+        "fields phone_number, password, first_name, last_name and email. "
+        "Use - to read from stdin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="number of processes used to hash the passwords",
+        )
+
+    def handle(self, path, format, batch_size, workers, **options):
+        format = format or ("jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+        self.created = self.existing = self.invalid = 0
+
+        file = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        with file, ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            rows = self.read_rows(file, format)
+            while batch := list(islice(rows, batch_size)):
+                self.import_batch(batch, pool, workers)
+                self.stdout.write(f"Imported {self.created} users...")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.created} users, skipped {self.existing} existing "
+                f"and {self.invalid} invalid rows."
+            )
+        )
+
+    def read_rows(self, file, format):
+        if format == "csv":
+            reader = csv.DictReader(file)
+            if "phone_number" not in (reader.fieldnames or []):
+                raise CommandError("The CSV header must contain phone_number.")
+            # line 1 is the header
+            yield from enumerate(reader, start=2)
+        else:
+            for line_number, line in enumerate(file, start=1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        self.report_invalid(line_number, "invalid JSON")
+                        continue
+                    if isinstance(row, dict):
+                        yield line_number, row
+                    else:
+                        self.report_invalid(line_number, "not a JSON object")
+
+    def report_invalid(self, line_number, reason):
+        self.invalid += 1
+        self.stderr.write(f"line {line_number}: {reason}")
+
+    def import_batch(self, batch, pool, workers):
+        # validate the rows, normalize the phone numbers and drop duplicates inside the batch
+        rows = {}
+        for line_number, row in batch:
+            try:
+                phone_number = check_phone_number(str(row.get("phone_number") or ""))
+                fields = clean_user_fields(row)
+            except serializers.ValidationError as error:
+                self.report_invalid(line_number, error.detail[0])
+                continue
+            except ValidationError as error:
+                self.report_invalid(line_number, error.messages[0])
+                continue
+            if phone_number in rows:
+                self.report_invalid(line_number, f"duplicate phone number {phone_number}")
+                continue
+            rows[phone_number] = (str(row.get("password") or ""), fields)
+
+        existing = set(
+            User.objects.filter(phone_number__in=rows).values_list("phone_number", flat=True)
+        )
+        self.existing += len(existing)
+        rows = {phone: row for phone, row in rows.items() if phone not in existing}
+        if not rows:
+            return
+
+        # password hashing is the slow part, run it on all the cpus
+        passwords = pool.map(
+            hash_password,
+            [password for password, _ in rows.values()],
+            chunksize=max(1, len(rows) // (workers * 4)),
+        )
+        users = [
+            User(phone_number=phone_number, password=password, **fields)
+            for (phone_number, (_, fields)), password in zip(rows.items(), passwords)
+        ]
+
+        with transaction.atomic():
+            # a user registered since the check above is skipped instead of
+            # an IntegrityError ending the import
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            # the ids are not returned with ignore_conflicts, the users of this
+            # batch are the ones with its passwords (salted, so unique)
+            hashes = {user.phone_number: user.password for user in users}
+            created = [
+                user
+                for user in User.objects.filter(phone_number__in=hashes).only(
+                    "phone_number", "password", "is_staff"
+                )
+                if hashes[user.phone_number] == user.password
+            ]
+            # same as the create_customer_for_new_not_admin_user signal handler
+            Customer.objects.bulk_create(
+                [Customer(user=user) for user in created if not user.is_staff]
+            )
+        self.created += len(created)
+        self.existing += len(users) - len(created)
@@ -0,0 +1,97 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+
+HASH_LENGTH = 12
+# store/images/products/shoe.3f2a9c1b7e4d.jpg
+HASHED_NAME = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}\.[^./]+$")
+# a hashed name always has the same bytes
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MAX_AGE = 60 * 60
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Save uploads under a name with a hash of their content, so a url can be
+    cached forever by the clients and the proxies, and the same file
+    uploaded twice is only stored once.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        root, ext = os.path.splitext(name)
+        suffix = f".{digest.hexdigest()[:HASH_LENGTH]}{ext}"
+        if max_length is not None:
+            root = root[:max_length - len(suffix)]
+        name = f"{root}{suffix}"
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+def get_media_path(name):
+    """Absolute path of a media file, Http404 outside MEDIA_ROOT or missing."""
+    name = posixpath.normpath(name).lstrip("/")
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path.")
+    if not os.path.isfile(path):
+        raise Http404("No media matches the given path.")
+    return name, path
+
+
+def sendfile(request, name, private=False):
+    """
+    Respond with a media file without reading it in Python: the front-end
+    server sends it when MEDIA_SENDFILE_BACKEND is set (nginx X-Accel-Redirect,
+    Apache/lighttpd X-Sendfile), otherwise FileResponse hands the open file
+    to the WSGI server's file_wrapper (os.sendfile with gunicorn).
+    """
+    name, path = get_media_path(name)
+    stat = os.stat(path)
+    if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or "application/octet-stream"
+        backend = settings.MEDIA_SENDFILE_BACKEND
+        if backend == "x-accel-redirect":
+            response = HttpResponse(content_type=content_type)
+            # an internal nginx location with an alias to MEDIA_ROOT
+            response["X-Accel-Redirect"] = quote(f"{settings.MEDIA_ACCEL_REDIRECT_URL}{name}")
+        elif backend == "x-sendfile":
+            response = HttpResponse(content_type=content_type)
+            response["X-Sendfile"] = path
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        response["Last-Modified"] = http_date(stat.st_mtime)
+
+    cache_control = {"private" if private else "public": True}
+    if HASHED_NAME.search(name):
+        cache_control.update(max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        cache_control.update(max_age=MAX_AGE)
+    patch_cache_control(response, **cache_control)
+    return response
@@ -0,0 +1,80 @@
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Histogram
+
+
+LABELS = ["route", "method"]
+
+REQUESTS = Counter(
+    "http_requests_total", "Number of HTTP requests", LABELS + ["status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", LABELS
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries executed per HTTP request",
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, float("inf")),
+)
+DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in the database per HTTP request",
+    LABELS,
+)
+CACHE_HITS = Counter("http_request_cache_hits_total", "Cache hits", LABELS)
+CACHE_MISSES = Counter("http_request_cache_misses_total", "Cache misses", LABELS)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size",
+    LABELS,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float("inf")),
+)
+
+TASK_LABELS = ["task"]
+
+TASK_RUNS = Counter(
+    "celery_task_runs_total", "Number of celery task runs", TASK_LABELS + ["status"]
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task run duration",
+    TASK_LABELS,
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, float("inf")),
+)
+TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time between publishing a celery task and the start of its run",
+    TASK_LABELS,
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600, float("inf")),
+)
+TASK_ROWS = Counter(
+    "celery_task_rows_total", "Rows affected by celery tasks", TASK_LABELS
+)
+TASK_RETRIES = Counter(
+    "celery_task_retries_total", "Celery task retries", TASK_LABELS
+)
+
+RESPONSE_CACHE_RECOMPUTE = Histogram(
+    "response_cache_recompute_seconds",
+    "Time to rebuild a cached DRF response, by view and reason (miss, invalidated, expired, early)",
+    ["view", "reason"],
+)
+RESPONSE_CACHE_STALE = Counter(
+    "response_cache_stale_total",
+    "Stale cached responses served while another worker rebuilds them",
+    ["view"],
+)
+
+
+class RequestStats:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_duration = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+# stats of the request handled by the current thread/task,
+# None outside of a request (ex: celery tasks, shell)
+current_request_stats = ContextVar("current_request_stats", default=None)
@@ -0,0 +1,225 @@
+import math
+import time
+from hashlib import sha256
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from core.db_router import get_replicas, pin_primary
+from core.metrics import (
+    CACHE_HITS,
+    CACHE_MISSES,
+    DB_DURATION,
+    DB_QUERIES,
+    REQUEST_LATENCY,
+    REQUESTS,
+    RESPONSE_SIZE,
+    RequestStats,
+    current_request_stats,
+)
+
+
+class QueryTimer:
+    # connection.execute_wrapper() that counts and times every query
+    # of the current request, installed once on every connection
+    # (connections are per thread, under ASGI the queries don't run
+    # in the thread of the middleware, the context variable follows them)
+    def __call__(self, execute, sql, params, many, context):
+        stats = current_request_stats.get()
+        if stats is None:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.db_queries += 1
+            stats.db_duration += time.perf_counter() - start
+
+
+query_timer = QueryTimer()
+
+
+class MetricsMiddleware:
+    """Export latency, db queries, cache hits and response size per route."""
+
+    # both, so ASGI requests to async views don't hop to a thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, stats, duration):
+        # use the url name so /products/1/ and /products/2/ share a label
+        match = request.resolver_match
+        labels = {
+            "route": match.view_name if match else "unresolved",
+            "method": request.method,
+        }
+        REQUESTS.labels(status=response.status_code, **labels).inc()
+        REQUEST_LATENCY.labels(**labels).observe(duration)
+        DB_QUERIES.labels(**labels).observe(stats.db_queries)
+        DB_DURATION.labels(**labels).observe(stats.db_duration)
+        if stats.cache_hits:
+            CACHE_HITS.labels(**labels).inc(stats.cache_hits)
+        if stats.cache_misses:
+            CACHE_MISSES.labels(**labels).inc(stats.cache_misses)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(**labels).observe(len(response.content))
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise is sync only, which would put every ASGI request through a thread."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class PrimaryPinningMiddleware:
+    """
+    Read-your-writes for core.db_router.ReplicaRouter: a write request reads
+    from the primary, and so does its client for REPLICA_PIN_SECONDS after,
+    while the replicas catch up. Browsers are recognized by a cookie, API
+    clients by a cache marker on their Authorization header.
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = "pin_primary"
+    cache_key = "db:pin:{key}"
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.timeout = settings.REPLICA_PIN_SECONDS
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def get_marker_key(self, request):
+        authorization = request.headers.get("Authorization")
+        if authorization:
+            return self.cache_key.format(key=sha256(authorization.encode()).hexdigest())
+        return None
+
+    def is_write(self, request):
+        return request.method not in ("GET", "HEAD", "OPTIONS")
+
+    def set_pin(self, response):
+        response.set_cookie(
+            self.cookie_name, "1", max_age=self.timeout, httponly=True, samesite="Lax"
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        marker_key = self.get_marker_key(request)
+        pinned = (
+            self.is_write(request)
+            or self.cookie_name in request.COOKIES
+            or (marker_key is not None and cache.get(marker_key) is not None)
+        )
+        token = pin_primary.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            pin_primary.reset(token)
+        if self.is_write(request):
+            self.set_pin(response)
+            if marker_key is not None:
+                cache.set(marker_key, 1, self.timeout)
+        return response
+
+    async def __acall__(self, request):
+        marker_key = self.get_marker_key(request)
+        pinned = (
+            self.is_write(request)
+            or self.cookie_name in request.COOKIES
+            or (marker_key is not None and await cache.aget(marker_key) is not None)
+        )
+        token = pin_primary.set(pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            pin_primary.reset(token)
+        if self.is_write(request):
+            self.set_pin(response)
+            if marker_key is not None:
+                await cache.aset(marker_key, 1, self.timeout)
+        return response
+
+
+class RateLimitHeadersMiddleware:
+    """RateLimit-* headers of the requests checked by core.throttling.SlidingWindowThrottle."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(request, await self.get_response(request))
+
+    def add_headers(self, request, response):
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit is not None:
+            response["RateLimit-Limit"] = rate_limit.limit
+            response["RateLimit-Remaining"] = rate_limit.remaining
+            response["RateLimit-Reset"] = math.ceil(rate_limit.reset)
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0002_user_date_joined_alter_user_last_login'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['first_name', 'last_name'], name='core_user_name'),
+        ),
+    ]
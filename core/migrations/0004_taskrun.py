@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_user_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=255)),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('SUCCESS', 'Success'), ('FAILURE', 'Failure'), ('RETRY', 'Retry'), ('SKIPPED', 'Skipped')], max_length=10)),
+                ('started_at', models.DateTimeField()),
+                ('duration', models.FloatField()),
+                ('queue_wait', models.FloatField(blank=True, null=True)),
+                ('rows', models.BigIntegerField(blank=True, null=True)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['task', '-started_at'], name='core_taskrun_task_started')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:10
+
+from django.contrib.postgres.indexes import OpClass
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+# indexes of the CustomerAdmin name search (istartswith is
+# UPPER(name) LIKE UPPER('prefix%') on PostgreSQL, which needs the pattern
+# operator class), PostgreSQL only so they aren't declared on the model
+def get_indexes():
+    return [
+        models.Index(OpClass(Upper(field), name='text_pattern_ops'), name=f'core_user_{field}_prefix')
+        for field in ['first_name', 'last_name']
+    ]
+
+
+def add_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for index in get_indexes():
+            schema_editor.add_index(apps.get_model('core', 'User'), index, concurrently=True)
+
+
+def remove_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for index in get_indexes():
+            schema_editor.remove_index(apps.get_model('core', 'User'), index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_taskrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_prefix_indexes, remove_prefix_indexes),
+    ]
@@ -71,4 +71,48 @@ class User(AbstractBaseUser, PermissionsMixin):
     def has_module_perms(self, app_label):
         return self.is_superuser
 
+    class Meta:
+        indexes = [
+            # Customer.Meta.ordering sorts by the user's name
+            models.Index(fields=['first_name', 'last_name'], name='core_user_name'),
+        ]
+        # + core_user_first_name_prefix and core_user_last_name_prefix for the
+        # admin's name search, created on PostgreSQL only by migration 0005
+
+
+# one row per execution of a celery task, written by the task signal handlers
+# (core.signals.handlers) so slow or overlapping maintenance jobs show up
+# in the admin
+class TaskRun(models.Model):
+    SUCCESS_STATUS = 'SUCCESS'
+    FAILURE_STATUS = 'FAILURE'
+    RETRY_STATUS = 'RETRY'
+    # another run of the task held its lock
+    SKIPPED_STATUS = 'SKIPPED'
+    STATUS_CHOICES = [
+        (SUCCESS_STATUS, 'Success'),
+        (FAILURE_STATUS, 'Failure'),
+        (RETRY_STATUS, 'Retry'),
+        (SKIPPED_STATUS, 'Skipped'),
+    ]
+    task = models.CharField(max_length=255)
+    task_id = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    started_at = models.DateTimeField()
+    # seconds
+    duration = models.FloatField()
+    # seconds between publishing (or the eta) and the start, unknown for eager runs
+    queue_wait = models.FloatField(null=True, blank=True)
+    # rows affected, returned by the task
+    rows = models.BigIntegerField(null=True, blank=True)
+    retries = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
 
+    def __str__(self):
+        return f'{self.task} {self.status} at {self.started_at}'
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['task', '-started_at'], name='core_taskrun_task_started'),
+        ]
@@ -0,0 +1,67 @@
+import json
+
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def explain_plan(queryset, analyze=False):
+    """
+    The root node of the PostgreSQL JSON plan of a queryset. Run as a raw
+    EXPLAIN: psycopg decodes the json column, which QuerySet.explain()
+    dumps back element by element into a string that isn't the plan list.
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+        output = cursor.fetchone()[0]
+    # a driver without json decoding returns the text
+    if isinstance(output, str):
+        output = json.loads(output)
+    return output[0]["Plan"]
+
+
+def estimate_count(queryset):
+    """
+    The PostgreSQL planner's estimate of the rows of a queryset, None on
+    other databases or when the table was never analyzed.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    if not queryset.query.where:
+        # the whole table, kept up to date by autovacuum/ANALYZE
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 until the first ANALYZE
+        return row[0] if row and row[0] >= 0 else None
+    try:
+        return explain_plan(queryset.order_by())["Plan Rows"]
+    except EmptyResultSet:
+        # ex: an __in lookup with an empty list, never sent to the database
+        return 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin changelist paginator without a COUNT(*) of a large table: above
+    estimate_threshold rows the count is the planner's estimate, so the
+    number of pages is approximate. Set show_full_result_count = False on
+    the admin as well, or the changelist counts the whole table itself.
+    """
+
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.estimate_threshold:
+            return super().count
+        return estimate
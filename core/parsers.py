@@ -0,0 +1,22 @@
+import io
+
+import orjson
+from rest_framework.parsers import JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser with orjson for UTF-8 bodies, other charsets and invalid
+    bodies go through JSONParser so the error messages don't change.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        content = stream.read()
+        if encoding.lower().replace('_', '-') in ('utf-8', 'utf8'):
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(content), media_type, parser_context)
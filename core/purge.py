@@ -0,0 +1,97 @@
+import logging
+from functools import partial
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django_redis import get_redis_connection
+from django_redis.cache import RedisCache
+from kombu.exceptions import OperationalError
+
+
+logger = logging.getLogger(__name__)
+
+# Surrogate keys to purge from the CDN are collected in a redis set, so a key
+# changed many times (ex: by a price run) is only sent once, and a single
+# delayed task sends everything collected meanwhile in CDN_PURGE_BATCH_SIZE
+# batches to CDN_PURGE_URL.
+PENDING_KEY = "cdn:purge:pending"
+SCHEDULED_KEY = "cdn:purge:scheduled"
+
+
+def set_surrogate_keys(response, keys):
+    # Surrogate-Key for Fastly and Varnish (xkey), Cache-Tag for Cloudflare
+    keys = sorted(set(keys))
+    response["Surrogate-Key"] = " ".join(keys)
+    response["Cache-Tag"] = ",".join(keys)
+
+
+def purge(keys):
+    """Purge the cached responses tagged with keys once the transaction commits."""
+    keys = set(keys)
+    if settings.CDN_PURGE_URL and keys:
+        transaction.on_commit(partial(queue_purge, keys))
+
+
+def has_redis():
+    return isinstance(caches["default"], RedisCache)
+
+
+def add_pending(keys):
+    cache = caches["default"]
+    if has_redis():
+        get_redis_connection("default").sadd(cache.make_key(PENDING_KEY), *keys)
+        return
+    # without redis (tests, local dev), not atomic
+    cache.set(PENDING_KEY, cache.get(PENDING_KEY, set()) | set(keys), timeout=None)
+
+
+def pop_pending(count):
+    cache = caches["default"]
+    if has_redis():
+        keys = get_redis_connection("default").spop(cache.make_key(PENDING_KEY), count)
+        return sorted(key.decode() for key in keys)
+    keys = sorted(cache.get(PENDING_KEY, set()))
+    cache.set(PENDING_KEY, set(keys[count:]), timeout=None)
+    return keys[:count]
+
+
+def queue_purge(keys):
+    from core.tasks import purge_cdn_keys
+
+    add_pending(keys)
+    delay = settings.CDN_PURGE_DELAY
+    # the first purge of a window schedules the task, the next ones join it
+    if caches["default"].add(SCHEDULED_KEY, 1, timeout=delay + 60):
+        try:
+            purge_cdn_keys.apply_async(countdown=delay)
+        except OperationalError:
+            # the keys stay pending for the next purge
+            caches["default"].delete(SCHEDULED_KEY)
+            logger.warning("Could not schedule the CDN purge", exc_info=True)
+
+
+def send_purge(keys):
+    response = requests.post(
+        settings.CDN_PURGE_URL,
+        json={settings.CDN_PURGE_FIELD: keys},
+        headers=settings.CDN_PURGE_HEADERS,
+        timeout=settings.CDN_PURGE_TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+def send_pending():
+    """Send every pending key to the purge endpoint, returns how many were sent."""
+    # the keys purged from now on schedule another run
+    caches["default"].delete(SCHEDULED_KEY)
+    sent = 0
+    while keys := pop_pending(settings.CDN_PURGE_BATCH_SIZE):
+        try:
+            send_purge(keys)
+        except requests.RequestException:
+            add_pending(keys)
+            raise
+        sent += len(keys)
+    return sent
@@ -0,0 +1,158 @@
+import math
+import random
+import time
+from uuid import uuid4
+
+from django.http import HttpResponse
+from rest_framework_extensions.cache.decorators import CacheResponse
+from rest_framework_extensions.cache.mixins import BaseCacheResponseMixin
+
+from core.metrics import RESPONSE_CACHE_RECOMPUTE, RESPONSE_CACHE_STALE
+
+
+# not in core.cache: drf-extensions resolves the default cache when its
+# mixins are imported, which would import the cache backend module again
+
+
+class StampedeCacheResponse(CacheResponse):
+    """
+    drf-extensions' cache_response without the stampede when a popular entry
+    expires: an entry is fresh for `timeout` seconds and then kept as a stale
+    copy for `stale_timeout` more (timeout by default). One worker, holding a
+    short lock, rebuilds an expired entry while the others serve the stale
+    copy. Entries are also rebuilt a little early, more likely the closer
+    they are to expiring and the longer they took to build (XFetch), so the
+    popular ones rarely expire at all.
+
+    version_func, the name of a view method, returns the version of the data
+    an entry is built from, an entry of another version is stale: entries
+    invalidated by a version change don't all miss at once.
+    """
+
+    lock_timeout = 10
+    # a missing entry being built by another worker is waited for this long
+    wait_timeout = 1
+    wait_interval = 0.05
+    beta = 1.0
+
+    def __init__(self, *args, stale_timeout=None, version_func=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stale_timeout = stale_timeout
+        self.version_func = version_func
+
+    def calculate_timeout(self, view_instance, **_):
+        # the decorator is shared by the views of a mixin, don't keep the value
+        if isinstance(self.timeout, str):
+            return getattr(view_instance, self.timeout)
+        return self.timeout
+
+    def calculate_version(self, view_instance, request, args, kwargs):
+        if self.version_func is None:
+            return None
+        return getattr(view_instance, self.version_func)(request, *args, **kwargs)
+
+    def should_refresh(self, entry):
+        _, _, _, expires_at, duration, _ = entry
+        return time.time() - duration * self.beta * math.log(1 - random.random()) >= expires_at
+
+    def process_cache_response(self, view_instance, view_method, request, args, kwargs):
+        key = "swr:" + self.calculate_key(
+            view_instance=view_instance,
+            view_method=view_method,
+            request=request,
+            args=args,
+            kwargs=kwargs,
+        )
+        view = f"{type(view_instance).__name__}.{view_method.__name__}"
+        version = self.calculate_version(view_instance, request, args, kwargs)
+
+        entry = self.cache.get(key)
+        if entry is not None and entry[5] == version and not self.should_refresh(entry):
+            return self.build_response(entry)
+
+        lock_key = f"{key}:lock"
+        lock_token = uuid4().hex
+        if not self.cache.add(lock_key, lock_token, self.lock_timeout):
+            # another worker is rebuilding it
+            if entry is not None:
+                RESPONSE_CACHE_STALE.labels(view).inc()
+                return self.build_response(entry)
+            entry = self.wait_for_entry(key)
+            if entry is not None:
+                return self.build_response(entry)
+            return self.rebuild(key, view, "miss", version, view_instance, view_method, request, args, kwargs)
+
+        if entry is None:
+            reason = "miss"
+        elif entry[5] != version:
+            reason = "invalidated"
+        elif time.time() >= entry[3]:
+            reason = "expired"
+        else:
+            reason = "early"
+        try:
+            return self.rebuild(key, view, reason, version, view_instance, view_method, request, args, kwargs)
+        finally:
+            if self.cache.get(lock_key) == lock_token:
+                self.cache.delete(lock_key)
+
+    def wait_for_entry(self, key):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+    def rebuild(self, key, view, reason, version, view_instance, view_method, request, args, kwargs):
+        started = time.perf_counter()
+        response = view_method(view_instance, request, *args, **kwargs)
+        response = view_instance.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        duration = time.perf_counter() - started
+        RESPONSE_CACHE_RECOMPUTE.labels(view, reason).observe(duration)
+
+        if response.status_code < 400 or self.cache_errors:
+            timeout = self.calculate_timeout(view_instance=view_instance)
+            stale_timeout = timeout if self.stale_timeout is None else self.stale_timeout
+            headers = {k: (k, v) for k, v in response.items()}
+            entry = (
+                response.rendered_content, response.status_code, headers,
+                time.time() + timeout, duration, version,
+            )
+            self.cache.set(key, entry, timeout + stale_timeout)
+        return response
+
+    def build_response(self, entry):
+        content, status, headers, _, _, _ = entry
+        response = HttpResponse(content=content, status=status)
+        for name, value in headers.values():
+            response[name] = value
+        response._closable_objects = []
+        return response
+
+
+stampede_cache_response = StampedeCacheResponse
+
+
+class StampedeCacheResponseMixin(BaseCacheResponseMixin):
+    """CacheResponseMixin with StampedeCacheResponse."""
+
+    def get_list_cache_version(self, request, *args, **kwargs):
+        return None
+
+    def get_object_cache_version(self, request, *args, **kwargs):
+        return None
+
+    @stampede_cache_response(
+        key_func="list_cache_key_func", timeout="list_cache_timeout", version_func="get_list_cache_version"
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @stampede_cache_response(
+        key_func="object_cache_key_func", timeout="object_cache_timeout", version_func="get_object_cache_version"
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -21,6 +21,12 @@ class TokenMixin(serializers.Serializer):
     token = serializers.SerializerMethodField()
 
     def get_token(self, user: User):
+        # reuse the token we already have: the one that authenticated the
+        # request or the one the login response is serializing
+        request = self.context.get('request')
+        for token in (getattr(request, 'auth', None), getattr(self.parent, 'instance', None)):
+            if isinstance(token, Token) and token.user_id == user.pk:
+                return token.key
         token, created = Token.objects.get_or_create(user=user)
         return token.key
 
@@ -0,0 +1,62 @@
+import time
+from functools import partial
+
+from celery.signals import before_task_publish, task_postrun, task_prerun, task_retry
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_token, invalidate_user_tokens
+from core.middleware import query_timer
+from core.task_runs import PUBLISHED_AT_HEADER, count_retry, finish_run, start_run
+
+
+# the cached token authentication keeps a copy of the user,
+# drop it when the user changes (password, phone number, deactivation, etc).
+# After the commit: a request reading the user before it would cache the old
+# one again, and a rolled back change has nothing to drop
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_tokens_of_changed_user(sender, instance, created, update_fields, **kwargs):
+    # logging in only updates last_login
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    transaction.on_commit(partial(invalidate_user_tokens, instance))
+
+
+# logout and user deletion
+@receiver(post_delete, sender=Token)
+def invalidate_cached_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_token, instance.key))
+
+
+# count and time the queries of every request for MetricsMiddleware,
+# the wrappers survive reconnects so only add it once per connection
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+# queue wait of the tasks, the header is copied to task.request by the worker
+@before_task_publish.connect
+def add_published_at_header(headers, **kwargs):
+    headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+# duration, rows, retries and history (TaskRun) of every task run
+@task_prerun.connect
+def start_task_run(task, **kwargs):
+    start_run(task)
+
+
+@task_postrun.connect
+def finish_task_run(task, retval, state, **kwargs):
+    finish_run(task, state, retval)
+
+
+@task_retry.connect
+def count_task_retry(sender, **kwargs):
+    count_retry(sender)
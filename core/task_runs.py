@@ -0,0 +1,104 @@
+import time
+from datetime import datetime
+from functools import wraps
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils import timezone
+
+from core.metrics import TASK_DURATION, TASK_QUEUE_WAIT, TASK_RETRIES, TASK_ROWS, TASK_RUNS
+from core.models import TaskRun
+
+
+logger = get_task_logger(__name__)
+
+# message header set when a task is published, see core.signals.handlers
+PUBLISHED_AT_HEADER = "published_at"
+LOCK_KEY = "task:lock:{name}"
+
+
+def exclusive_task(lock_timeout=60 * 60, **options):
+    """
+    shared_task that skips its run while another run of the same task holds
+    the lock, ex: a beat schedule firing again before a long run finished.
+    The lock expires after lock_timeout seconds in case a worker is killed,
+    keep it above the longest expected run.
+    """
+
+    def decorator(func):
+        @shared_task(bind=True, **options)
+        @wraps(func)
+        def task(self, *args, **kwargs):
+            lock_key = LOCK_KEY.format(name=self.name)
+            owner = self.request.id or "eager"
+            if not cache.add(lock_key, owner, timeout=lock_timeout):
+                logger.warning("Skipped %s, another run is in progress", self.name)
+                self.request.skipped = True
+                return None
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # the lock may have expired and been taken by another run
+                if cache.get(lock_key) == owner:
+                    cache.delete(lock_key)
+
+        return task
+
+    return decorator
+
+
+def get_queue_wait(request, now):
+    published_at = getattr(request, PUBLISHED_AT_HEADER, None)
+    if published_at is None:
+        return None
+    waiting_since = published_at
+    # a countdown/eta task only starts waiting at its eta
+    if request.eta:
+        eta = request.eta if isinstance(request.eta, datetime) else datetime.fromisoformat(request.eta)
+        waiting_since = max(waiting_since, eta.timestamp())
+    return max(now - waiting_since, 0.0)
+
+
+def start_run(task):
+    task.request.run_started_at = timezone.now()
+    task.request.run_started = time.perf_counter()
+    task.request.queue_wait = get_queue_wait(task.request, time.time())
+
+
+def finish_run(task, state, retval):
+    """Record a run in the metrics and the TaskRun table."""
+    request = task.request
+    if not hasattr(request, "run_started"):
+        return
+    duration = time.perf_counter() - request.run_started
+    status = TaskRun.SKIPPED_STATUS if getattr(request, "skipped", False) else state
+    rows = retval if isinstance(retval, int) and not isinstance(retval, bool) else None
+
+    TASK_RUNS.labels(task.name, status).inc()
+    TASK_DURATION.labels(task.name).observe(duration)
+    if request.queue_wait is not None:
+        TASK_QUEUE_WAIT.labels(task.name).observe(request.queue_wait)
+    if rows:
+        TASK_ROWS.labels(task.name).inc(rows)
+
+    try:
+        TaskRun.objects.create(
+            task=task.name,
+            task_id=request.id or "",
+            status=status,
+            started_at=request.run_started_at,
+            duration=duration,
+            queue_wait=request.queue_wait,
+            rows=rows,
+            retries=request.retries or 0,
+            error=f"{type(retval).__name__}: {retval}" if isinstance(retval, BaseException) else "",
+        )
+    except DatabaseError:
+        # the history must never fail a task
+        logger.exception("Could not record the run of %s", task.name)
+
+
+def count_retry(task):
+    TASK_RETRIES.labels(task.name).inc()
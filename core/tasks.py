@@ -0,0 +1,20 @@
+import requests
+from celery import shared_task
+from celery.utils.log import get_task_logger
+
+from . import purge
+
+
+logger = get_task_logger(__name__)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def purge_cdn_keys(self):
+    # scheduled by core.purge.queue_purge, the keys that couldn't be sent
+    # stay pending for the retry
+    try:
+        sent = purge.send_pending()
+    except requests.RequestException as exc:
+        raise self.retry(exc=exc)
+    logger.info("Purged %s surrogate keys from the CDN", sent)
+    return sent
@@ -1,3 +1,425 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from uuid import uuid4
 
-# Create your tests here.
+import msgpack
+from django.core.management import call_command
+from django.core.cache import cache
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from core.db_router import ReplicaRouter, pin_primary, use_replica
+from core.management.commands import import_users
+from core.models import User
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+from store.models import Customer, Product
+from store.testing import QueryBudgetTestCase
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertListMaxQueries(1, "/auth/users/", self.user)
+        self.assertListMaxQueries(1, "/auth/users/", self.admin)
+
+    def test_login(self):
+        # user + token get_or_create + last_login + merge of the session cart
+        self.assertMaxQueries(
+            8,
+            "POST",
+            "/auth/token/login/",
+            data={"phone_number": self.user.phone_number, "password": "password"},
+            status=status.HTTP_200_OK,
+        )
+
+    def test_me_with_cached_token(self):
+        token = Token.objects.create(user=self.user)
+        header = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        # token join user, then served from the cache and the token is reused
+        # by the serializer instead of get_or_create
+        self.assertMaxQueries(1, "GET", "/auth/users/me/", status=status.HTTP_200_OK, **header)
+        self.assertMaxQueries(0, "GET", "/auth/users/me/", status=status.HTTP_200_OK, **header)
+
+        self.assertMaxQueries(2, "POST", "/auth/token/logout/", status=status.HTTP_200_OK, **header)
+        self.assertMaxQueries(
+            1, "GET", "/auth/users/me/", status=status.HTTP_401_UNAUTHORIZED, **header
+        )
+
+    def test_cached_token_dropped_after_commit(self):
+        token = Token.objects.create(user=self.user)
+        header = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        self.assertMaxQueries(1, "GET", "/auth/users/me/", status=status.HTTP_200_OK, **header)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save()
+            # a request before the commit would cache the active user again
+            self.assertMaxQueries(0, "GET", "/auth/users/me/", status=status.HTTP_200_OK, **header)
+        for callback in callbacks:
+            callback()
+        self.assertMaxQueries(
+            1, "GET", "/auth/users/me/", status=status.HTTP_401_UNAUTHORIZED, **header
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            token.delete()
+        self.assertMaxQueries(
+            1, "GET", "/auth/users/me/", status=status.HTTP_401_UNAUTHORIZED, **header
+        )
+
+
+class AuthEndpointPermissionTests(QueryBudgetTestCase):
+    # statuses as an anonymous user, a customer and an admin
+    def test_users(self):
+        other = self.users[1]
+        self.assertStatuses("GET", "/auth/users/", [401, 200, 200])
+        self.assertStatuses(
+            "POST",
+            "/auth/users/",
+            [201, 201, 201],
+            {
+                "phone_number": "+201099999999",
+                "email": "new@example.com",
+                "first_name": "New",
+                "last_name": "User",
+                "password": "a-long-password",
+                "re_password": "a-long-password",
+            },
+        )
+        self.assertStatuses("GET", "/auth/users/me/", [401, 200, 200])
+        self.assertStatuses("PATCH", "/auth/users/me/", [401, 200, 200], {"first_name": "New"})
+        # users only see themselves
+        self.assertStatuses("GET", f"/auth/users/{other.id}/", [401, 404, 200])
+        # the admin has to send its current_password
+        self.assertStatuses("DELETE", f"/auth/users/{other.id}/", [401, 403, 400], {})
+
+    def test_account_actions(self):
+        # djoser's routes without a valid payload, only the authenticated ones deny anonymous users
+        for url in [
+            "/auth/users/activation/",
+            "/auth/users/resend_activation/",
+            "/auth/users/reset_password/",
+            "/auth/users/reset_password_confirm/",
+            "/auth/users/reset_phone_number/",
+            "/auth/users/reset_phone_number_confirm/",
+        ]:
+            self.assertStatuses("POST", url, [400, 400, 400], {})
+        self.assertStatuses("POST", "/auth/users/set_password/", [401, 400, 400], {})
+        # CustomUserViewSet.set_phone_number replaces djoser's set_username
+        self.assertStatuses("PATCH", "/auth/users/set_phone_number/", [401, 400, 400], {})
+        self.assertStatuses("POST", "/auth/users/set_phone_number/", [401, 405, 405], {})
+
+    def test_token(self):
+        credentials = {"phone_number": self.user.phone_number, "password": "password"}
+        self.assertStatuses("POST", "/auth/token/login/", [200, 200, 200], credentials)
+        self.assertStatuses("POST", "/auth/token/login/", [400, 400, 400], {})
+        self.assertStatuses("POST", "/auth/token/logout/", [401, 200, 200])
+
+
+class RendererGoldenTests(QueryBudgetTestCase):
+    """orjson and MessagePack must give the payloads of DRF's JSONRenderer."""
+
+    URLS = [
+        "/store/products/?size=100",
+        "/store/products/{product}/",
+        "/store/products/{product}/reviews/",
+        "/store/carts/",
+        "/store/orders/",
+        "/store/customers/",
+        "/auth/users/me/",
+    ]
+
+    def get_urls(self):
+        return [url.format(product=self.product.id) for url in self.URLS]
+
+    def get_user(self, url):
+        # carts and customers are only listed for the admins
+        return self.admin if url in ("/store/carts/", "/store/customers/") else self.user
+
+    def test_values(self):
+        data = {
+            "decimal": Decimal("10.50"),
+            "decimals": [Decimal("0"), Decimal("999.99"), Decimal("123456789012.34")],
+            "uuid": uuid4(),
+            "datetime": datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            "naive_datetime": datetime(2025, 1, 2, 3, 4, 5),
+            "offset_datetime": datetime(2025, 1, 2, 3, 4, tzinfo=dt_timezone(timedelta(hours=2))),
+            "date": date(2025, 1, 2),
+            "time": time(3, 4, 5, 6),
+            "timedelta": timedelta(minutes=90),
+            "lazy": gettext_lazy("Not found."),
+            "unicode": "é ü 中文     \"quoted\" \\ \n",
+            "numbers": [0, -1, 2 ** 63 - 1, 1.5, 0.1, True, False, None],
+            "bytes": b"bytes",
+            "int_keys": {1: "one", 2: "two"},
+            "empty": [{}, [], ""],
+            "nested": [{"list": [[1, {"a": Decimal("1.10")}]]}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+        # over 64 bits, left to JSONRenderer
+        self.assertEqual(ORJSONRenderer().render([2 ** 64]), JSONRenderer().render([2 ** 64]))
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+    def test_responses(self):
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                self.client.force_authenticate(self.get_user(url))
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response["Content-Type"], "application/json")
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_msgpack(self):
+        for url in self.get_urls() + [f"/catalog/products/{self.product.id}/"]:
+            with self.subTest(url=url):
+                self.client.force_authenticate(self.get_user(url))
+                expected = self.client.get(url).json()
+                cache.clear()
+                response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response["Content-Type"], "application/msgpack")
+                self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    def test_parser(self):
+        bodies = [
+            b'{"product": 1, "quantity": 2}',
+            '{"title": "é \\u00e9 中文", "price": 10.50, "items": [null, true, 1e3]}'.encode(),
+            b"[]",
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(
+                    ORJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body))
+                )
+
+        for body in [b"", b"{", b'{"a": NaN}', b"\xff"]:
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    JSONParser().parse(BytesIO(body))
+                with self.assertRaises(ParseError) as error:
+                    ORJSONParser().parse(BytesIO(body))
+                self.assertEqual(str(error.exception), str(expected.exception))
+
+        latin1 = '{"title": "é"}'.encode("latin-1")
+        self.assertEqual(
+            ORJSONParser().parse(BytesIO(latin1), parser_context={"encoding": "latin-1"}),
+            {"title": "é"},
+        )
+
+
+@mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {"search.anon": "2/min", "search.user": "3/min"})
+class ThrottleTests(QueryBudgetTestCase):
+    def search(self, user=None):
+        self.client.force_authenticate(user)
+        return self.client.get("/store/products/?search=Product")
+
+    def test_search(self):
+        for remaining in [1, 0]:
+            response = self.search()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response["RateLimit-Limit"], "2")
+            self.assertEqual(response["RateLimit-Remaining"], str(remaining))
+            self.assertEqual(response["RateLimit-Reset"], "60")
+
+        response = self.search()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+
+        # authenticated users have their own bucket and rate
+        response = self.search(self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["RateLimit-Limit"], "3")
+        # and the other endpoints aren't throttled
+        response = self.client.get("/store/products/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("RateLimit-Limit", response)
+
+    def test_forwarded_for_does_not_reset_the_window(self):
+        for index in range(2):
+            response = self.client.get("/store/products/?search=Product", HTTP_X_FORWARDED_FOR=f"10.0.0.{index}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get("/store/products/?search=Product", HTTP_X_FORWARDED_FOR="10.0.0.99")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1})
+    def test_behind_a_proxy(self):
+        # the address added by the proxy, not the ones sent by the client
+        for _ in range(2):
+            self.client.get("/store/products/?search=Product", HTTP_X_FORWARDED_FOR="1.1.1.1, 10.0.0.1")
+        response = self.client.get("/store/products/?search=Product", HTTP_X_FORWARDED_FOR="2.2.2.2, 10.0.0.1")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.get("/store/products/?search=Product", HTTP_X_FORWARDED_FOR="10.0.0.2")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class InProcessPool:
+    """ProcessPoolExecutor stand-in, registers users while the passwords are hashed."""
+
+    registered = []
+
+    def __init__(self, *args, **kwargs):
+        self.phone_numbers = list(self.registered)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, func, iterable, chunksize=1):
+        while self.phone_numbers:
+            User.objects.create_user(
+                phone_number=self.phone_numbers.pop(), password="password", email="racer@example.com"
+            )
+        return map(func, iterable)
+
+
+# salted like the default hasher, much faster
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ImportUsersTests(QueryBudgetTestCase):
+    def import_users(self, lines, **options):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as file:
+            file.write("\n".join(lines))
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_users", file.name, workers=1, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue().splitlines()[-1], stderr.getvalue().splitlines()
+
+    @staticmethod
+    def row(phone_number, **fields):
+        return json.dumps({"phone_number": phone_number, "password": "secret", "first_name": "Imported", **fields})
+
+    def test_import(self):
+        summary, errors = self.import_users(
+            [self.row(f"+2010000001{index:02}") for index in range(5)], batch_size=2
+        )
+        self.assertEqual(summary, "Imported 5 users, skipped 0 existing and 0 invalid rows.")
+        self.assertEqual(errors, [])
+        users = User.objects.filter(first_name="Imported")
+        self.assertEqual(users.count(), 5)
+        self.assertEqual(Customer.objects.filter(user__in=users).count(), 5)
+        self.assertTrue(users.first().check_password("secret"))
+
+    def test_duplicates(self):
+        summary, errors = self.import_users(
+            [
+                self.row(self.user.phone_number),
+                self.row("+201000000201"),
+                # the same number written differently, in the batch then in the next one
+                self.row("01000000201"),
+                self.row("+201000000202"),
+                self.row("+201000000201"),
+            ],
+            batch_size=4,
+        )
+        self.assertEqual(summary, "Imported 2 users, skipped 2 existing and 1 invalid rows.")
+        self.assertEqual(errors, ["line 3: duplicate phone number +201000000201"])
+
+    def test_bad_rows(self):
+        summary, errors = self.import_users(
+            [
+                "not json",
+                "[1, 2]",
+                self.row("12"),
+                self.row("+201000000301", email="not-an-email"),
+                self.row("+201000000302", first_name="x" * 256),
+                self.row("+201000000303"),
+            ],
+            batch_size=2,
+        )
+        self.assertEqual(summary, "Imported 1 users, skipped 0 existing and 5 invalid rows.")
+        self.assertEqual(
+            [error.split(":")[0] for error in errors],
+            ["line 1", "line 2", "line 3", "line 4", "line 5"],
+        )
+
+    def test_user_registered_during_the_import(self):
+        with mock.patch.object(import_users, "ProcessPoolExecutor", InProcessPool), \
+                mock.patch.object(InProcessPool, "registered", ["+201000000402"]):
+            summary, _ = self.import_users(
+                [self.row(f"+20100000040{index}") for index in range(1, 4)]
+            )
+        self.assertEqual(summary, "Imported 2 users, skipped 1 existing and 0 invalid rows.")
+        # the registered user is left as it was, with the customer of its signal
+        racer = User.objects.get(phone_number="+201000000402")
+        self.assertEqual(racer.first_name, "")
+        self.assertTrue(racer.check_password("password"))
+        self.assertEqual(Customer.objects.filter(user__phone_number__startswith="+2010000004").count(), 3)
+
+
+class MetricsAccessTests(SimpleTestCase):
+    def get(self, remote_addr="127.0.0.1", **headers):
+        return self.client.get("/metrics", REMOTE_ADDR=remote_addr, headers=headers).status_code
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"], METRICS_TOKEN="")
+    def test_allowed_addresses(self):
+        self.assertEqual(self.get(), 200)
+        self.assertEqual(self.get("203.0.113.5"), 403)
+        # a forwarded address is not the client's
+        self.assertEqual(self.get("203.0.113.5", x_forwarded_for="127.0.0.1"), 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(self.get("203.0.113.5", authorization="Bearer secret"), 200)
+        self.assertEqual(self.get("203.0.113.5", authorization="Bearer wrong"), 403)
+        self.assertEqual(self.get(), 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"], METRICS_TOKEN="secret")
+    def test_token_and_address(self):
+        self.assertEqual(self.get(authorization="Bearer secret"), 200)
+        self.assertEqual(self.get(), 403)
+        self.assertEqual(self.get("203.0.113.5", authorization="Bearer secret"), 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN="")
+    def test_closed_without_configuration(self):
+        self.assertEqual(self.get(), 403)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        patcher = mock.patch("core.db_router.get_replicas", return_value=["replica1", "replica2"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("core.db_router.check_connection", return_value=True)
+        self.check_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_primary_by_default(self):
+        # tasks, commands, sessions and authentication
+        self.assertEqual(self.router.db_for_read(Product), "default")
+        self.check_connection.assert_not_called()
+
+    def test_one_replica_per_request(self):
+        with use_replica():
+            aliases = {self.router.db_for_read(Product) for _ in range(20)}
+        self.assertEqual(len(aliases), 1)
+        self.assertIn(aliases.pop(), ["replica1", "replica2"])
+        self.check_connection.assert_called_once()
+        self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_pinned_and_failed_over_to_the_primary(self):
+        with use_replica():
+            token = pin_primary.set(True)
+            self.assertEqual(self.router.db_for_read(Product), "default")
+            pin_primary.reset(token)
+        self.check_connection.return_value = False
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Product), "default")
@@ -1,18 +1,43 @@
+import os
+
+from django.conf import settings as django_settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
 from djoser.conf import settings
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 from djoser import utils
 from djoser.views import UserViewSet, TokenCreateView, TokenDestroyView
 
+from core.authentication import invalidate_token
+from core.db_router import use_replica
 from core.serializers import CustomSetUsernameSerializer
+from store.carts import delete_cart_token
 from store.signals import user_logged_in_signal
 
+class ReplicaReadsMixin:
+    """Read the safe requests of a view from a replica, see core.db_router."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with use_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
 # override the default djoser view to send a custom response
 #  with success message and the new_phone_number field
 
 
 class CustomUserViewSet(UserViewSet):
+    # registration, activation, password and phone number changes
+    @property
+    def throttle_scope(self):
+        return 'auth' if self.request.method not in SAFE_METHODS else None
+
     @action(detail=False, methods=['patch'], serializer_class=CustomSetUsernameSerializer)
     def set_phone_number(self, request, *args, **kwargs):
         response = super().set_username(request, *args, **kwargs)
@@ -29,6 +54,8 @@ class CustomUserViewSet(UserViewSet):
 
 # implement create token view (login)
 class CustomTokenCreateView(TokenCreateView):
+    throttle_scope = 'login'
+
     def _action(self, serializer):
         token = utils.login_user(self.request, serializer.user)
         token_serializer_class = settings.SERIALIZERS.token
@@ -39,15 +66,22 @@ class CustomTokenCreateView(TokenCreateView):
         request=self.request,
         user=serializer.user,
         )
-        return Response(
+        response = Response(
             data=token_serializer_class(token).data, status=status.HTTP_200_OK
         )
+        # the anonymous cart now belongs to the customer
+        if django_settings.CART_TOKEN_COOKIE in self.request.COOKIES:
+            delete_cart_token(response)
+        return response
 
 
 # implement delete token view (logout)
 class CustomTokenDestroyView(TokenDestroyView):
     # we don't need @action because we extend normal ApiView not ViewSet
     def post(self, request):
+        # evict the token from the authentication cache
+        if request.auth is not None:
+            invalidate_token(request.auth.key)
         # Call original logout logic
         super().post(request)
         # Always return JSON message
@@ -55,3 +89,27 @@ class CustomTokenDestroyView(TokenDestroyView):
             {"message": "Token deleted successfully"},
             status=status.HTTP_200_OK
         )
+
+
+def metrics_allowed(request):
+    token = django_settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return False
+    allowed_ips = django_settings.METRICS_ALLOWED_IPS
+    if not allowed_ips:
+        # any address, but only with the token
+        return bool(token)
+    # the address of the connection, X-Forwarded-For can be sent by anyone
+    return request.META.get("REMOTE_ADDR") in allowed_ips
+
+
+# prometheus scrape endpoint, not public: the routes, their traffic and errors
+def metrics(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    # gunicorn/uwsgi workers write their metrics to PROMETHEUS_MULTIPROC_DIR
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -4,6 +4,10 @@
 echo "Apply database migrations"
 python manage.py migrate
 
+# Pre-render the most requested catalog pages, a failure doesn't stop the deploy
+echo "Warm the catalog cache"
+python manage.py warm_catalog_cache || true
+
 # Start server
 echo "Starting server"
 python manage.py runserver 0.0.0.0:8000
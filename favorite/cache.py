@@ -0,0 +1,135 @@
+import logging
+from uuid import uuid4
+
+from django.contrib.contenttypes.models import ContentType
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from favorite.models import FavoriteItem
+from store.models import Product
+
+
+logger = logging.getLogger(__name__)
+
+# every user's favorite product ids are mirrored in a redis set so
+# a whole page of products can be checked with one SMISMEMBER call
+FAVORITE_PRODUCTS_KEY = "favorites:products:{user_id}"
+FAVORITE_PRODUCTS_TIMEOUT = 60 * 60 * 24  # 1 day
+# redis doesn't keep empty sets, this member marks a set that was loaded
+# from the database so a user without favorites is not reloaded every time
+LOADED_MARKER = "loaded"
+# token of the request loading the set from the database
+LOADING_KEY = "favorites:products:{user_id}:loading"
+LOADING_TIMEOUT = 60
+
+# KEYS: the set and its loading token, ARGV: the token, the timeout and the
+# members (the loaded marker first). Stored only if no favorite changed since
+# the token was set, in chunks since unpack() is limited to a few thousands
+STORE_SCRIPT = """
+if redis.call("GET", KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call("DEL", KEYS[1], KEYS[2])
+for index = 3, #ARGV, 1000 do
+    redis.call("SADD", KEYS[1], unpack(ARGV, index, math.min(index + 999, #ARGV)))
+end
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+return 1
+"""
+# KEYS: the set and its loading token, ARGV: SADD or SREM, the product id,
+# the loaded marker and the timeout. A set that isn't loaded is left alone,
+# a SADD would create it without the marker and the expiry
+UPDATE_SCRIPT = """
+redis.call("DEL", KEYS[2])
+if redis.call("SISMEMBER", KEYS[1], ARGV[3]) == 1 then
+    redis.call(ARGV[1], KEYS[1], ARGV[2])
+    redis.call("EXPIRE", KEYS[1], ARGV[4])
+end
+"""
+
+
+def get_connection():
+    try:
+        return get_redis_connection("default")
+    except NotImplementedError:
+        # the cache backend is not redis (ex: local memory cache in tests)
+        return None
+
+
+def get_favorite_product_ids_from_db(user_id):
+    return set(
+        FavoriteItem.objects.filter(
+            user_id=user_id, content_type=ContentType.objects.get_for_model(Product)
+        ).values_list("object_id", flat=True)
+    )
+
+
+def load_favorite_product_ids(connection, user_id):
+    key = FAVORITE_PRODUCTS_KEY.format(user_id=user_id)
+    loading_key = LOADING_KEY.format(user_id=user_id)
+    # a favorite added or removed while the database is read deletes the
+    # token, the set is then left to the next read instead of being stored
+    # without the change
+    token = uuid4().hex
+    connection.set(loading_key, token, ex=LOADING_TIMEOUT)
+    product_ids = get_favorite_product_ids_from_db(user_id)
+    connection.register_script(STORE_SCRIPT)(
+        keys=[key, loading_key],
+        args=[token, FAVORITE_PRODUCTS_TIMEOUT, LOADED_MARKER, *product_ids],
+    )
+    return product_ids
+
+
+def get_favorited_product_ids(user_id, product_ids):
+    """Return the subset of product_ids the user has favorited."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return set()
+
+    connection = get_connection()
+    if connection is None:
+        return get_favorite_product_ids_from_db(user_id) & set(product_ids)
+
+    key = FAVORITE_PRODUCTS_KEY.format(user_id=user_id)
+    try:
+        loaded, *flags = connection.smismember(key, [LOADED_MARKER, *product_ids])
+        if not loaded:
+            # first request of the user or the set has expired
+            return load_favorite_product_ids(connection, user_id) & set(product_ids)
+    except RedisError:
+        return get_favorite_product_ids_from_db(user_id) & set(product_ids)
+
+    return {product_id for product_id, flag in zip(product_ids, flags) if flag}
+
+
+def update_favorite_products(command, user_id, product_id):
+    connection = get_connection()
+    if connection is None:
+        return
+    try:
+        connection.register_script(UPDATE_SCRIPT)(
+            keys=[FAVORITE_PRODUCTS_KEY.format(user_id=user_id), LOADING_KEY.format(user_id=user_id)],
+            args=[command, product_id, LOADED_MARKER, FAVORITE_PRODUCTS_TIMEOUT],
+        )
+    except RedisError:
+        # called after the commit, the favorite itself is saved
+        logger.warning("Could not update the cached favorites of user %s", user_id, exc_info=True)
+
+
+def add_favorite_product(user_id, product_id):
+    update_favorite_products("SADD", user_id, product_id)
+
+
+def remove_favorite_product(user_id, product_id):
+    update_favorite_products("SREM", user_id, product_id)
+
+
+def forget_favorite_products(user_id):
+    # the user was deleted
+    connection = get_connection()
+    if connection is None:
+        return
+    try:
+        connection.delete(FAVORITE_PRODUCTS_KEY.format(user_id=user_id), LOADING_KEY.format(user_id=user_id))
+    except RedisError:
+        logger.warning("Could not delete the cached favorites of user %s", user_id, exc_info=True)
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    FavoriteItem = apps.get_model('favorite', 'FavoriteItem')
+    duplicates = (
+        FavoriteItem.objects.values('user_id', 'content_type_id', 'object_id')
+        .annotate(first_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        FavoriteItem.objects.filter(
+            user_id=duplicate['user_id'],
+            content_type_id=duplicate['content_type_id'],
+            object_id=duplicate['object_id'],
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('favorite', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favoriteitem',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type', 'object_id'), name='favorite_unique_user_object'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('favorite', '0002_favoriteitem_favorite_unique_user_object'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favoriteitem',
+            index=models.Index(fields=['user', 'content_type', '-id'], name='favorite_user_type_id'),
+        ),
+    ]
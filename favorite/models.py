@@ -1,9 +1,39 @@
-from django.db import models
+from django.db import connections, models, router
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 
+class FavoriteItemManager(models.Manager):
+    def add(self, user_id, content_type_id, object_id):
+        # single INSERT ... ON CONFLICT DO NOTHING, returns None when the
+        # favorite already exists instead of raising an IntegrityError
+        meta = self.model._meta
+        # self.db is the database for reads, which can be a replica
+        connection = connections[self._db or router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        columns = ", ".join(
+            quote(meta.get_field(name).column)
+            for name in ["user", "content_type", "object_id"]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(meta.db_table)} ({columns}) VALUES (%s, %s, %s) "
+                f"ON CONFLICT ({columns}) DO NOTHING RETURNING {quote(meta.pk.column)}",
+                [user_id, content_type_id, object_id],
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return self.model(
+            id=row[0],
+            user_id=user_id,
+            content_type_id=content_type_id,
+            object_id=object_id,
+        )
+
+
 # to define a generic relationship using ContentType you have to define 3 required fields
 # 1) content_type: ForeignKey(ContentType)
 # 2) object_id: PositiveIntegerField()
@@ -12,4 +42,21 @@ class FavoriteItem(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
-    content_object = GenericForeignKey('content_type', 'object_id')
\ No newline at end of file
+    content_object = GenericForeignKey('content_type', 'object_id')
+
+    objects = FavoriteItemManager()
+
+    class Meta:
+        # a user can favorite an object only once
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'content_type', 'object_id'],
+                name='favorite_unique_user_object',
+            ),
+        ]
+        indexes = [
+            # favorites of a user, newest first (FavoritePagination)
+            models.Index(
+                fields=['user', 'content_type', '-id'], name='favorite_user_type_id'
+            ),
+        ]
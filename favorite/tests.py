@@ -1,3 +1,7 @@
-from django.test import TestCase
+from store.testing import QueryBudgetTestCase
 
-# Create your tests here.
+
+class FavoriteQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        # favorites + products with their category + images
+        self.assertListMaxQueries(3, "/store/favorites/", self.user)
@@ -55,15 +55,23 @@ INSTALLED_APPS = [
     "core",
     "store",
     "favorite",
+    "analytics",
 ]
 
 MIDDLEWARE = [
+    # first so it measures the whole request
+    "core.middleware.MetricsMiddleware",
+    # before anything that reads the database, only used with replicas
+    "core.middleware.PrimaryPinningMiddleware",
+    "core.middleware.RateLimitHeadersMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # async capable WhiteNoise, every middleware must be so async views run natively
+    "core.middleware.AsyncWhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "store.middleware.CustomerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -102,6 +110,30 @@ DATABASES = {
     }
 }
 
+# read replicas (comma separated database urls), safe reads are sent to
+# them by core.db_router.ReplicaRouter, writes always go to "default"
+for index, url in enumerate(env.list("REPLICA_DATABASE_URLS", default=[])):
+    DATABASES[f"replica_{index}"] = {
+        **env.db_url_config(url),
+        # tests run everything against the primary
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+
+# after a write the client reads from the primary for this many seconds,
+# longer than the replication lag
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=5)
+
+
+# /metrics (core.views.metrics) answers the METRICS_ALLOWED_IPS only, and
+# with METRICS_TOKEN set only the requests with "Authorization: Bearer <token>"
+# (Prometheus' "authorization" scrape option). Behind a proxy every request
+# comes from the proxy's address: set the token or deny /metrics in the proxy.
+# An empty METRICS_ALLOWED_IPS allows any address that has the token
+METRICS_ALLOWED_IPS = env.list("METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"])
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,6 +175,17 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# who sends the media files once store.views.media allowed them:
+# "x-accel-redirect" (nginx), "x-sendfile" (apache/lighttpd) or "" for Django
+MEDIA_SENDFILE_BACKEND = env("MEDIA_SENDFILE_BACKEND", default="")
+# internal nginx location with "alias <MEDIA_ROOT>/;"
+MEDIA_ACCEL_REDIRECT_URL = env("MEDIA_ACCEL_REDIRECT_URL", default="/protected-media/")
+
+STORAGES = {
+    # uploads are saved under content hashed names, served as immutable
+    "default": {"BACKEND": "core.media.HashedFileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -155,10 +198,41 @@ AUTH_USER_MODEL = "core.User"
 REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "core.authentication.CachedTokenAuthentication",
+    ],
+    # orjson with the output of DRF's JSONRenderer, the first one is the default
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "core.renderers.MessagePackRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
+    # only the views with a throttle_scope are throttled, "<scope>.anon" (per IP)
+    # and "<scope>.user" (per user) rates, or "<scope>" for both
+    "DEFAULT_THROTTLE_CLASSES": ["core.throttling.SlidingWindowThrottle"],
+    # anonymous clients are throttled per IP: the address the last of these
+    # proxies (nginx, a load balancer) saw in X-Forwarded-For, REMOTE_ADDR
+    # with 0. A client can set X-Forwarded-For itself, never trust more hops
+    # than there are proxies in front of the app
+    "NUM_PROXIES": env.int("NUM_PROXIES", default=0),
+    "DEFAULT_THROTTLE_RATES": {
+        "search.anon": env("THROTTLE_SEARCH_ANON", default="30/min"),
+        "search.user": env("THROTTLE_SEARCH_USER", default="120/min"),
+        "cart.anon": env("THROTTLE_CART_ANON", default="30/min"),
+        "cart.user": env("THROTTLE_CART_USER", default="60/min"),
+        "checkout": env("THROTTLE_CHECKOUT", default="10/min"),
+        "login": env("THROTTLE_LOGIN", default="10/min"),
+        "auth": env("THROTTLE_AUTH", default="20/hour"),
+    },
 }
 
+# False lets every request through, for load tests (benchmark_store)
+THROTTLE_ENABLED = env.bool("THROTTLE_ENABLED", default=True)
+
 DJOSER = {
     "SERIALIZERS": {
         "user_create_password_retype": "core.serializers.CustomUserCreatePasswordRetypeSerializer",
@@ -174,7 +248,8 @@ DJOSER = {
 # use redis database 1 for background tasks
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        # django_redis RedisCache that counts hits and misses per request
+        "BACKEND": "core.cache.InstrumentedRedisCache",
         "LOCATION": env("REDIS_CACHE_URL", default="redis://localhost:6379/1"),
         "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
     }
@@ -182,6 +257,37 @@ CACHES = {
 
 CELERY_BROKER_URL = env("CELERY_BROKER_URL", default="redis://localhost:6379/2")
 
+# anonymous carts are kept with a signed token (store.carts), not the session
+CART_TOKEN_COOKIE = "cart_token"
+CART_TOKEN_MAX_AGE = 60 * 60 * 24 * 7
+
+# store.pricing rules applied by the weekly update_products_prices task
+PRICING_RULES = [
+    {"name": "weekly increase", "type": "absolute", "value": "1"},
+]
+
+# CDN or Varnish in front of the anonymous catalog (store.views.ProductViewSet),
+# browsers keep a page CATALOG_BROWSER_MAX_AGE seconds and the CDN as long as
+# the response cache. Changed products are purged by surrogate key through a
+# POST of {CDN_PURGE_FIELD: [keys]} to CDN_PURGE_URL, see core.purge
+CATALOG_BROWSER_MAX_AGE = env.int("CATALOG_BROWSER_MAX_AGE", default=60)
+CDN_PURGE_URL = env("CDN_PURGE_URL", default="")
+# ex: CDN_PURGE_HEADERS="Authorization=Bearer <token>"
+CDN_PURGE_HEADERS = env.dict("CDN_PURGE_HEADERS", default={})
+# "tags" for Cloudflare, "surrogate_keys" for Fastly
+CDN_PURGE_FIELD = env("CDN_PURGE_FIELD", default="keys")
+CDN_PURGE_BATCH_SIZE = env.int("CDN_PURGE_BATCH_SIZE", default=30)
+# seconds during which purges are collected before being sent
+CDN_PURGE_DELAY = env.int("CDN_PURGE_DELAY", default=2)
+CDN_PURGE_TIMEOUT = 10
+
+# store.warming, the most requested product list pages and product details
+# pre-rendered by the warm_catalog_cache task, with at most
+# CATALOG_WARM_CONCURRENCY database connections
+CATALOG_WARM_PAGES = env.int("CATALOG_WARM_PAGES", default=200)
+CATALOG_WARM_PRODUCTS = env.int("CATALOG_WARM_PRODUCTS", default=500)
+CATALOG_WARM_CONCURRENCY = env.int("CATALOG_WARM_CONCURRENCY", default=4)
+
 CELERY_BEAT_SCHEDULE = {
     # method_name in tasks.py
     "update_products_prices": {
@@ -197,6 +303,17 @@ CELERY_BEAT_SCHEDULE = {
         # run the task every 3 months
         "schedule": crontab(minute=0, hour=0, day_of_month=1, month_of_year="1,4,7,10"),
     },
+    "refresh_sales_rollups": {
+        "task": "analytics.tasks.refresh_sales_rollups",
+        # only new orders are processed so the task can run often
+        "schedule": crontab(minute="*/15"),
+    },
+    "warm_catalog_cache": {
+        "task": "store.tasks.warm_catalog_cache",
+        # fresh pages are only read, so this mostly rebuilds the pages
+        # lost to a cache flush or an eviction
+        "schedule": crontab(minute="*/10"),
+    },
 }
 
 
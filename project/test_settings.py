@@ -0,0 +1,15 @@
+# Settings of the test suite, selected by "manage.py test": SQLite (or
+# TEST_DATABASE_URL) and a local memory cache, so it doesn't need the
+# postgres and redis services.
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, env
+
+
+DATABASES = {
+    "default": env.db("TEST_DATABASE_URL", default="sqlite:///" + str(BASE_DIR / "test.sqlite3"))
+}
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
@@ -1,10 +1,10 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from core.views import CustomTokenCreateView, CustomUserViewSet, CustomTokenDestroyView
+from core.views import CustomTokenCreateView, CustomUserViewSet, CustomTokenDestroyView, metrics
+from store.views import media
 
 
 router = DefaultRouter()
@@ -13,10 +13,13 @@ router.register('users', CustomUserViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics),
     # external-apps urls
 
 
 
+    # before djoser.urls so the users are served by CustomUserViewSet
+    path('auth/', include(router.urls)),
     # CRUD operations (register, list, etc)
     path('auth/', include('djoser.urls')),
 
@@ -24,13 +27,13 @@ urlpatterns = [
     # implement custom views for login and logout instead of using djoser.urls.authtoken
     path('auth/token/logout/', CustomTokenDestroyView.as_view()),
     path('auth/token/login/', CustomTokenCreateView.as_view()),
-    path('auth/', include(router.urls)),
 
 
     # my-apps urls
     path('store/', include('store.urls')),
+    path('catalog/', include('store.async_urls')),
+    path('analytics/', include('analytics.urls')),
 
+    # media with access checks, sent by nginx/apache when MEDIA_SENDFILE_BACKEND is set
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', media),
 ]
-
-if settings.DEBUG:
- urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
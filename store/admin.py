@@ -1,8 +1,19 @@
+import re
+
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connections
+from django.db.models import Count, Q
 from django.utils.html import format_html
 
+from core.pagination import EstimatedCountPaginator
 from . import models
-from .models import Customer, Product, ProductImage
+from .models import Category, Customer, Product, ProductImage
+
+
+# the expression of the store_product_search GIN index (PostgreSQL only, see
+# migration 0017), the query has to use the same one for the index to be used
+PRODUCT_SEARCH_VECTOR = SearchVector("title", "description", config="simple")
 
 
 @admin.register(models.Customer)
@@ -24,15 +35,30 @@ class CustomerAdmin(admin.ModelAdmin):
     list_display = ["id", "first_name", "last_name", "phone_number"]
     # define the related fields
     list_select_related = ["user"]
-    ordering = ["user__first_name", "user__last_name"]
-    search_fields = ["user__first_name__istartswith", "user__last_name__istartswith"]
+    # newest first from the primary key, sorting by name (a click on the
+    # column) joins and sorts the users first
+    ordering = ["-id"]
+    # name prefixes use the core_user_*_prefix indexes on PostgreSQL
+    # (core migration 0005), a phone number the unique index
+    search_fields = ["user__first_name__istartswith", "user__last_name__istartswith", "user__phone_number__exact"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(models.Category)
 class CategoryAdmin(admin.ModelAdmin):
-    # TODO: define a field that show the number of products on every category
-    list_display = ["id", "title"]
+    list_display = ["id", "title", "products_count"]
     search_fields = ['title']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # counted in the changelist query, not with a query per category
+        return super().get_queryset(request).annotate(products_count=Count("product"))
+
+    @admin.display(ordering="products_count", description="Products")
+    def products_count(self, category: Category):
+        return category.products_count
 
 
 class ProductImageInline(admin.TabularInline):
@@ -61,10 +87,29 @@ class ProductAdmin(admin.ModelAdmin):
     # TODO: show image
     list_display = ["id", "category_title", "title", "price", "inventory"]
     # note: that category_title will be added 
+    list_select_related = ["category"]
     ordering = ['id', 'title', 'price']
     list_filter = ["category"]
-    search_fields = ["title", "description", "price"]
+    # an id, or words prefixes in the title and description (full text on
+    # PostgreSQL, a title prefix elsewhere), see get_search_results
+    search_fields = ["title"]
     list_editable = ["price"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # the admin's "=id" casts the ids to text, which no index has
+        by_id = Q(pk=int(search_term)) if search_term.strip().isdigit() else Q(pk__in=[])
+        if connections[queryset.db].vendor != "postgresql":
+            return queryset.filter(Q(title__istartswith=search_term.strip()) | by_id), False
+        # every word as a prefix: "red sho" finds "Red Shoes"
+        words = re.findall(r"[^\W_]+", search_term)
+        if not words:
+            return queryset, False
+        query = SearchQuery(" & ".join(f"{word}:*" for word in words), config="simple", search_type="raw")
+        return queryset.alias(search=PRODUCT_SEARCH_VECTOR).filter(Q(search=query) | by_id), False
     
     # Add/Edit Form View fields
     autocomplete_fields = ['category']
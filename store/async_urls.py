@@ -0,0 +1,21 @@
+from django.urls import path
+
+from store import async_views
+
+
+# read-only catalog served by native async views, see store/async_views.py
+urlpatterns = [
+    path("products/", async_views.product_list, name="catalog-product-list"),
+    path("products/<int:pk>/", async_views.product_detail, name="catalog-product-detail"),
+    path(
+        "products/<int:product_pk>/images/",
+        async_views.product_images,
+        name="catalog-product-images",
+    ),
+    path(
+        "products/<int:product_pk>/reviews/",
+        async_views.review_list,
+        name="catalog-product-reviews",
+    ),
+    path("categories/", async_views.category_list, name="catalog-category-list"),
+]
@@ -0,0 +1,176 @@
+from functools import wraps
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+from django.views.decorators.vary import vary_on_headers
+from rest_framework.exceptions import APIException, NotAcceptable, Throttled
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from core.cache import async_cache_get, async_cache_set
+from core.db_router import use_replica
+from .cache import CATALOG_VERSION_KEY, aget_versions, get_list_keys, get_product_keys
+from .models import Category, Product, ProductImage, Review
+from .pagination import ReviewPagination
+from .serializers import (
+    CategorySerializer,
+    ProductImageSerializer,
+    ProductSerializer,
+    ReviewSerializer,
+)
+from .views import ProductViewSet
+
+
+# Read-only catalog for ASGI servers (uvicorn, daphne...): the views, the
+# middlewares and the cache client are async, so a request never waits in a
+# thread pool for I/O. They return the same payloads as the DRF views for
+# anonymous users (no is_favorited), the DRF views stay the API for writes
+# and for authenticated users.
+
+CACHE_KEY = "catalog:{version}:{format}:{path}"
+
+
+def get_renderers():
+    # JSON by default, MessagePack on request, no browsable API
+    return [
+        renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        if not issubclass(renderer, BrowsableAPIRenderer)
+    ]
+
+
+def check_throttles(request, scope):
+    # the throttles of the DRF views (core.throttling), raises Throttled
+    view = SimpleNamespace(throttle_scope=scope)
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            waits.append(throttle.wait())
+    if waits:
+        raise Throttled(max(wait or 0 for wait in waits))
+
+
+def catalog_view(timeout, version_keys=lambda **kwargs: [CATALOG_VERSION_KEY], throttle_scope=None):
+    """
+    Wrap an async view that gets a DRF request and returns the response data:
+    render it with the renderer picked from the Accept header, turn API
+    errors into DRF's error payloads and cache successful responses for
+    timeout seconds, under the versions (store.cache) of the keys returned
+    by version_keys for the view's kwargs. throttle_scope returns the
+    throttle scope of a request, like the DRF view's throttle_scope.
+    """
+
+    def decorator(view):
+        @vary_on_headers("Accept")
+        @require_safe
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            # no authenticators, the catalog is public
+            request = Request(request, authenticators=[])
+            renderers = get_renderers()
+            try:
+                renderer, _ = DefaultContentNegotiation().select_renderer(request, renderers)
+            except NotAcceptable as exc:
+                renderer = renderers[0]
+                content = renderer.render(exception_handler(exc, {}).data)
+                return HttpResponse(content, status=exc.status_code, content_type=renderer.media_type)
+
+            # before the cache like the DRF views, a redis round trip
+            scope = throttle_scope(request) if throttle_scope else None
+            if scope:
+                try:
+                    await sync_to_async(check_throttles)(request, scope)
+                except Throttled as exc:
+                    response = exception_handler(exc, {})
+                    throttled = HttpResponse(
+                        renderer.render(response.data),
+                        status=response.status_code,
+                        content_type=renderer.media_type,
+                    )
+                    throttled["Retry-After"] = response["Retry-After"]
+                    return throttled
+
+            cache_key = CACHE_KEY.format(
+                version=".".join(map(str, await aget_versions(version_keys(**kwargs)))),
+                format=renderer.format,
+                path=request.get_full_path(),
+            )
+            content = await async_cache_get(cache_key)
+            if content is not None:
+                return HttpResponse(content, content_type=renderer.media_type)
+
+            try:
+                with use_replica():
+                    data = await view(request, *args, **kwargs)
+                status = 200
+            except (APIException, Http404) as exc:
+                response = exception_handler(exc, {})
+                data, status = response.data, response.status_code
+
+            content = renderer.render(data)
+            if status == 200:
+                await async_cache_set(cache_key, content, timeout)
+            return HttpResponse(content, status=status, content_type=renderer.media_type)
+
+        return wrapper
+
+    return decorator
+
+
+def get_product_viewset(request, action, **kwargs):
+    # reuse the filters, search and ordering of ProductViewSet,
+    # they only build the queryset without querying
+    return ProductViewSet(
+        request=request, args=(), kwargs=kwargs, format_kwarg=None, action=action
+    )
+
+
+# same cache and search throttling as ProductViewSet.list
+@catalog_view(
+    timeout=60 * 5,
+    version_keys=get_list_keys,
+    throttle_scope=lambda request: get_product_viewset(request, "list").throttle_scope,
+)
+async def product_list(request):
+    view = get_product_viewset(request, "list")
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.pagination_class()
+    products = await paginator.apaginate_queryset(queryset, request, view)
+    serializer = ProductSerializer(products, many=True, context={"request": request})
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@catalog_view(timeout=60 * 60, version_keys=get_product_keys)  # same as ProductViewSet.retrieve
+async def product_detail(request, pk):
+    view = get_product_viewset(request, "retrieve", pk=pk)
+    product = await view.get_queryset().filter(pk=pk).afirst()
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    return ProductSerializer(product, context={"request": request}).data
+
+
+@catalog_view(timeout=60 * 60, version_keys=lambda product_pk: get_product_keys(product_pk))
+async def product_images(request, product_pk):
+    images = [image async for image in ProductImage.objects.filter(product_id=product_pk)]
+    serializer = ProductImageSerializer(images, many=True, context={"request": request})
+    return {"images": serializer.data}
+
+
+@catalog_view(timeout=60 * 60)
+async def category_list(request):
+    categories = [category async for category in Category.objects.order_by("id")]
+    return CategorySerializer(categories, many=True).data
+
+
+@catalog_view(timeout=60 * 5)
+async def review_list(request, product_pk):
+    queryset = Review.objects.select_related("customer__user").filter(product_id=product_pk)
+    paginator = ReviewPagination()
+    reviews = await paginator.apaginate_queryset(queryset, request)
+    serializer = ReviewSerializer(reviews, many=True, context={"request": request})
+    return paginator.get_paginated_response(serializer.data).data
@@ -0,0 +1,74 @@
+import time
+
+from django.core.cache import cache
+
+from core.cache import async_cache_get_int
+
+
+# The cached catalog responses (ProductViewSet and the async catalog) are
+# invalidated by versions instead of being found and deleted: the catalog
+# version (bumped by price runs and category changes) for all of them, plus
+# the list version (any product change) for the list pages and the product's
+# own version for its detail. The versions are timestamps, so a version that
+# was evicted can't come back with the value of an older one.
+CATALOG_VERSION_KEY = "catalog:version"
+LIST_VERSION_KEY = "catalog:list:version"
+PRODUCT_VERSION_KEY = "catalog:product:{pk}:version"
+# longer than a cached product detail lives, fresh and stale
+PRODUCT_VERSION_TIMEOUT = 60 * 60 * 24
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    return tuple(versions.get(key, 0) for key in keys)
+
+
+async def aget_versions(keys):
+    return tuple([await async_cache_get_int(key) or 0 for key in keys])
+
+
+def get_list_keys():
+    return [CATALOG_VERSION_KEY, LIST_VERSION_KEY]
+
+
+def get_product_keys(pk):
+    return [CATALOG_VERSION_KEY, PRODUCT_VERSION_KEY.format(pk=pk)]
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_list_version():
+    cache.set(LIST_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_product_versions(pks):
+    version = time.time_ns()
+    cache.set_many(
+        {PRODUCT_VERSION_KEY.format(pk=pk): version for pk in pks},
+        timeout=PRODUCT_VERSION_TIMEOUT,
+    )
+
+
+# surrogate keys of the CDN cached responses (core.purge): every response is
+# tagged with the products and categories it contains, and the list pages
+# with PRODUCT_LIST_KEY since a new or edited product can move them all
+PRODUCT_LIST_KEY = "products"
+
+
+def product_key(product_id):
+    return f"product-{product_id}"
+
+
+def category_key(category_id):
+    return f"category-{category_id}"
+
+
+def get_surrogate_keys(products):
+    keys = set()
+    for product in products:
+        keys.add(product_key(product["id"]))
+        if product.get("category"):
+            keys.add(category_key(product["category"]["id"]))
+    return keys
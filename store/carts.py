@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core import signing
+
+
+# anonymous carts are found again with a signed and expiring token sent as a
+# cookie (browsers) or an X-Cart-Token header (apps), instead of the session,
+# so anonymous visitors never read or write a django_session row
+CART_TOKEN_HEADER = "X-Cart-Token"
+CART_TOKEN_SALT = "store.cart"
+
+
+def make_cart_token(cart):
+    return signing.TimestampSigner(salt=CART_TOKEN_SALT).sign(str(cart.pk))
+
+
+def read_cart_token(token):
+    """The cart id in the token, None when it was altered or has expired."""
+    try:
+        return signing.TimestampSigner(salt=CART_TOKEN_SALT).unsign(
+            token, max_age=settings.CART_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+
+
+def get_request_cart_id(request):
+    token = request.headers.get(CART_TOKEN_HEADER) or request.COOKIES.get(settings.CART_TOKEN_COOKIE)
+    return read_cart_token(token) if token else None
+
+
+def set_cart_token(response, token):
+    response[CART_TOKEN_HEADER] = token
+    response.set_cookie(
+        settings.CART_TOKEN_COOKIE,
+        token,
+        max_age=settings.CART_TOKEN_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+def delete_cart_token(response):
+    response.delete_cookie(settings.CART_TOKEN_COOKIE, samesite="Lax")
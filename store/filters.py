@@ -1,12 +1,14 @@
-from django_filters import FilterSet
+from django_filters import FilterSet, NumberFilter
 
 from store.models import Product
 
 
 class ProductFilter(FilterSet):
+    # filter on the id directly, a model choice filter would load the category
+    category_id = NumberFilter(field_name='category_id')
+
     class Meta:
         model = Product
         fields = {
-            'category_id': ['exact'],
             'price': ['lt', 'gt'],
         }
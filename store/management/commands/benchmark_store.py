@@ -0,0 +1,284 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from store.models import Customer, Product
+from store.management.commands.seed_store import WORDS
+
+
+PAGE_SIZE = 12
+# the workers start the measured requests together, a worker whose warmup
+# takes longer than this (or fails) makes the scenario fail
+BARRIER_TIMEOUT = 300
+
+
+class TestClientSession:
+    """Requests go through django's test client in this process."""
+
+    def __init__(self, token):
+        self.client = Client(
+            HTTP_HOST="localhost",
+            HTTP_AUTHORIZATION=f"Token {token}",
+            raise_request_exception=False,
+        )
+
+    def request(self, method, path, data=None):
+        response = self.client.generic(
+            method, path, json.dumps(data) if data else "", content_type="application/json"
+        )
+        return response.status_code
+
+
+class HttpSession:
+    """Requests go over http to a running server (runserver, gunicorn, ...)."""
+
+    def __init__(self, token, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Token {token}"
+
+    def request(self, method, path, data=None):
+        return self.session.request(method, f"{self.base_url}{path}", json=data).status_code
+
+
+class Scenario:
+    def __init__(self, context):
+        self.context = context
+
+    def setup(self, session, rng):
+        # untimed requests needed before the measured one
+        pass
+
+    def build(self, rng):
+        # returns (method, path, data)
+        raise NotImplementedError
+
+
+class ProductList(Scenario):
+    def build(self, rng):
+        pages = max(1, len(self.context["product_ids"]) // PAGE_SIZE)
+        return "GET", f"/store/products/?page={rng.randint(1, min(pages, 100))}", None
+
+
+class ProductSearch(Scenario):
+    def build(self, rng):
+        return "GET", f"/store/products/?search={rng.choice(WORDS)}", None
+
+
+class ProductRetrieve(Scenario):
+    def build(self, rng):
+        return "GET", f"/store/products/{rng.choice(self.context['product_ids'])}/", None
+
+
+class CartAdd(Scenario):
+    def build(self, rng):
+        product_id = rng.choice(self.context["product_ids"])
+        return "POST", "/store/cart_items/", {"product": product_id, "quantity": 1}
+
+
+class CreateOrder(Scenario):
+    def setup(self, session, rng):
+        session.request(*CartAdd(self.context).build(rng))
+
+    def build(self, rng):
+        return "POST", "/store/orders/create-order/", None
+
+
+class OrderHistory(Scenario):
+    def build(self, rng):
+        return "GET", "/store/orders/", None
+
+
+class Favorites(Scenario):
+    def build(self, rng):
+        return "GET", "/store/favorites/", None
+
+
+SCENARIOS = {
+    "product_list": ProductList,
+    "product_search": ProductSearch,
+    "product_retrieve": ProductRetrieve,
+    "cart_add": CartAdd,
+    "create_order": CreateOrder,
+    "order_history": OrderHistory,
+    "favorites": Favorites,
+}
+
+
+def percentile(latencies, percent):
+    if len(latencies) == 1:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1]
+
+
+def summarize(latencies, duration):
+    # no latency when no request was measured (ex: --requests 0)
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"throughput": None, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "throughput": round(len(latencies) / duration, 2) if duration else None,
+        "mean": round(statistics.fmean(latencies), 2),
+        "p50": round(percentile(latencies, 50), 2),
+        "p95": round(percentile(latencies, 95), 2),
+        "p99": round(percentile(latencies, 99), 2),
+        "max": round(latencies[-1], 2),
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main store endpoints (run seed_store first) and write "
+        "throughput and p50/p95/p99 latencies to a JSON file. "
+        "Cart and order scenarios write to the database. Throttled requests "
+        "are reported apart from the errors, use --no-throttle with the test "
+        "client or THROTTLE_ENABLED=False on a server benchmarked with --base-url."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--base-url", help="Benchmark a running server instead of the test client.")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, dest="scenarios")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="benchmark.json")
+        parser.add_argument(
+            "--no-throttle", action="store_true",
+            help="Let every request through the throttles (test client only).",
+        )
+
+    def handle(self, **options):
+        self.options = options
+        if options["no_throttle"] and options["base_url"]:
+            raise CommandError(
+                "--no-throttle only applies to the test client, run the server with THROTTLE_ENABLED=False."
+            )
+        customers = list(
+            Customer.objects.select_related("user").order_by("id")[: options["concurrency"]]
+        )
+        if len(customers) < options["concurrency"] or not Product.objects.exists():
+            raise CommandError("Not enough data, run seed_store first.")
+
+        # every worker has its own user, so carts and orders don't contend
+        self.tokens = [Token.objects.get_or_create(user=customer.user)[0].key for customer in customers]
+        context = {"product_ids": list(Product.objects.values_list("id", flat=True))}
+
+        results = {}
+        throttle_enabled = settings.THROTTLE_ENABLED
+        if options["no_throttle"]:
+            # the requests run in this process, read by core.throttling
+            settings.THROTTLE_ENABLED = False
+        try:
+            for name in options["scenarios"] or SCENARIOS:
+                results[name] = self.run_scenario(name, SCENARIOS[name](context))
+                self.stdout.write(
+                    f"{name}: {results[name]['throughput']} req/s, "
+                    f"p50 {results[name]['p50']} ms, p95 {results[name]['p95']} ms, "
+                    f"p99 {results[name]['p99']} ms, errors {results[name]['errors']}, "
+                    f"throttled {results[name]['throttled']}"
+                )
+        finally:
+            settings.THROTTLE_ENABLED = throttle_enabled
+
+        report = {
+            "commit": get_commit(),
+            "created_at": timezone.now().isoformat(),
+            "target": options["base_url"] or "test-client",
+            "throttling": not options["no_throttle"],
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "products": len(context["product_ids"]),
+            "scenarios": results,
+        }
+        with open(options["output"], "w") as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def get_session(self, worker):
+        token = self.tokens[worker]
+        if self.options["base_url"]:
+            return HttpSession(token, self.options["base_url"])
+        return TestClientSession(token)
+
+    def run_scenario(self, name, scenario):
+        concurrency = self.options["concurrency"]
+        latencies = []
+        windows = []
+        errors = 0
+        throttled = 0
+        lock = threading.Lock()
+        barrier = threading.Barrier(concurrency)
+
+        def work(worker):
+            nonlocal errors, throttled
+            rng = random.Random(self.options["seed"] + worker)
+            session = self.get_session(worker)
+            count = self.options["requests"] // concurrency + (worker < self.options["requests"] % concurrency)
+            try:
+                for _ in range(self.options["warmup"]):
+                    scenario.setup(session, rng)
+                    session.request(*scenario.build(rng))
+                barrier.wait(BARRIER_TIMEOUT)
+                started = time.perf_counter()
+                for _ in range(count):
+                    scenario.setup(session, rng)
+                    request = scenario.build(rng)
+                    start = time.perf_counter()
+                    status = session.request(*request)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        latencies.append(elapsed)
+                        throttled += status == 429
+                        errors += status >= 400 and status != 429
+                with lock:
+                    windows.append((started, time.perf_counter()))
+            except BaseException:
+                # the other workers would wait at the barrier for this one
+                barrier.abort()
+                raise
+            finally:
+                # threads open their own database connection
+                connections.close_all()
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            futures = [executor.submit(work, worker) for worker in range(concurrency)]
+        failures = [future.exception() for future in futures if future.exception()]
+        if failures:
+            # the workers that failed first, not the ones stopped at the barrier
+            cause = next(
+                (exc for exc in failures if not isinstance(exc, threading.BrokenBarrierError)),
+                failures[0],
+            )
+            raise CommandError(f"The {name} scenario failed: {cause!r}") from cause
+
+        # measured phase only, from the first worker start to the last worker end
+        duration = max(end for _, end in windows) - min(start for start, _ in windows)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "throttled": throttled,
+            "duration": round(duration, 3),
+            **summarize(latencies, duration),
+        }
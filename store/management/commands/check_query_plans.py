@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from core.models import User
+from core.pagination import explain_plan
+from store.models import Cart, Category, Customer, Product
+from store.pagination import CustomPagination, FavoritePagination, ReviewPagination
+from store.views import (
+    CustomerFavoriteViewSet,
+    CustomerViewSet,
+    OrderViewSet,
+    ProductViewSet,
+    ReviewViewSet,
+)
+
+
+def view_queryset(viewset, query="", user=None, customer=None, action="list", **kwargs):
+    """The queryset a viewset lists for a request with this query string."""
+    http_request = RequestFactory().get(f"/?{query}")
+    http_request.customer = customer
+    request = Request(http_request)
+    request.user = user or AnonymousUser()
+    view = viewset(request=request, args=(), kwargs=kwargs, format_kwarg=None, action=action)
+    return view.filter_queryset(view.get_queryset())
+
+
+def get_checks():
+    """(name, queryset) for the main query of every hot endpoint, as it is paginated."""
+    product = Product.objects.order_by("id").first()
+    category = Category.objects.order_by("id").first()
+    customer = Customer.objects.select_related("user").order_by("id").first()
+    admin = User.objects.filter(is_staff=True).first() or User(is_staff=True)
+    product_id = product.id if product else 0
+    page = CustomPagination.page_size
+
+    checks = [
+        ("product list", view_queryset(ProductViewSet)[:page]),
+        (
+            "product list by category and price",
+            view_queryset(
+                ProductViewSet, f"category_id={category.id if category else 0}&price__gt=10&price__lt=100"
+            )[:page],
+        ),
+        ("product list by favorites", view_queryset(ProductViewSet, "ordering=-favorite_count")[:page]),
+        (
+            "product reviews",
+            view_queryset(ReviewViewSet, product_pk=product_id)
+            .order_by(*ReviewPagination.orderings[ReviewPagination.default_ordering])
+            [:ReviewPagination.page_size],
+        ),
+        ("customer list", view_queryset(CustomerViewSet, user=admin)[:page]),
+        (
+            "empty carts cleanup",
+            Cart.objects.filter(created_at__lt=timezone.now() - timedelta(hours=1)),
+        ),
+    ]
+    if customer:
+        checks += [
+            (
+                "order history",
+                view_queryset(OrderViewSet, user=customer.user, customer=customer)[:page],
+            ),
+            (
+                "favorites",
+                view_queryset(CustomerFavoriteViewSet, user=customer.user)
+                .order_by(FavoritePagination.ordering)[:FavoritePagination.page_size],
+            ),
+        ]
+    return checks
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+def postgresql_problems(queryset, threshold, analyze):
+    plan = explain_plan(queryset, analyze)
+    problems = []
+    for node in walk(plan):
+        rows = node.get("Actual Rows" if analyze else "Plan Rows", 0)
+        if node["Node Type"] == "Seq Scan" and rows > threshold:
+            problems.append(f"sequential scan of {node['Relation Name']} ({rows} rows)")
+        elif node["Node Type"] in ("Sort", "Incremental Sort") and rows > threshold:
+            problems.append(f"sort of {rows} rows on {', '.join(node['Sort Key'])}")
+    return plan.get("Total Cost"), problems
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the main query of every hot endpoint and fail when a plan has a "
+        "sequential scan or a sort above --rows rows, so missing indexes are "
+        "caught before production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Rows above which a scan or sort is flagged.")
+        parser.add_argument("--analyze", action="store_true", help="Use EXPLAIN ANALYZE (runs the queries).")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the plan of every query.")
+
+    def handle(self, rows, analyze, verbose_plans, **options):
+        failures = 0
+        for name, queryset in get_checks():
+            if connections[queryset.db].vendor != "postgresql":
+                # other databases have no usable row estimates
+                raise CommandError("Query plans can only be checked on PostgreSQL.")
+
+            cost, problems = postgresql_problems(queryset, rows, analyze)
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FLAG {name}"))
+                for problem in problems:
+                    self.stdout.write(f"    {problem}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK   {name}") + f" (cost {cost})")
+            if verbose_plans:
+                self.stdout.write(queryset.explain(analyze=analyze))
+
+        if failures:
+            raise CommandError(f"{failures} queries need an index")
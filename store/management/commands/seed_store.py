@@ -0,0 +1,223 @@
+import random
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
+
+from core.models import User
+from favorite.models import FavoriteItem
+from store.models import (
+    Cart,
+    CartItem,
+    Category,
+    Customer,
+    Order,
+    OrderItem,
+    Product,
+    ProductImage,
+    Review,
+)
+
+
+# rows at scale 1, --scale 100 gives 100k products, 1M reviews and ~10M order items
+BASE_COUNTS = {
+    "categories": 20,
+    "products": 1000,
+    "customers": 1000,
+    "reviews": 10000,
+    "orders": 20000,
+    "favorites": 10000,
+    "carts": 200,
+}
+IMAGES_PER_PRODUCT = 2
+MAX_ORDER_ITEMS = 9
+PASSWORD = "seed-password"
+PHONE_NUMBER = "+2010{index:08}"
+WORDS = (
+    "classic modern cotton leather wooden steel smart compact premium eco "
+    "wireless portable vintage deluxe organic ultra mini pro lite max"
+).split()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic catalog with customers, carts, orders, reviews "
+        "and favorites for benchmarks. Seeded users log in with "
+        f"+2010XXXXXXXX / {PASSWORD}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, scale, seed, batch_size, **options):
+        if User.objects.filter(phone_number=PHONE_NUMBER.format(index=0)).exists():
+            raise CommandError("The database is already seeded.")
+
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.counts = {
+            name: max(1, int(count * scale)) for name, count in BASE_COUNTS.items()
+        }
+
+        self.seed_categories()
+        self.seed_products()
+        self.seed_customers()
+        self.seed_reviews()
+        self.seed_favorites()
+        self.seed_carts()
+        self.seed_orders()
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def bulk_create(self, model, objects):
+        created = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f"{model.__name__}: {created}")
+
+    def title(self):
+        return " ".join(self.random.choices(WORDS, k=3)).title()
+
+    def seed_categories(self):
+        self.bulk_create(
+            Category,
+            (Category(title=f"{self.title()} {index}") for index in range(self.counts["categories"])),
+        )
+        self.category_ids = list(Category.objects.order_by("id").values_list("id", flat=True))
+
+    def seed_products(self):
+        def products():
+            for index in range(self.counts["products"]):
+                title = f"{self.title()} {index}"
+                yield Product(
+                    title=title,
+                    slug=slugify(title),
+                    description=" ".join(self.random.choices(WORDS, k=30)),
+                    price=Decimal(self.random.randint(100, 99999)) / 100,
+                    # large enough for the benchmarks to keep ordering
+                    inventory=1000000,
+                    category_id=self.random.choice(self.category_ids),
+                )
+
+        self.bulk_create(Product, products())
+        self.product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        self.bulk_create(
+            ProductImage,
+            (
+                ProductImage(product_id=product_id, image=f"store/images/products/seed-{product_id}-{index}.jpg")
+                for product_id in self.product_ids
+                for index in range(IMAGES_PER_PRODUCT)
+            ),
+        )
+
+    def seed_customers(self):
+        # hash once, every seeded user has the same password
+        password = make_password(PASSWORD)
+        for batch in batched(range(self.counts["customers"]), self.batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    User(
+                        phone_number=PHONE_NUMBER.format(index=index),
+                        password=password,
+                        first_name=self.random.choice(WORDS).title(),
+                        last_name=self.random.choice(WORDS).title(),
+                    )
+                    for index in batch
+                )
+                # same as the post_save signal that bulk_create skips
+                Customer.objects.bulk_create(Customer(user=user) for user in users)
+        self.stdout.write(f"Customer: {self.counts['customers']}")
+        self.customer_ids = list(Customer.objects.order_by("id").values_list("id", flat=True))
+        self.user_ids = dict(Customer.objects.values_list("id", "user_id"))
+
+    def sample_products(self, count):
+        return self.random.sample(self.product_ids, min(count, len(self.product_ids)))
+
+    def seed_reviews(self):
+        per_customer = max(1, self.counts["reviews"] // len(self.customer_ids))
+        self.bulk_create(
+            Review,
+            (
+                Review(
+                    customer_id=customer_id,
+                    product_id=product_id,
+                    rate=self.random.randint(1, 5),
+                    description=" ".join(self.random.choices(WORDS, k=12)),
+                )
+                for customer_id in self.customer_ids
+                for product_id in self.sample_products(per_customer)
+            ),
+        )
+
+    def seed_favorites(self):
+        content_type = ContentType.objects.get_for_model(Product)
+        per_customer = max(1, self.counts["favorites"] // len(self.customer_ids))
+        self.bulk_create(
+            FavoriteItem,
+            (
+                FavoriteItem(
+                    user_id=self.user_ids[customer_id],
+                    content_type=content_type,
+                    object_id=product_id,
+                )
+                for customer_id in self.customer_ids
+                for product_id in self.sample_products(per_customer)
+            ),
+        )
+        favorites = (
+            FavoriteItem.objects.filter(content_type=content_type, object_id=OuterRef("pk"))
+            .order_by()
+            .values("object_id")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        Product.objects.update(favorite_count=Coalesce(Subquery(favorites), Value(0)))
+
+    def seed_carts(self):
+        customer_ids = self.customer_ids[: self.counts["carts"]]
+        self.bulk_create(Cart, (Cart(customer_id=customer_id) for customer_id in customer_ids))
+        self.bulk_create(
+            CartItem,
+            (
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=self.random.randint(1, 3))
+                for cart_id in Cart.objects.filter(customer_id__in=customer_ids).values_list("id", flat=True)
+                for product_id in self.sample_products(self.random.randint(1, 5))
+            ),
+        )
+
+    def seed_orders(self):
+        prices = dict(Product.objects.values_list("id", "price"))
+        items = 0
+        for batch in batched(range(self.counts["orders"]), self.batch_size):
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(
+                    Order(customer_id=self.random.choice(self.customer_ids)) for _ in batch
+                )
+                order_items = [
+                    OrderItem(
+                        order=order,
+                        product_id=product_id,
+                        quantity=self.random.randint(1, 3),
+                        current_price=prices[product_id],
+                    )
+                    for order in orders
+                    for product_id in self.sample_products(self.random.randint(1, MAX_ORDER_ITEMS))
+                ]
+                OrderItem.objects.bulk_create(order_items, batch_size=self.batch_size)
+            items += len(order_items)
+        self.stdout.write(f"Order: {self.counts['orders']}, OrderItem: {items}")
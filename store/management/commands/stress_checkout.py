@@ -0,0 +1,211 @@
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from rest_framework.authtoken.models import Token
+
+from core.models import User
+from store.management.commands.benchmark_store import HttpSession, TestClientSession, percentile
+from store.models import Cart, CartItem, Category, Customer, Order, OrderItem, Product
+
+
+CATEGORY_TITLE = "Checkout stress test"
+PHONE_NUMBER = "+20190000{index:04}"
+
+
+class LockWaitTimer:
+    """execute_wrapper that sums the time spent in SELECT ... FOR UPDATE."""
+
+    def __init__(self):
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if "FOR UPDATE" not in sql:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+
+
+def checkout(token, base_url, barrier):
+    """Wait for every worker, then create an order. Returns (status, latency, lock wait)."""
+    session = HttpSession(token, base_url) if base_url else TestClientSession(token)
+    timer = LockWaitTimer()
+    try:
+        with connection.execute_wrapper(timer):
+            barrier.wait()
+            start = time.perf_counter()
+            status = session.request("POST", "/store/orders/create-order/")
+            latency = time.perf_counter() - start
+    finally:
+        connections.close_all()
+    # over http the lock wait happens in the server
+    return status, latency, None if base_url else timer.duration
+
+
+def process_checkout(args):
+    return checkout(*args, barrier=process_barrier)
+
+
+def init_process(barrier):
+    global process_barrier
+    process_barrier = barrier
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire create-order simultaneously from many customers whose carts target "
+        "a few hot products, then check that inventory never went negative, that "
+        "the ordered quantities match the consumed inventory and that every "
+        "order is accounted for. Meaningful only on PostgreSQL, SQLite "
+        "serializes every write."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--mode", choices=["threads", "processes"], default="threads")
+        parser.add_argument("--hot-products", type=int, default=3)
+        parser.add_argument("--quantity", type=int, default=1, help="Quantity of each product in a cart.")
+        parser.add_argument(
+            "--inventory",
+            type=int,
+            help="Inventory of each hot product, defaults to half the demand so some checkouts must fail.",
+        )
+        parser.add_argument("--base-url", help="Stress a running server instead of the test client.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated data.")
+
+    def handle(self, workers, mode, hot_products, quantity, inventory, base_url, seed, keep, **options):
+        if inventory is None:
+            inventory = max(1, workers * quantity // 2)
+
+        self.cleanup()
+        products, customers, tokens = self.setup(workers, hot_products, quantity, inventory, seed)
+        try:
+            start = time.perf_counter()
+            if mode == "threads":
+                barrier = threading.Barrier(workers)
+                with ThreadPoolExecutor(workers) as executor:
+                    results = list(executor.map(lambda token: checkout(token, base_url, barrier), tokens))
+            else:
+                # children must not share the parent's database connections
+                connections.close_all()
+                context = multiprocessing.get_context("fork")
+                with context.Pool(workers, init_process, (context.Barrier(workers),)) as pool:
+                    results = pool.map(process_checkout, [(token, base_url) for token in tokens])
+            duration = time.perf_counter() - start
+
+            self.report(results, duration)
+            # in a transaction the reads go to the primary, not to a lagging replica
+            with transaction.atomic():
+                failures = self.verify(results, products, customers, inventory)
+        finally:
+            if not keep:
+                self.cleanup()
+
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("All checks passed."))
+
+    def setup(self, workers, hot_products, quantity, inventory, seed):
+        rng = random.Random(seed)
+        password = make_password(None)
+        with transaction.atomic():
+            category = Category.objects.create(title=CATEGORY_TITLE)
+            products = Product.objects.bulk_create(
+                Product(
+                    title=f"Hot product {index}",
+                    slug=f"hot-product-{index}",
+                    description="Checkout stress test",
+                    price=10,
+                    inventory=inventory,
+                    category=category,
+                )
+                for index in range(hot_products)
+            )
+            users = User.objects.bulk_create(
+                User(phone_number=PHONE_NUMBER.format(index=index), password=password)
+                for index in range(workers)
+            )
+            customers = Customer.objects.bulk_create(Customer(user=user) for user in users)
+            carts = Cart.objects.bulk_create(Cart(customer=customer) for customer in customers)
+            # every cart has the hot products inserted in a random order,
+            # a checkout that locks in that order can deadlock
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product=product, quantity=quantity)
+                for cart in carts
+                for product in rng.sample(products, len(products))
+            )
+            tokens = Token.objects.bulk_create(
+                Token(user=user, key=Token.generate_key()) for user in users
+            )
+        return products, customers, [token.key for token in tokens]
+
+    def report(self, results, duration):
+        created = [result for result in results if result[0] == 201]
+        rejected = [result for result in results if result[0] == 400]
+        latencies = sorted(latency * 1000 for _, latency, _ in results)
+        self.stdout.write(
+            f"checkouts: {len(results)}, created: {len(created)}, rejected: {len(rejected)}, "
+            f"errors: {len(results) - len(created) - len(rejected)}"
+        )
+        self.stdout.write(
+            f"orders/s: {len(created) / duration:.2f}, "
+            f"latency p50 {percentile(latencies, 50):.2f} ms, p95 {percentile(latencies, 95):.2f} ms, "
+            f"max {latencies[-1]:.2f} ms"
+        )
+        lock_waits = [lock_wait * 1000 for _, _, lock_wait in results if lock_wait is not None]
+        if lock_waits:
+            self.stdout.write(
+                f"lock wait: total {sum(lock_waits):.2f} ms, "
+                f"mean {sum(lock_waits) / len(lock_waits):.2f} ms, max {max(lock_waits):.2f} ms"
+            )
+
+    def verify(self, results, products, customers, inventory):
+        failures = []
+        created = sum(status == 201 for status, _, _ in results)
+        errors = [status for status, _, _ in results if status not in (201, 400)]
+        if errors:
+            failures.append(f"{len(errors)} checkouts failed with {sorted(set(errors))}")
+
+        orders = Order.objects.filter(customer__in=customers)
+        if orders.count() != created:
+            failures.append(f"{created} checkouts succeeded but {orders.count()} orders exist")
+        # an order consumes the cart, a rejected checkout keeps it
+        carts = Cart.objects.filter(customer__in=customers).count()
+        if carts != len(customers) - created:
+            failures.append(f"{carts} carts left for {len(customers) - created} rejected checkouts")
+
+        ordered = dict(
+            OrderItem.objects.filter(order__in=orders)
+            .values_list("product_id")
+            .annotate(quantity=Sum("quantity"))
+        )
+        for product in Product.objects.filter(pk__in=[product.pk for product in products]):
+            if product.inventory < 0:
+                failures.append(f"{product.title} inventory is negative ({product.inventory})")
+            consumed = inventory - product.inventory
+            if consumed != ordered.get(product.pk, 0):
+                failures.append(
+                    f"{product.title} lost {consumed} from inventory "
+                    f"but {ordered.get(product.pk, 0)} were ordered"
+                )
+        return failures
+
+    def cleanup(self):
+        with transaction.atomic():
+            users = User.objects.filter(phone_number__startswith=PHONE_NUMBER[:9])
+            OrderItem.objects.filter(order__customer__user__in=users).delete()
+            Order.objects.filter(customer__user__in=users).delete()
+            CartItem.objects.filter(product__category__title=CATEGORY_TITLE).delete()
+            users.delete()
+            Product.objects.filter(category__title=CATEGORY_TITLE).delete()
+            Category.objects.filter(title=CATEGORY_TITLE).delete()
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.pricing import PriceRule, update_prices
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply a JSON list of price rules (see store.pricing.PriceRule) to the "
+        "products, in short transactions. Use --dry-run to review the changes first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("rules", help="Path of a JSON file with a list of rules.")
+        parser.add_argument("--dry-run", action="store_true", help="Show the changes without saving them.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Products updated per transaction.")
+        parser.add_argument("--show", type=int, default=20, help="Number of changes to print.")
+        parser.add_argument(
+            "--product", type=int, action="append", dest="product_ids",
+            help="Only this product, ex: the ones locked in an earlier run.",
+        )
+
+    def handle(self, rules, dry_run, batch_size, show, product_ids, **options):
+        try:
+            with open(rules) as file:
+                rules = [PriceRule.from_dict(rule) for rule in json.load(file)]
+        except (OSError, ValueError, TypeError) as exc:
+            raise CommandError(f"Invalid rules file: {exc}")
+
+        run = update_prices(rules, batch_size=batch_size, dry_run=dry_run, product_ids=product_ids)
+
+        if run.changes:
+            self.stdout.write(f"{'product':>10} {'old price':>10} {'new price':>10}")
+        for change in run.changes[:show]:
+            self.stdout.write(f"{change.product_id:>10} {change.old_price:>10} {change.new_price:>10}")
+        if len(run.changes) > show:
+            self.stdout.write(f"... {len(run.changes) - show} more")
+
+        self.stdout.write(
+            f"{len(run.changes)} of {run.matched} matching products "
+            f"{'would change' if dry_run else 'changed'}, {run.clamped} clamped to the price range"
+        )
+        if run.locked:
+            self.stdout.write(self.style.WARNING(
+                f"{len(run.locked)} products were locked by checkouts and kept their price, "
+                f"rerun with: {' '.join(f'--product {product_id}' for product_id in run.locked)}"
+            ))
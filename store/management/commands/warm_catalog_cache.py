@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import warming
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the cached product list pages and product details that "
+        "were requested the most in the last 24 hours (see store.warming). "
+        "Run it after a deploy or a cache flush."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages", type=int, default=settings.CATALOG_WARM_PAGES,
+            help="Number of list pages (page, category and ordering) to warm.",
+        )
+        parser.add_argument(
+            "--products", type=int, default=settings.CATALOG_WARM_PRODUCTS,
+            help="Number of product details to warm.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.CATALOG_WARM_CONCURRENCY,
+            help="Pages rendered at the same time, each with its own database connection.",
+        )
+        parser.add_argument("--show", action="store_true", help="Only print the urls that would be warmed.")
+
+    def handle(self, pages, products, concurrency, show, **options):
+        if show:
+            for kind, count in [(warming.LIST, pages), (warming.DETAIL, products)]:
+                for url in warming.get_top_urls(kind, count):
+                    self.stdout.write(url)
+            return
+
+        run = warming.warm_catalog_cache(pages=pages, products=products, concurrency=concurrency)
+        for url, error in run.failed:
+            self.stdout.write(self.style.WARNING(f"{url}: {error}"))
+        self.stdout.write(f"Warmed {run.warmed} pages in {run.duration:.1f}s, {len(run.failed)} failed")
@@ -0,0 +1,60 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from store.carts import get_request_cart_id
+from store.models import Cart, Customer
+
+
+def get_customer(request):
+    if not hasattr(request, "_cached_customer"):
+        user = request.user
+        request._cached_customer = (
+            Customer.objects.filter(user=user).first()
+            if user.is_authenticated
+            else None
+        )
+    return request._cached_customer
+
+
+def get_cart(request):
+    if not hasattr(request, "_cached_cart"):
+        customer = get_customer(request)
+        if customer:
+            # get the cart from customer
+            cart = Cart.objects.filter(customer=customer).first()
+        else:
+            # anonymous cart from the signed cart token, a cart that has been
+            # given to a customer at login isn't reachable with it anymore
+            cart_id = get_request_cart_id(request)
+            cart = (
+                Cart.objects.filter(pk=cart_id, customer__isnull=True).first()
+                if cart_id
+                else None
+            )
+        request._cached_cart = cart
+    return request._cached_cart
+
+
+class CustomerMiddleware:
+    """
+    Add request.customer and request.cart, resolved on first access and then
+    memoized so a request looks them up at most once.
+
+    They are lazy objects: they are resolved after DRF has authenticated the
+    user, and when there is no customer/cart they wrap None, so check them with
+    `if request.customer:` and use `request.customer or None` to get a real None.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.customer = SimpleLazyObject(lambda: get_customer(request))
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        # under ASGI this returns the coroutine of the async handler
+        return self.get_response(request)
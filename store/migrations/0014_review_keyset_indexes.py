@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_alter_orderitem_order'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-created_at', '-id'], name='store_review_product_created'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-rate', '-id'], name='store_review_product_rate'),
+        ),
+    ]
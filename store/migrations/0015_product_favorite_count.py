@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_favorites(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    FavoriteItem = apps.get_model('favorite', 'FavoriteItem')
+    Product = apps.get_model('store', 'Product')
+
+    content_type = ContentType.objects.filter(app_label='store', model='product').first()
+    if content_type is None:
+        return
+    favorites = (
+        FavoriteItem.objects.filter(content_type=content_type, object_id=OuterRef('pk'))
+        .order_by()
+        .values('object_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Product.objects.update(favorite_count=Coalesce(Subquery(favorites), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_review_keyset_indexes'),
+        ('favorite', '0002_favoriteitem_favorite_unique_user_object'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_favorites, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-favorite_count', 'id'], name='store_product_favorites'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:10
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+# full text index of the ProductAdmin search, PostgreSQL only so it isn't
+# declared on the model (the tests and local dev run on SQLite)
+def get_index():
+    return GinIndex(SearchVector('title', 'description', config='simple'), name='store_product_search')
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # without locking the products table while it is built
+        schema_editor.add_index(apps.get_model('store', 'Product'), get_index(), concurrently=True)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('store', 'Product'), get_index(), concurrently=True)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('store', '0016_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
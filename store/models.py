@@ -52,12 +52,24 @@ class Product(models.Model):
     )
     inventory = models.IntegerField(validators=[MinValueValidator(0)])
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    # denormalized count of FavoriteItem rows, updated by the favorite toggle
+    favorite_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     last_update = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            # "most favorited" sort
+            models.Index(fields=["-favorite_count", "id"], name="store_product_favorites"),
+            # ?category_id=&price__gt=&price__lt= filter
+            models.Index(fields=["category", "price"], name="store_product_category_price"),
+        ]
+        # + store_product_search, the full text index of the admin search,
+        # created on PostgreSQL only by migration 0017
+
 
 class ProductImage(models.Model):
     image = models.ImageField(upload_to="store/images/products")
@@ -82,6 +94,17 @@ class Review(models.Model):
         unique_together = [
             ["customer", "product"],
         ]
+        # support the keyset pagination of the public review feed
+        indexes = [
+            models.Index(
+                fields=["product", "-created_at", "-id"],
+                name="store_review_product_created",
+            ),
+            models.Index(
+                fields=["product", "-rate", "-id"],
+                name="store_review_product_rate",
+            ),
+        ]
 
 
 class Cart(models.Model):
@@ -93,6 +116,12 @@ class Cart(models.Model):
         Customer, on_delete=models.CASCADE, null=True, blank=True
     )
 
+    class Meta:
+        indexes = [
+            # old carts cleanup
+            models.Index(fields=["created_at"], name="store_cart_created_at"),
+        ]
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="cart_items")
@@ -121,6 +150,14 @@ class Order(models.Model):
         default=PENDING_PAYMENT_STATUS,
     )
 
+    class Meta:
+        indexes = [
+            # order history of a customer, newest first
+            models.Index(
+                fields=["customer", "-placed_at", "-id"], name="store_order_customer_placed"
+            ),
+        ]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
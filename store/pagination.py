@@ -1,6 +1,157 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class CustomPagination(PageNumberPagination):
     page_size = 12
     page_size_query_param = 'size'
-    
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # same pages as paginate_queryset with the async ORM,
+        # the count is done here so the paginator doesn't query
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        return [obj async for obj in self.page.object_list]
+
+
+class KeysetPagination(BasePagination):
+    # paginate with WHERE (a, b) < (last_a, last_b) instead of OFFSET
+    # so every page costs the same no matter how deep the client goes
+    page_size = 20
+    page_size_query_param = 'size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    # maps the ordering query param to the keyset columns,
+    # the last column must be unique (usually the id)
+    orderings = {}
+    default_ordering = None
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([obj async for obj in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering_key = request.query_params.get(
+            self.ordering_query_param, self.default_ordering
+        )
+        if self.ordering_key not in self.orderings:
+            self.ordering_key = self.default_ordering
+        self.ordering = self.orderings[self.ordering_key]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        # fetch one more row to know if there is a next page
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_keyset_filter(self, position):
+        # (a, b, c) after (x, y, z) means:
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        keyset_filter = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset_filter |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return keyset_filter
+
+    def encode_cursor(self, obj):
+        position = [str(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_first_link(self):
+        return remove_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'first': self.get_first_link(),
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class ReviewPagination(KeysetPagination):
+    orderings = {
+        '-created_at': ['-created_at', '-id'],
+        'created_at': ['created_at', 'id'],
+        '-rate': ['-rate', '-id'],
+        'rate': ['rate', 'id'],
+    }
+    default_ordering = '-created_at'
+
+
+class FavoritePagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'size'
+    max_page_size = 100
+    # newest favorites first
+    ordering = '-id'
@@ -1,7 +1,5 @@
 from rest_framework.permissions import BasePermission
 
-from store.models import Customer
-
 
 class IsOwnerOrAdmin(BasePermission):
     # override has_object_permission because we need to check
@@ -15,11 +13,25 @@ class IsCartItemOwnerOrAdmin(BasePermission):
         if request.user.is_staff:
             # admin can do everything
             return True
-        elif request.user.is_authenticated:
-            # authenticated user can update/delete their items only
-            customer = Customer.objects.get(user=request.user)
-            return obj.cart.customer == customer
-        else:
-            # unauthenticated users can update/delete items form cart in the session
-            session_cart_id = request.session.get("cart_id")
-            return str(obj.cart.id) == str(session_cart_id)
+        # authenticated user can update/delete their items only
+        # and unauthenticated users can update/delete items form the cart of their cart token
+        cart = request.cart
+        return bool(cart) and obj.cart_id == cart.pk
+
+
+class IsCustomerOwnerOrAdmin(BasePermission):
+    # nested customer routes (/customers/<customer_pk>/...) of the customer's own user
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        customer = request.customer
+        return bool(customer) and str(customer.pk) == view.kwargs["customer_pk"]
+
+
+class IsCartOwnerOrAdmin(BasePermission):
+    def has_object_permission(self, request, view, obj):
+        if request.user.is_staff:
+            return True
+        # the customer's cart, or the cart token's cart for unauthenticated users
+        cart = request.cart
+        return bool(cart) and obj.pk == cart.pk
@@ -0,0 +1,179 @@
+from decimal import ROUND_HALF_UP, Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, Q, Value, When
+
+from core.purge import purge
+from .cache import PRODUCT_LIST_KEY, bump_catalog_version, product_key
+from .models import Product
+
+
+# Product.price is DecimalField(max_digits=5, decimal_places=2, MinValueValidator(1))
+PRICE_MIN = Decimal("1.00")
+PRICE_MAX = Decimal("999.99")
+CENT = Decimal("0.01")
+
+
+class PriceRule:
+    """
+    A declarative price change, built from a dict such as:
+
+        {
+            "name": "summer sale",
+            "type": "percentage",      # or "absolute"
+            "value": "-10",            # -10% (or -10.00 for absolute)
+            "categories": [1, 2],      # optional, every category by default
+            "filter": {"price__gte": "50"},  # optional Product lookups
+            "round": "0.05",           # optional, round to a multiple of 0.05
+            "min": "5", "max": "500",  # optional clamps
+        }
+
+    The matching rules of a product are applied one after the other.
+    """
+
+    TYPES = ["percentage", "absolute"]
+
+    def __init__(self, type, value, name=None, categories=None, filter=None, round=None, min=None, max=None):
+        if type not in self.TYPES:
+            raise ValueError(f"Unknown rule type {type!r}, use one of {self.TYPES}")
+        self.type = type
+        self.value = Decimal(str(value))
+        self.name = name or f"{type} {value}"
+        self.categories = categories
+        self.filter = filter or {}
+        self.step = Decimal(str(round)) if round else CENT
+        self.min = Decimal(str(min)) if min is not None else None
+        self.max = Decimal(str(max)) if max is not None else None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def get_q(self):
+        q = Q(**self.filter)
+        if self.categories is not None:
+            q &= Q(category_id__in=self.categories)
+        return q
+
+    def apply(self, price):
+        if self.type == "percentage":
+            price = price * (1 + self.value / 100)
+        else:
+            price = price + self.value
+        price = (price / self.step).quantize(Decimal(1), ROUND_HALF_UP) * self.step
+        if self.min is not None:
+            price = max(price, self.min)
+        if self.max is not None:
+            price = min(price, self.max)
+        return price
+
+
+class PriceChange:
+    def __init__(self, product_id, old_price, new_price):
+        self.product_id = product_id
+        self.old_price = old_price
+        self.new_price = new_price
+
+
+class PriceRun:
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.matched = 0
+        self.changes = []
+        # new prices out of the column range, stored at the limit
+        self.clamped = 0
+        # ids locked by checkouts in every pass, left unchanged
+        self.locked = []
+
+
+def compute_price(price, rules):
+    for rule in rules:
+        price = rule.apply(price)
+    clamped = min(max(price, PRICE_MIN), PRICE_MAX).quantize(CENT, ROUND_HALF_UP)
+    return clamped, clamped != price.quantize(CENT, ROUND_HALF_UP)
+
+
+def iter_id_batches(queryset, batch_size):
+    # keyset over the ids, no long running cursor or transaction
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def run_batch(ids, rules, run):
+    """Reprice the products in ids, returns the ids that were locked by someone else."""
+    flags = {
+        f"rule_{index}": (
+            Case(When(rule.get_q(), then=Value(True)), default=Value(False), output_field=BooleanField())
+            if rule.get_q()
+            else Value(True)  # a rule without conditions matches every product
+        )
+        for index, rule in enumerate(rules)
+    }
+    queryset = Product.objects.filter(id__in=ids).annotate(**flags)
+    if not run.dry_run:
+        # a checkout holding a product is not waited for, the product is
+        # retried after the other batches
+        queryset = queryset.select_for_update(skip_locked=True)
+
+    changed = []
+    rows = list(queryset.values_list("id", "price", *flags))
+    for product_id, price, *matches in rows:
+        product_rules = [rule for rule, match in zip(rules, matches) if match]
+        if not product_rules:
+            continue
+        run.matched += 1
+        new_price, clamped = compute_price(price, product_rules)
+        run.clamped += clamped
+        if new_price != price:
+            run.changes.append(PriceChange(product_id, price, new_price))
+            changed.append(Product(id=product_id, price=new_price))
+
+    if changed and not run.dry_run:
+        # one UPDATE ... SET price = CASE id WHEN ... END for the batch
+        Product.objects.bulk_update(changed, ["price"])
+    return set(ids) - {row[0] for row in rows}
+
+
+def update_prices(rules, batch_size=500, dry_run=False, max_passes=3, product_ids=None):
+    """
+    Apply the rules to every matching product in short transactions of
+    batch_size rows, so checkouts are never stalled behind a price run, and
+    make the cached catalog responses stale. With dry_run nothing is written
+    and the returned PriceRun lists the changes that would be made.
+    The products still locked after max_passes keep their price and are
+    listed in run.locked, pass them as product_ids to reprice only them.
+    """
+    rules = [rule if isinstance(rule, PriceRule) else PriceRule.from_dict(rule) for rule in rules]
+    run = PriceRun(dry_run)
+    conditions = [rule.get_q() for rule in rules]
+    # an empty Q() means every product
+    scope = Q() if not all(conditions) else reduce(or_, conditions)
+    if product_ids is not None:
+        scope &= Q(id__in=product_ids)
+
+    pending = iter_id_batches(Product.objects.filter(scope), batch_size)
+    for _ in range(max_passes):
+        skipped = []
+        for ids in pending:
+            with transaction.atomic():
+                skipped += run_batch(ids, rules, run)
+        if not skipped:
+            break
+        skipped.sort()
+        pending = [skipped[index:index + batch_size] for index in range(0, len(skipped), batch_size)]
+    run.locked = skipped
+
+    if run.changes and not dry_run:
+        bump_catalog_version()
+        # bulk_update sends no signals, the keys are sent in batches by core.purge
+        purge([product_key(change.product_id) for change in run.changes] + [PRODUCT_LIST_KEY])
+    return run
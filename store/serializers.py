@@ -1,11 +1,16 @@
 from dataclasses import field
+from functools import partial
 from django.forms import ImageField, ValidationError
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
+from django.db import router, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from rest_framework import serializers
 
 from core.models import User
+from favorite.cache import add_favorite_product, remove_favorite_product
 from favorite.models import FavoriteItem
+from store.carts import make_cart_token
 from store.models import (
     Cart,
     CartItem,
@@ -18,7 +23,7 @@ from store.models import (
     ProductImage,
     Review,
 )
-from store.signals.handlers import order_created_signal
+from store.signals.handlers import invalidate_favorite_counts, order_created_signal
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -95,8 +100,6 @@ class UpdateCustomerSerializer(serializers.ModelSerializer):
         ]
 
     def update(self, instance, validated_data):
-        print(f'validated_data::{validated_data["image_file"]}')
-
         # Extract nested fields
         user_data = validated_data.pop("user", None)
         image_data = validated_data.pop("image_file", None)
@@ -161,9 +164,11 @@ class ProductSerializer(serializers.ModelSerializer):
             "description",
             "price",
             "inventory",
+            "favorite_count",
             "images",
             "image_file",
         ]
+        read_only_fields = ["favorite_count"]
 
     def create(self, validated_data):
         images = validated_data.pop("image_file", [])
@@ -186,18 +191,28 @@ class ProductSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+# compact author info shown on every review
+class ReviewAuthorSerializer(serializers.ModelSerializer):
+    first_name = serializers.CharField(source="user.first_name", read_only=True)
+    last_name = serializers.CharField(source="user.last_name", read_only=True)
+
+    class Meta:
+        model = Customer
+        fields = ["id", "first_name", "last_name"]
+
+
 class ReviewSerializer(serializers.ModelSerializer):
-    customer = CustomerSerializer(read_only=True)
-    product = ProductSerializer(read_only=True)
+    author = ReviewAuthorSerializer(source="customer", read_only=True)
 
     class Meta:
         model = Review
-        fields = ["rate", "description", "product", "customer"]
+        fields = ["id", "rate", "description", "author", "created_at"]
+        read_only_fields = ["id", "created_at"]
 
     def create(self, validated_data):
         product_id = self.context["product_id"]
         product = Product.objects.get(pk=product_id)
-        customer = Customer.objects.get(user_id=self.context["request"].user.id)
+        customer = self.context["request"].customer
 
         # check if review already exists
         review = Review.objects.filter(customer=customer, product=product).first()
@@ -228,21 +243,40 @@ class ToggleFavoriteProductSerializer(serializers.Serializer):
     def save(self, **kwargs):
         user = self.context["request"].user
         product_id = self.context["product"].id
-
-        # check if the user has favorite the product before then delete the FavoriteItem
         product_content_type = ContentType.objects.get_for_model(Product)
-        favorite_item = FavoriteItem.objects.filter(
-            content_type=product_content_type, object_id=product_id, user_id=user.id
-        ).first()
 
-        if favorite_item:
-            favorite_item.delete()
-            return None
-        else:
-            favorite_item = FavoriteItem.objects.create(
-                user=user, content_type=product_content_type, object_id=product_id
+        with transaction.atomic():
+            # if the user has favorite the product before then delete the FavoriteItem,
+            # a single DELETE (no Collector) whose row count tells if this request
+            # removed it: of two racing toggles only one does and uncounts it
+            deleted = FavoriteItem.objects.filter(
+                content_type=product_content_type, object_id=product_id, user_id=user.id
+            )._raw_delete(router.db_for_write(FavoriteItem))
+            if deleted:
+                # never below 0 for the favorites created before they were counted
+                Product.objects.filter(pk=product_id).update(
+                    favorite_count=Greatest(F("favorite_count") - 1, 0)
+                )
+                invalidate_favorite_counts([product_id])
+                transaction.on_commit(partial(remove_favorite_product, user.id, product_id))
+                return None
+
+            favorite_item = FavoriteItem.objects.add(
+                user.id, product_content_type.id, product_id
             )
+            if favorite_item is None:
+                # a concurrent request added it first and already counted it
+                return FavoriteItem.objects.get(
+                    content_type=product_content_type,
+                    object_id=product_id,
+                    user_id=user.id,
+                )
 
+            Product.objects.filter(pk=product_id).update(
+                favorite_count=F("favorite_count") + 1
+            )
+            invalidate_favorite_counts([product_id])
+            transaction.on_commit(lambda: add_favorite_product(user.id, product_id))
             return favorite_item
 
 
@@ -254,24 +288,6 @@ class FavoriteProductSerializer(serializers.ModelSerializer):
         fields = ["product"]
 
 
-class CustomerFavoriteProductSerializer(serializers.ModelSerializer):
-    favorites = serializers.SerializerMethodField()
-
-    def get_favorites(self, customer: Customer):
-        content_type = ContentType.objects.get_for_model(Product)
-        print(f"user_id:: {customer.user.id}")
-        favorite_item = FavoriteItem.objects.select_related("content_type").filter(
-            content_type=content_type, user_id=customer.user.id
-        )
-        return FavoriteProductSerializer(
-            favorite_item, context=self.context, many=True
-        ).data
-
-    class Meta:
-        model = Customer
-        fields = ["favorites"]
-
-
 from rest_framework.exceptions import ValidationError
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -286,7 +302,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         return cartitem.product.price * cartitem.quantity
 
     def get_cart_id(self, cartitem: CartItem):
-        return cartitem.cart.id
+        return cartitem.cart_id
 
     class Meta:
         model = CartItem
@@ -296,27 +312,16 @@ class CartItemSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         request = self.context["request"]
 
-        # check if the customer is authenticated or not
-        customer = None
-        if request.user.is_authenticated:
-            customer = Customer.objects.filter(user=request.user).first()
+        # customer is None for anonymous users
+        customer = request.customer or None
 
-        # check if the user has a cart
-        cart = Cart.objects.filter(customer=customer).first() if customer else None
+        # customer's cart or the cart of the anonymous cart token
+        cart = request.cart or None
 
         if not cart:
-            cart_id = request.session.get("cart_id")
-            if cart_id:
-                try:
-                    cart = Cart.objects.get(pk=cart_id)
-                except Cart.DoesNotExist:
-                    cart = None
-
-            if not cart:
-                cart = Cart.objects.create(customer=customer)
-                if not customer:  # only track in session for anon users
-                    request.session["cart_id"] = str(cart.id)
-                    request.session.set_expiry(60 * 60 * 24 * 7)
+            cart = Cart.objects.create(customer=customer)
+            if not customer:  # sent back by CartItemViewSet for anon users
+                request.cart_token = make_cart_token(cart)
 
         # check if the cart already has this product
         product = validated_data['product']
@@ -345,7 +350,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    items = CartItemSerializer(source="cart_items", many=True, read_only=True)
     total_price = serializers.SerializerMethodField(read_only=True)
 
     def get_total_price(self, cart: Cart):
@@ -387,30 +392,37 @@ class OrderSerializer(serializers.ModelSerializer):
 class CreateOrderSerializer(serializers.Serializer):
     def save(self, **kwargs):
         with transaction.atomic():
-            customer = Customer.objects.filter(
-                user=self.context["request"].user
-            ).first()
-            cart = Cart.objects.filter(customer=customer).first()
+            customer = self.context["request"].customer
+            cart = self.context["request"].cart
             if not customer:
                 raise ValidationError("No customer found for this user")
             
             if not cart:
                 raise ValidationError('No cart for this user')
 
-            if not cart.cart_items.exists():
+            # load the cart items with their product once, locking the products
+            # (in id order so concurrent checkouts can't deadlock) so the
+            # inventory can't be sold twice, and the cart items so the same
+            # cart can't be ordered twice
+            cart_items = list(
+                cart.cart_items.select_related("product")
+                .select_for_update(of=("self", "product"))
+                .order_by("product_id")
+            )
+            if not cart_items:
                 raise ValidationError("Cart is empty")
 
-            # Create the order first
-            order = Order.objects.create(customer=customer)
-
             # validate cart_items quantity not exceeding product.inventory
-            for cart_item in cart.cart_items.all():
+            for cart_item in cart_items:
                 if cart_item.quantity > cart_item.product.inventory:
                     raise ValidationError(
                         f"Not enough quantity for {cart_item.product.title}, "
                         f"only {cart_item.product.inventory} available"
                     )
 
+            # Create the order first
+            order = Order.objects.create(customer=customer)
+
             # bulk order_items
             order_items = [
                 OrderItem(
@@ -419,14 +431,16 @@ class CreateOrderSerializer(serializers.Serializer):
                     quantity=cart_item.quantity,
                     current_price=cart_item.product.price,
                 )
-                for cart_item in cart.cart_items.all()
+                for cart_item in cart_items
             ]
             OrderItem.objects.bulk_create(order_items)
 
             # decrease products quantity
-            for cart_item in cart.cart_items.all():
+            for cart_item in cart_items:
                 cart_item.product.inventory -= cart_item.quantity
-                cart_item.product.save()
+            Product.objects.bulk_update(
+                [cart_item.product for cart_item in cart_items], ["inventory"]
+            )
 
             # deleting the cart will also deleted it's related cart_items
             cart.delete()
@@ -1,10 +1,27 @@
 
+from functools import partial
+
 from django.conf import settings
 from django.contrib.auth.signals import user_logged_in
-from django.db.models.signals import post_save
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from store.models import Cart, Customer
+from core.purge import purge
+from favorite.cache import forget_favorite_products
+from favorite.models import FavoriteItem
+from store.cache import (
+    PRODUCT_LIST_KEY,
+    bump_catalog_version,
+    bump_list_version,
+    bump_product_versions,
+    category_key,
+    product_key,
+)
+from store.models import Cart, Category, Customer, Product, ProductImage
 from store.signals import user_logged_in_signal, order_created_signal
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -19,15 +36,16 @@ def create_customer_for_new_not_admin_user(sender, **kwargs):
 def attach_or_merge_cart_to_logged_in_user_if_available(sender, request, user, **kwargs):
     print('attach_or_merge_cart_to_logged_in_user_if_available called')
 
-    cart_id_from_session = request.session.get('cart_id')
+    # the login request is still anonymous, so request.cart is the cart token's cart
+    # while the customer has to be looked up from the user that just logged in
     customer = Customer.objects.get(user=user)
 
     cart_from_customer = Cart.objects.filter(customer=customer).first()
-    cart_from_session = Cart.objects.filter(pk=cart_id_from_session).first() if cart_id_from_session else None
+    cart_from_token = request.cart or None
 
-    if cart_from_customer and cart_from_session:
-        # merge items from session cart into customer cart
-        for item in cart_from_session.cart_items.all():
+    if cart_from_customer and cart_from_token:
+        # merge items from the anonymous cart into customer cart
+        for item in cart_from_token.cart_items.all():
             # handle same product in both carts
             existing_item = cart_from_customer.cart_items.filter(product=item.product).first()
             if existing_item:
@@ -37,16 +55,14 @@ def attach_or_merge_cart_to_logged_in_user_if_available(sender, request, user, *
                 item.cart = cart_from_customer
                 item.save()
 
-        cart_from_session.delete()
+        cart_from_token.delete()
 
-    elif not cart_from_customer and cart_from_session:
-        # no existing customer cart → just assign session cart
-        cart_from_session.customer = customer
-        cart_from_session.save()
+    elif not cart_from_customer and cart_from_token:
+        # no existing customer cart → just assign the anonymous cart
+        cart_from_token.customer = customer
+        cart_from_token.save()
 
-    # Always remove session cart reference after login
-    if 'cart_id' in request.session:
-        del request.session['cart_id']
+    # the cart token is dropped by the login view (CustomTokenCreateView)
 
 @receiver(order_created_signal)
 def order_create(sender, request, user, order, **kwargs):
@@ -54,3 +70,66 @@ def order_create(sender, request, user, order, **kwargs):
 
             
                
+
+
+# the cached catalog responses that contain the change get a new version
+# (store.cache) and the CDN's copies of them are purged, after the commit so
+# they are not rebuilt from the data being changed
+
+def invalidate_product(product_id):
+    bump_product_versions([product_id])
+    # a new or edited product can appear in or move across every list page
+    bump_list_version()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def purge_product(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_product, instance.pk))
+    purge([product_key(instance.pk), PRODUCT_LIST_KEY])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def purge_category(sender, instance, **kwargs):
+    # the category is in every product of it, rare enough to make the whole
+    # catalog stale (still served while it is rebuilt)
+    transaction.on_commit(bump_catalog_version)
+    purge([category_key(instance.pk)])
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def purge_product_image(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_product_versions, [instance.product_id]))
+    purge([product_key(instance.product_id)])
+
+
+def invalidate_favorite_counts(product_ids):
+    # favorite_count is in the cached product details and the CDN's copies of
+    # their pages. The list pages are not made stale, a favorite is too frequent
+    # for that, they catch up within ProductViewSet.list_cache_timeout
+    transaction.on_commit(partial(bump_product_versions, product_ids))
+    purge([product_key(product_id) for product_id in product_ids])
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def uncount_favorites_of_deleted_user(sender, instance, **kwargs):
+    # the favorites are deleted with the user (CASCADE), one UPDATE for all
+    # the products they favorited, the toggled off ones are uncounted by
+    # ToggleFavoriteProductSerializer
+    favorites = FavoriteItem.objects.filter(
+        user_id=instance.pk, content_type=ContentType.objects.get_for_model(Product)
+    )
+    counts = (
+        favorites.filter(object_id=OuterRef("pk"))
+        .values("object_id")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    product_ids = list(favorites.values_list("object_id", flat=True))
+    if not product_ids:
+        return
+    # never below 0 for the favorites created before they were counted
+    Product.objects.filter(pk__in=product_ids).update(
+        favorite_count=Greatest(F("favorite_count") - Subquery(counts), 0)
+    )
+    invalidate_favorite_counts(product_ids)
+    transaction.on_commit(partial(forget_favorite_products, instance.pk))
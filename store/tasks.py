@@ -1,17 +1,74 @@
+from datetime import timedelta
+
 from celery import shared_task
-from django.db.models import F, Count
-from .models import Product, Cart
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.utils import timezone
+from django.db.models import Count
+
+from core.task_runs import exclusive_task
+from . import warming
+from .models import Cart
+from .pricing import update_prices
+
+
+logger = get_task_logger(__name__)
+# seconds before the products locked during a price run are retried
+LOCKED_PRODUCTS_RETRY_DELAY = 60
+
 
+# the returned row counts are recorded in core.models.TaskRun and the task metrics
 
-@shared_task
+@exclusive_task()
 def update_products_prices():
-    Product.objects.update(price=F('price') + 1)
-    print("All product prices increased by 1")
+    # chunked and clamped to the price column, see store.pricing
+    run = update_prices(settings.PRICING_RULES)
+    logger.info("Updated %s of %s product prices", len(run.changes), run.matched)
+    if run.locked:
+        # held by checkouts through every pass, repriced once they are done
+        logger.warning("%s products were locked, retrying them: %s", len(run.locked), run.locked)
+        update_locked_products_prices.apply_async((run.locked,), countdown=LOCKED_PRODUCTS_RETRY_DELAY)
+    if run.changes:
+        # the catalog version was bumped, every cached page is cold
+        warm_catalog_cache.delay()
+    return len(run.changes)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=LOCKED_PRODUCTS_RETRY_DELAY)
+def update_locked_products_prices(self, product_ids):
+    # the products skipped by update_products_prices, these never got the
+    # rules applied so repricing them doesn't apply them twice
+    run = update_prices(settings.PRICING_RULES, product_ids=product_ids)
+    logger.info("Updated %s of %s locked product prices", len(run.changes), len(product_ids))
+    if run.locked:
+        if self.request.retries >= self.max_retries:
+            logger.error(
+                "Gave up on the prices of %s products, still locked: %s", len(run.locked), run.locked
+            )
+        else:
+            # only the ones still locked, the others are saved
+            raise self.retry(args=(run.locked,))
+    return len(run.changes)
+
+
+@exclusive_task()
+def warm_catalog_cache():
+    run = warming.warm_catalog_cache(
+        pages=settings.CATALOG_WARM_PAGES,
+        products=settings.CATALOG_WARM_PRODUCTS,
+        concurrency=settings.CATALOG_WARM_CONCURRENCY,
+    )
+    logger.info("Warmed %s catalog pages in %.1fs, %s failed", run.warmed, run.duration, len(run.failed))
+    return run.warmed
 
 
-@shared_task
+@exclusive_task()
 def delete_empty_carts():
-    Cart.objects\
+    # leave the carts created a moment ago, their first item may be on the way
+    _, deleted = Cart.objects\
+        .filter(created_at__lt=timezone.now() - timedelta(hours=1))\
         .annotate(items_count=Count("cart_items"))\
         .filter(items_count=0).delete()
-    print("Deleted all empty carts")
+    carts = deleted.get(Cart._meta.label, 0)
+    logger.info("Deleted %s empty carts", carts)
+    return carts
@@ -0,0 +1,149 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from core.models import User
+from favorite.models import FavoriteItem
+from store.models import (
+    Cart,
+    CartItem,
+    Category,
+    Order,
+    OrderItem,
+    Product,
+    ProductImage,
+    Review,
+)
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Seed a small but representative catalog and assert that every endpoint
+    stays under an explicit number of queries, so N+1 regressions fail the
+    tests with the captured SQL.
+    """
+
+    # more than a page of everything, so a page of 1 and a full page
+    # can be compared
+    CATEGORIES = 3
+    PRODUCTS_PER_CATEGORY = 5
+    IMAGES_PER_PRODUCT = 2
+    CUSTOMERS = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            "+201000000000", "password", first_name="Admin", last_name="User"
+        )
+        cls.users = [
+            User.objects.create_user(
+                f"+2010000000{index:02}",
+                "password",
+                first_name=f"First{index}",
+                last_name=f"Last{index}",
+            )
+            for index in range(1, cls.CUSTOMERS + 1)
+        ]
+        # a customer is created for every new non admin user
+        cls.customers = [user.customer for user in cls.users]
+        cls.user = cls.users[0]
+        cls.customer = cls.customers[0]
+
+        cls.categories = [
+            Category.objects.create(title=f"Category {index}")
+            for index in range(cls.CATEGORIES)
+        ]
+        cls.products = [
+            Product.objects.create(
+                title=f"Product {category.id}-{index}",
+                description="Description",
+                slug=f"product-{category.id}-{index}",
+                price=10 + index,
+                inventory=100,
+                category=category,
+            )
+            for category in cls.categories
+            for index in range(cls.PRODUCTS_PER_CATEGORY)
+        ]
+        cls.product = cls.products[0]
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f"store/images/products/{product.id}-{index}.jpg")
+            for product in cls.products
+            for index in range(cls.IMAGES_PER_PRODUCT)
+        )
+
+        Review.objects.bulk_create(
+            Review(product=product, customer=customer, rate=index % 5 + 1, description="Review")
+            for index, customer in enumerate(cls.customers)
+            for product in cls.products[:3]
+        )
+
+        product_type = ContentType.objects.get_for_model(Product)
+        FavoriteItem.objects.bulk_create(
+            FavoriteItem(user=user, content_type=product_type, object_id=product.id)
+            for user in cls.users
+            for product in cls.products[::2]
+        )
+
+        for customer in cls.customers:
+            cart = Cart.objects.create(customer=customer)
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product=product, quantity=1)
+                for product in cls.products[:4]
+            )
+            for _ in range(3):
+                order = Order.objects.create(customer=customer)
+                OrderItem.objects.bulk_create(
+                    OrderItem(order=order, product=product, quantity=2, current_price=product.price)
+                    for product in cls.products[:4]
+                )
+
+    def setUp(self):
+        # measure the uncached path
+        cache.clear()
+
+    def assertMaxQueries(self, budget, method, url, user=None, data=None, status=None, **extra):
+        """Request url and fail with the captured SQL if it runs more than budget queries."""
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method.lower())(url, data, **extra)
+
+        if status is not None:
+            self.assertEqual(
+                response.status_code, status, f"{method} {url}: {response.content[:500]}"
+            )
+        if len(context) > budget:
+            queries = "\n".join(
+                f"{index}. {query['sql']}"
+                for index, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(
+                f"{method} {url} ran {len(context)} queries, the budget is {budget}:\n{queries}"
+            )
+        return response
+
+    def assertListMaxQueries(self, budget, url, user=None, sizes=(1, 100)):
+        """Same budget whatever the page size, so the list has no N+1."""
+        separator = "&" if "?" in url else "?"
+        for size in sizes:
+            cache.clear()
+            with self.subTest(size=size):
+                self.assertMaxQueries(budget, "GET", f"{url}{separator}size={size}", user, status=200)
+
+    def assertStatuses(self, method, url, statuses, data=None):
+        """
+        Request url as an anonymous user, a customer (self.user) and an admin,
+        each in a transaction that is rolled back, and compare the statuses.
+        """
+        for user, expected in zip([None, self.user, self.admin], statuses):
+            with self.subTest(method=method, url=url, user=user):
+                cache.clear()
+                with transaction.atomic():
+                    self.client.force_authenticate(user)
+                    response = getattr(self.client, method.lower())(url, data, format="json")
+                    transaction.set_rollback(True)
+                self.assertEqual(
+                    response.status_code, expected, f"{method} {url}: {response.content[:500]}"
+                )
@@ -1,3 +1,906 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import msgpack
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+
+from core import purge
+from core.models import User
+from core.pagination import estimate_count
+from core.response_cache import StampedeCacheResponse
+from store import tasks, warming
+from store.cache import bump_catalog_version
+from store.pricing import PriceRun, run_batch, update_prices
+from store.models import CartItem, CustomerImage, Order, Product, ProductImage, Review
+from store.testing import QueryBudgetTestCase
+
+
+class ProductQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        # count + products + images
+        self.assertListMaxQueries(3, "/store/products/")
+
+    def test_list_search_filter_and_ordering(self):
+        self.assertListMaxQueries(
+            3,
+            f"/store/products/?search=Product&category_id={self.categories[0].id}"
+            "&price__gt=1&ordering=-favorite_count",
+        )
+
+    def test_list_is_favorited(self):
+        # + favorite ids of the user (from the database without redis)
+        for user in [self.user, self.admin]:
+            with self.subTest(user=user):
+                self.assertListMaxQueries(4, "/store/products/", user)
+
+    def test_retrieve(self):
+        for user in [None, self.user, self.admin]:
+            with self.subTest(user=user):
+                cache.clear()
+                self.assertMaxQueries(
+                    3, "GET", f"/store/products/{self.product.id}/", user, status=status.HTTP_200_OK
+                )
+
+    def test_favorite_toggle(self):
+        # product + images, then savepoint, delete or insert, count update, release
+        url = f"/store/products/{self.products[1].id}/favorite/"
+        self.assertMaxQueries(7, "POST", url, self.user, status=status.HTTP_200_OK)
+        self.assertMaxQueries(7, "POST", url, self.user, status=status.HTTP_200_OK)
+
+    def test_images(self):
+        self.assertMaxQueries(
+            1, "GET", f"/store/products/{self.product.id}/images/", status=status.HTTP_200_OK
+        )
+
+
+class FavoriteCountTests(QueryBudgetTestCase):
+    def test_deleted_favorites_are_uncounted(self):
+        product = self.products[1]
+        url = f"/store/products/{product.id}/favorite/"
+        # a user without orders can be deleted
+        new = User.objects.create_user("+201099999999", "password")
+        for user in [self.user, new]:
+            self.client.force_authenticate(user)
+            self.client.post(url)
+        product.refresh_from_db()
+        self.assertEqual(product.favorite_count, 2)
+
+        # with their user
+        new.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.favorite_count, 1)
+
+    def test_toggle_off_is_a_single_delete(self):
+        product = self.products[1]
+        url = f"/store/products/{product.id}/favorite/"
+        self.client.force_authenticate(self.user)
+        self.client.post(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url)
+        favorite_queries = [q["sql"] for q in queries if '"favorite_favoriteitem"' in q["sql"]]
+        self.assertEqual(len(favorite_queries), 1, favorite_queries)
+        self.assertTrue(favorite_queries[0].startswith("DELETE"))
+        product.refresh_from_db()
+        self.assertEqual(product.favorite_count, 0)
+
+    def test_user_deletion_uncounts_in_one_update(self):
+        new = User.objects.create_user("+201099999999", "password")
+        self.client.force_authenticate(new)
+        for product in self.products[1:4]:
+            self.client.post(f"/store/products/{product.id}/favorite/")
+        with CaptureQueriesContext(connection) as queries:
+            new.delete()
+        product_updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "store_product"')]
+        self.assertEqual(len(product_updates), 1, product_updates)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products[1:4]]).values_list("favorite_count", flat=True)),
+            [0, 0, 0],
+        )
+
+    def test_cached_detail_gets_the_new_count(self):
+        product = self.products[1]
+        url = f"/store/products/{product.id}/"
+        self.assertEqual(self.client.get(url).json()["favorite_count"], 0)
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{url}favorite/")
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(url).json()["favorite_count"], 1)
+
+    def test_count_never_goes_below_zero(self):
+        # seeded favorites are bulk created, not counted
+        product = self.products[0]
+        self.assertEqual(product.favorite_count, 0)
+        self.client.force_authenticate(self.user)
+        self.client.post(f"/store/products/{product.id}/favorite/")
+        product.refresh_from_db()
+        self.assertEqual(product.favorite_count, 0)
+
+
+class ReviewQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        url = f"/store/products/{self.product.id}/reviews/"
+        for user in [None, self.user, self.admin]:
+            with self.subTest(user=user):
+                self.assertListMaxQueries(1, url, user)
+        self.assertListMaxQueries(1, f"{url}?ordering=-rate")
+
+    def test_retrieve(self):
+        review = self.product.review_set.first()
+        self.assertMaxQueries(
+            1,
+            "GET",
+            f"/store/products/{self.product.id}/reviews/{review.id}/",
+            status=status.HTTP_200_OK,
+        )
+
+    def test_create(self):
+        self.assertMaxQueries(
+            5,
+            "POST",
+            f"/store/products/{self.products[5].id}/reviews/",
+            self.user,
+            {"rate": 4, "description": "Nice"},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class ReviewFeedPaginationTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.feed_product = cls.products[5]
+        customers = cls.customers + [
+            User.objects.create_user(f"+2010999990{index:02}", "password").customer
+            for index in range(7)
+        ]
+        Review.objects.bulk_create(
+            Review(product=cls.feed_product, customer=customer, rate=index % 3 + 1)
+            for index, customer in enumerate(customers)
+        )
+        # groups of reviews created in the same transaction share their created_at
+        reviews = list(Review.objects.filter(product=cls.feed_product).order_by("id"))
+        base = timezone.now() - timedelta(days=1)
+        for index, review in enumerate(reviews):
+            Review.objects.filter(pk=review.pk).update(created_at=base + timedelta(minutes=index // 4))
+        cls.reviews = list(Review.objects.filter(product=cls.feed_product))
+
+    def walk(self, query):
+        url = f"/store/products/{self.feed_product.id}/reviews/?size=3&{query}"
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertLessEqual(len(data["results"]), 3)
+            ids += [review["id"] for review in data["results"]]
+            url = data["next"]
+        return ids
+
+    def test_pages_cover_every_review_once_in_order(self):
+        for ordering, key, reverse in [
+            ("-created_at", lambda review: (review.created_at, review.id), True),
+            ("created_at", lambda review: (review.created_at, review.id), False),
+            ("-rate", lambda review: (review.rate, review.id), True),
+            ("rate", lambda review: (review.rate, review.id), False),
+        ]:
+            with self.subTest(ordering=ordering):
+                expected = [review.id for review in sorted(self.reviews, key=key, reverse=reverse)]
+                self.assertEqual(self.walk(f"ordering={ordering}"), expected)
+
+    def test_new_reviews_dont_shift_the_pages(self):
+        url = f"/store/products/{self.feed_product.id}/reviews/?size=3"
+        first = self.client.get(url).json()
+        # a new review on top of the feed while the client pages through it
+        customer = User.objects.create_user("+201099999100", "password").customer
+        Review.objects.create(product=self.feed_product, customer=customer, rate=5)
+        ids = [review["id"] for review in first["results"]]
+        next_url = first["next"]
+        while next_url:
+            data = self.client.get(next_url).json()
+            ids += [review["id"] for review in data["results"]]
+            next_url = data["next"]
+        expected = sorted(self.reviews, key=lambda review: (review.created_at, review.id), reverse=True)
+        self.assertEqual(ids, [review.id for review in expected])
+
+
+class CustomerQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        self.assertListMaxQueries(2, "/store/customers/", self.admin)
+
+    def test_retrieve(self):
+        url = f"/store/customers/{self.customer.id}/"
+        for user in [self.user, self.admin]:
+            with self.subTest(user=user):
+                self.assertMaxQueries(2, "GET", url, user, status=status.HTTP_200_OK)
+
+    def test_images(self):
+        # the user's customer (ownership check) + images
+        self.assertMaxQueries(
+            2,
+            "GET",
+            f"/store/customers/{self.customer.id}/images/",
+            self.user,
+            status=status.HTTP_200_OK,
+        )
+
+
+class CartQueryBudgetTests(QueryBudgetTestCase):
+    def test_cart_items_list(self):
+        # customer + cart + items with their product
+        self.assertListMaxQueries(3, "/store/cart_items/", self.user)
+
+    def test_cart_items_list_anonymous(self):
+        self.assertListMaxQueries(0, "/store/cart_items/")
+
+    def test_cart_item_create(self):
+        self.assertMaxQueries(
+            5,
+            "POST",
+            "/store/cart_items/",
+            self.user,
+            {"product": self.products[6].id, "quantity": 1},
+            status=status.HTTP_201_CREATED,
+        )
+
+    def test_cart_item_update(self):
+        item = CartItem.objects.filter(cart__customer=self.customer).first()
+        self.assertMaxQueries(
+            4,
+            "PATCH",
+            f"/store/cart_items/{item.id}/",
+            self.user,
+            {"quantity": 2},
+            status=status.HTTP_200_OK,
+        )
+
+    def test_carts_list(self):
+        self.assertListMaxQueries(3, "/store/carts/", self.admin)
+
+    def test_cart_retrieve(self):
+        cart = self.customer.cart
+        self.assertMaxQueries(
+            3, "GET", f"/store/carts/{cart.id}/", self.admin, status=status.HTTP_200_OK
+        )
+
+
+class OrderQueryBudgetTests(QueryBudgetTestCase):
+    def test_list(self):
+        # customer + count + orders + items + products + categories + images
+        self.assertListMaxQueries(7, "/store/orders/", self.user)
+        self.assertListMaxQueries(6, "/store/orders/", self.admin)
+
+    def test_create_order(self):
+        cart_items = CartItem.objects.filter(cart__customer=self.customer).count()
+        self.assertMaxQueries(
+            14,
+            "POST",
+            "/store/orders/create-order/",
+            self.user,
+            status=status.HTTP_201_CREATED,
+        )
+        self.assertEqual(
+            Order.objects.filter(customer=self.customer).latest("id").items.count(),
+            cart_items,
+        )
+        self.assertEqual(Product.objects.get(pk=self.product.pk).inventory, 99)
+
+
+class EndpointPermissionTests(QueryBudgetTestCase):
+    # statuses as an anonymous user, a customer and an admin
+    def setUp(self):
+        super().setUp()
+        self.other = self.customers[1]
+
+    def test_customers(self):
+        customer = self.customer
+        self.assertStatuses("GET", "/store/customers/", [401, 403, 200])
+        # created with their user
+        self.assertStatuses("POST", "/store/customers/", [401, 405, 405], {})
+        self.assertStatuses("GET", f"/store/customers/{customer.id}/", [401, 200, 200])
+        self.assertStatuses("GET", f"/store/customers/{self.other.id}/", [401, 403, 200])
+        self.assertStatuses(
+            "PATCH", f"/store/customers/{customer.id}/", [401, 200, 200], {"location": "Cairo"}
+        )
+        self.assertStatuses("PATCH", f"/store/customers/{self.other.id}/", [401, 403, 200], {})
+        # a customer without orders
+        new = User.objects.create_user("+201099999999", "password").customer
+        self.assertStatuses("DELETE", f"/store/customers/{new.id}/", [401, 403, 204])
+
+    def test_customer_images(self):
+        self.assertStatuses("GET", f"/store/customers/{self.customer.id}/images/", [401, 200, 200])
+        self.assertStatuses("GET", f"/store/customers/{self.other.id}/images/", [401, 403, 200])
+        self.assertStatuses("POST", f"/store/customers/{self.other.id}/images/", [401, 403, 400], {})
+
+    def test_products(self):
+        # not ordered nor favorited
+        product = self.products[5]
+        self.assertStatuses("GET", "/store/products/", [200, 200, 200])
+        self.assertStatuses("POST", "/store/products/", [401, 403, 400], {})
+        self.assertStatuses("GET", f"/store/products/{product.id}/", [200, 200, 200])
+        self.assertStatuses("PATCH", f"/store/products/{product.id}/", [401, 403, 200], {"title": "New"})
+        self.assertStatuses("DELETE", f"/store/products/{product.id}/", [401, 403, 204])
+        self.assertStatuses("POST", f"/store/products/{product.id}/favorite/", [401, 200, 200])
+
+    def test_product_images(self):
+        url = f"/store/products/{self.product.id}/images/"
+        image = self.product.images.first()
+        self.assertStatuses("GET", url, [200, 200, 200])
+        self.assertStatuses("POST", url, [401, 403, 400], {})
+        self.assertStatuses("GET", f"{url}{image.id}/", [200, 200, 200])
+        self.assertStatuses("DELETE", f"{url}{image.id}/", [401, 403, 204])
+
+    def test_reviews(self):
+        url = f"/store/products/{self.product.id}/reviews/"
+        own = self.product.review_set.get(customer=self.customer)
+        other = self.product.review_set.get(customer=self.other)
+        self.assertStatuses("GET", url, [200, 200, 200])
+        self.assertStatuses("POST", url, [401, 400, 400], {})
+        self.assertStatuses("GET", f"{url}{other.id}/", [200, 200, 200])
+        self.assertStatuses("PATCH", f"{url}{own.id}/", [401, 200, 200], {"rate": 5})
+        # only the user's own reviews can be changed
+        self.assertStatuses("PATCH", f"{url}{other.id}/", [401, 404, 200], {"rate": 5})
+        self.assertStatuses("DELETE", f"{url}{other.id}/", [401, 404, 204])
+
+    def test_favorites(self):
+        self.assertStatuses("GET", "/store/favorites/", [401, 200, 200])
+
+    def test_carts(self):
+        cart, other = self.customer.cart, self.other.cart
+        self.assertStatuses("GET", "/store/carts/", [401, 403, 200])
+        self.assertStatuses("GET", f"/store/carts/{cart.id}/", [401, 200, 200])
+        self.assertStatuses("GET", f"/store/carts/{other.id}/", [401, 403, 200])
+        self.assertStatuses("DELETE", f"/store/carts/{other.id}/", [401, 403, 204])
+
+    def test_cart_items(self):
+        item = self.customer.cart.cart_items.first()
+        other = self.other.cart.cart_items.first()
+        self.assertStatuses("GET", "/store/cart_items/", [200, 200, 200])
+        # anonymous users and admins get a cart token
+        self.assertStatuses(
+            "POST", "/store/cart_items/", [201, 201, 201], {"product": self.products[6].id, "quantity": 1}
+        )
+        # only the items of the request's own cart
+        self.assertStatuses("GET", f"/store/cart_items/{item.id}/", [404, 200, 404])
+        self.assertStatuses("PATCH", f"/store/cart_items/{item.id}/", [404, 200, 404], {"quantity": 2})
+        self.assertStatuses("DELETE", f"/store/cart_items/{other.id}/", [404, 404, 404])
+
+    def test_orders(self):
+        order = self.customer.orders.first()
+        # anonymous users have no orders
+        self.assertStatuses("GET", "/store/orders/", [200, 200, 200])
+        self.assertStatuses("GET", f"/store/orders/{order.id}/", [401, 403, 200])
+        self.assertStatuses("PATCH", f"/store/orders/{order.id}/", [401, 403, 200], {})
+        empty = Order.objects.create(customer=self.customer)
+        self.assertStatuses("DELETE", f"/store/orders/{empty.id}/", [401, 403, 204])
+        # admins have no cart
+        self.assertStatuses("POST", "/store/orders/create-order/", [401, 201, 400])
+
+    def test_catalog(self):
+        for url in [
+            "/catalog/products/",
+            f"/catalog/products/{self.product.id}/",
+            f"/catalog/products/{self.product.id}/images/",
+            f"/catalog/products/{self.product.id}/reviews/",
+            "/catalog/categories/",
+        ]:
+            self.assertStatuses("GET", url, [200, 200, 200])
+            self.assertStatuses("POST", url, [405, 405, 405], {})
+
+
+class AsyncCatalogQueryBudgetTests(QueryBudgetTestCase):
+    def assertSamePayload(self, async_url, url, budget):
+        # the async catalog serves the anonymous payload of the DRF views
+        expected = self.client.get(url).json()
+        cache.clear()
+        response = self.assertMaxQueries(budget, "GET", async_url, status=status.HTTP_200_OK)
+        data = response.json()
+        for key in ["next", "previous", "first"]:
+            # the links point to their own urls
+            if key in expected:
+                self.assertEqual(data.pop(key) is None, expected.pop(key) is None)
+        self.assertEqual(data, expected)
+
+    def test_products(self):
+        query = f"?search=Product&category_id={self.categories[0].id}&ordering=-price&size=2&page=2"
+        # count + products + images
+        self.assertSamePayload(f"/catalog/products/{query}", f"/store/products/{query}", 3)
+        # the second request is served from the cache
+        self.assertMaxQueries(0, "GET", f"/catalog/products/{query}", status=status.HTTP_200_OK)
+
+    def test_product_detail(self):
+        url = f"products/{self.product.id}/"
+        self.assertSamePayload(f"/catalog/{url}", f"/store/{url}", 2)
+        self.assertMaxQueries(1, "GET", "/catalog/products/0/", status=status.HTTP_404_NOT_FOUND)
+
+    def test_product_images(self):
+        url = f"products/{self.product.id}/images/"
+        self.assertSamePayload(f"/catalog/{url}", f"/store/{url}", 1)
+
+    def test_product_reviews(self):
+        url = f"products/{self.product.id}/reviews/?ordering=-rate&size=2"
+        self.assertSamePayload(f"/catalog/{url}", f"/store/{url}", 1)
+
+    def test_categories(self):
+        response = self.assertMaxQueries(1, "GET", "/catalog/categories/", status=status.HTTP_200_OK)
+        self.assertEqual(
+            response.json(),
+            [{"id": category.id, "title": category.title} for category in self.categories],
+        )
+
+    def test_read_only(self):
+        self.assertMaxQueries(
+            0, "POST", "/catalog/products/", status=status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+    @mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {"search.anon": "2/min"})
+    def test_search_is_throttled(self):
+        for page in [1, 2]:
+            response = self.client.get(f"/catalog/products/?search=Product&page={page}")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # cached or not, like the DRF view
+        response = self.client.get("/catalog/products/?search=Product&page=1")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertEqual(response["RateLimit-Remaining"], "0")
+        self.assertIn("detail", response.json())
+        # browsing without a search is not limited
+        for _ in range(3):
+            self.assertEqual(self.client.get("/catalog/products/").status_code, status.HTTP_200_OK)
+
+
+class MediaTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+        self.product_image = ProductImage.objects.create(
+            product=self.product, image=ContentFile(b"product", name="shoe.jpg")
+        )
+        self.customer_image = CustomerImage.objects.create(
+            customer=self.customer, image=ContentFile(b"customer", name="me.png")
+        )
+
+    def get(self, image, user=None):
+        # not a DRF view, force_authenticate doesn't apply
+        if user is None:
+            return self.client.get(image.image.url)
+        token, _ = Token.objects.get_or_create(user=user)
+        return self.client.get(image.image.url, HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_hashed_names(self):
+        self.assertRegex(self.product_image.image.name, r"^store/images/products/shoe\.[0-9a-f]{12}\.jpg$")
+        # the same bytes are stored once
+        duplicate = ProductImage.objects.create(
+            product=self.product, image=ContentFile(b"product", name="shoe.jpg")
+        )
+        self.assertEqual(duplicate.image.name, self.product_image.image.name)
+
+    def test_product_image(self):
+        with self.assertNumQueries(0):
+            response = self.get(self.product_image)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"product")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+        response = self.client.get(
+            self.product_image.image.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_customer_image(self):
+        self.assertEqual(self.get(self.customer_image).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get(self.customer_image, self.users[1]).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get(self.customer_image, self.admin).status_code, status.HTTP_200_OK)
+        # the admin thumbnails use the session
+        self.client.force_login(self.admin)
+        self.assertEqual(self.get(self.customer_image).status_code, status.HTTP_200_OK)
+        self.client.logout()
+
+        response = self.get(self.customer_image, self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Cache-Control"], "private, max-age=31536000, immutable")
+
+    def test_unhashed_name(self):
+        ProductImage.objects.filter(pk=self.product_image.pk).update(image="store/images/products/old.jpg")
+        self.product_image.refresh_from_db()
+        (Path(settings.MEDIA_ROOT) / self.product_image.image.name).write_bytes(b"old")
+        self.assertEqual(self.get(self.product_image)["Cache-Control"], "public, max-age=3600")
+
+    def test_sendfile_backends(self):
+        url = self.product_image.image.url
+        with override_settings(MEDIA_SENDFILE_BACKEND="x-accel-redirect"):
+            response = self.client.get(url)
+            self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.product_image.image.name}")
+            self.assertEqual(response.content, b"")
+        with override_settings(MEDIA_SENDFILE_BACKEND="x-sendfile"):
+            response = self.client.get(url)
+            self.assertEqual(response["X-Sendfile"], self.product_image.image.path)
+            self.assertEqual(response.content, b"")
+
+    def test_outside_media(self):
+        for path in ["store/images/products/../../../manage.py", "store/images/products/missing.jpg", "other.jpg"]:
+            with self.subTest(path=path):
+                response = self.client.get(f"/media/{path}")
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CartTokenTests(QueryBudgetTestCase):
+    def add_item(self, product, **extra):
+        response = self.client.post(
+            "/store/cart_items/", {"product": product.id, "quantity": 1}, **extra
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def test_anonymous_cart(self):
+        response = self.add_item(self.products[0])
+        token = response["X-Cart-Token"]
+        self.assertEqual(response.cookies["cart_token"].value, token)
+        self.assertTrue(response.cookies["cart_token"]["httponly"])
+
+        # the cookie is sent back by the client
+        self.add_item(self.products[1])
+        response = self.client.get("/store/cart_items/")
+        self.assertEqual(len(response.json()), 2)
+
+        # apps send the header
+        self.client.cookies.clear()
+        response = self.client.get("/store/cart_items/", HTTP_X_CART_TOKEN=token)
+        self.assertEqual(len(response.json()), 2)
+        # no session is created or read
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn("sessionid", self.client.cookies)
+
+    def test_invalid_tokens(self):
+        token = self.add_item(self.products[0])["X-Cart-Token"]
+        self.client.cookies.clear()
+        cart_id = token.split(":")[0]
+        for value in [f"{cart_id}:{'0' * 6}:forged", cart_id, "garbage"]:
+            with self.subTest(token=value):
+                response = self.client.get("/store/cart_items/", HTTP_X_CART_TOKEN=value)
+                self.assertEqual(response.json(), [])
+
+        with override_settings(CART_TOKEN_MAX_AGE=-1):
+            response = self.client.get("/store/cart_items/", HTTP_X_CART_TOKEN=token)
+            self.assertEqual(response.json(), [])
+
+    def test_login_merges_the_cart(self):
+        token = self.add_item(self.products[5])["X-Cart-Token"]
+        response = self.client.post(
+            "/auth/token/login/", {"phone_number": self.user.phone_number, "password": "password"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the cookie is dropped, the cart now belongs to the customer
+        self.assertEqual(response.cookies["cart_token"].value, "")
+        self.assertTrue(self.customer.cart.cart_items.filter(product=self.products[5]).exists())
+
+        # and it can't be reached with the old token
+        self.client.cookies.clear()
+        response = self.client.get("/store/cart_items/", HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.json(), [])
+
+
+class ProductCacheTests(QueryBudgetTestCase):
+    url = "/store/products/?size=5"
+
+    def test_fresh_entry(self):
+        self.assertMaxQueries(3, "GET", self.url, status=status.HTTP_200_OK)
+        with mock.patch.object(StampedeCacheResponse, "should_refresh", return_value=False):
+            self.assertMaxQueries(0, "GET", self.url, status=status.HTTP_200_OK)
+
+    def test_stale_entry_is_served_while_it_is_rebuilt(self):
+        expected = self.client.get(self.url).content
+        with mock.patch.object(StampedeCacheResponse, "should_refresh", return_value=True):
+            # another worker holds the lock
+            with mock.patch.object(cache, "add", return_value=False):
+                response = self.assertMaxQueries(0, "GET", self.url, status=status.HTTP_200_OK)
+                self.assertEqual(response.content, expected)
+            # this one gets it and rebuilds the entry
+            self.assertMaxQueries(3, "GET", self.url, status=status.HTTP_200_OK)
+            self.assertFalse([key for key in cache._cache if key.endswith(":lock")])
+
+    def test_product_change_invalidates_its_entries_only(self):
+        edited, other = self.products[:2]
+        urls = [self.url, f"/store/products/{edited.id}/", f"/store/products/{other.id}/"]
+        expected = [self.client.get(url).content for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            edited.title = "New title"
+            edited.save()
+
+        with mock.patch.object(StampedeCacheResponse, "should_refresh", return_value=False):
+            self.assertMaxQueries(0, "GET", urls[2], status=status.HTTP_200_OK)
+            # stale, served while another worker rebuilds them
+            with mock.patch.object(cache, "add", return_value=False):
+                for url, content in zip(urls[:2], expected):
+                    response = self.assertMaxQueries(0, "GET", url, status=status.HTTP_200_OK)
+                    self.assertEqual(response.content, content)
+            response = self.assertMaxQueries(2, "GET", urls[1], status=status.HTTP_200_OK)
+            self.assertEqual(response.json()["title"], "New title")
+            self.assertMaxQueries(3, "GET", urls[0], status=status.HTTP_200_OK)
+
+    def test_cached_responses_get_is_favorited(self):
+        # favorited by every user
+        url = f"/store/products/{self.products[0].id}/"
+        for accept, decode in [("application/json", json.loads), ("application/msgpack", msgpack.unpackb)]:
+            with self.subTest(accept=accept):
+                cache.clear()
+                self.client.force_authenticate(None)
+                self.assertNotIn("is_favorited", decode(self.client.get(url, HTTP_ACCEPT=accept).content))
+                self.client.force_authenticate(self.user)
+                response = self.client.get(url, HTTP_ACCEPT=accept)
+                self.assertIs(decode(response.content)["is_favorited"], True)
+
+    def test_missing_entry_waits_for_the_rebuild(self):
+        with mock.patch.object(cache, "add", return_value=False):
+            with mock.patch.object(StampedeCacheResponse, "wait_timeout", 0.1):
+                # nothing to wait for, built without the lock
+                self.assertMaxQueries(3, "GET", self.url, status=status.HTTP_200_OK)
+
+
+class PriceUpdateTests(QueryBudgetTestCase):
+    RULES = [{"type": "absolute", "value": "1"}]
+
+    def locking(self, *product_ids):
+        # sqlite has no skip_locked, the products are skipped as if checkouts held them
+        def batch(ids, rules, run):
+            locked = set(ids) & set(product_ids)
+            return run_batch(sorted(set(ids) - locked), rules, run) | locked
+
+        return mock.patch("store.pricing.run_batch", side_effect=batch)
+
+    def test_locked_products_keep_their_price(self):
+        product = self.products[0]
+        with self.locking(product.id):
+            run = update_prices(self.RULES, batch_size=4)
+        self.assertEqual(run.locked, [product.id])
+        self.assertEqual(len(run.changes), len(self.products) - 1)
+        product.refresh_from_db()
+        self.assertEqual(product.price, 10)
+
+        # repriced alone, the others are not increased again
+        run = update_prices(self.RULES, product_ids=run.locked)
+        self.assertEqual([change.product_id for change in run.changes], [product.id])
+        self.assertEqual(
+            list(Product.objects.order_by("id").values_list("price", flat=True)),
+            [product.price + 1 for product in self.products],
+        )
+
+    @override_settings(PRICING_RULES=RULES)
+    def test_locked_products_are_retried(self):
+        product = self.products[0]
+        with self.locking(product.id), \
+                mock.patch.object(tasks.update_locked_products_prices, "apply_async") as apply_async, \
+                mock.patch.object(tasks.warm_catalog_cache, "delay"):
+            tasks.update_products_prices()
+        apply_async.assert_called_once_with(([product.id],), countdown=tasks.LOCKED_PRODUCTS_RETRY_DELAY)
+
+        tasks.update_locked_products_prices.apply(args=([product.id],))
+        product.refresh_from_db()
+        self.assertEqual(product.price, 11)
+
+    @override_settings(PRICING_RULES=RULES)
+    def test_retries_only_the_still_locked_products(self):
+        locked = PriceRun(dry_run=False)
+        locked.locked = [self.products[1].id]
+        with mock.patch("store.tasks.update_prices", return_value=locked) as update:
+            tasks.update_locked_products_prices.apply(args=([self.products[0].id, self.products[1].id],))
+        # the first run, then every retry
+        self.assertEqual(update.call_count, tasks.update_locked_products_prices.max_retries + 1)
+        self.assertEqual(update.call_args.kwargs["product_ids"], [self.products[1].id])
+
+
+class CatalogWarmingTests(QueryBudgetTestCase):
+    def test_traffic_ranking(self):
+        category_url = f"/store/products/?page=1&category_id={self.categories[0].id}"
+        for _ in range(3):
+            self.client.get(category_url)
+        self.client.get("/store/products/")
+        # not worth warming
+        self.client.get("/store/products/?search=Product")
+        self.client.get("/store/products/?size=5")
+        self.client.get(f"/store/products/{self.products[0].id}/")
+
+        self.assertEqual(
+            warming.get_top_urls(warming.LIST, 10),
+            [
+                f"http://testserver/store/products/?category_id={self.categories[0].id}&page=1",
+                "http://testserver/store/products/",
+            ],
+        )
+        self.assertEqual(
+            warming.get_top_urls(warming.DETAIL, 10),
+            [f"http://testserver/store/products/{self.products[0].id}/"],
+        )
+
+    def test_junk_params_are_not_ranked(self):
+        # answered like a valid page, but each would be a member of its own
+        for url in [
+            "/store/products/?ordering=bogus",
+            "/store/products/?ordering=price,--title",
+            f"/store/products/?category_id={self.categories[0].id}.0",
+            "/store/products/?page=01x",
+        ]:
+            self.client.get(url)
+        self.client.get("/store/products/?ordering=-price,title")
+
+        self.assertEqual(
+            warming.get_top_urls(warming.LIST, 10),
+            ["http://testserver/store/products/?ordering=-price%2Ctitle"],
+        )
+
+    def test_warm_catalog_cache(self):
+        urls = ["/store/products/?ordering=-price", f"/store/products/{self.products[0].id}/"]
+        for url in urls:
+            self.client.get(url)
+        # a price update makes every cached page cold
+        bump_catalog_version()
+
+        run = warming.warm_catalog_cache(concurrency=1)
+        self.assertEqual((run.warmed, run.failed), (2, []))
+        # warming requests are not counted
+        self.assertEqual(len(warming.get_top_urls(warming.LIST, 10)), 1)
+        with mock.patch.object(StampedeCacheResponse, "should_refresh", return_value=False):
+            for url in urls:
+                self.assertMaxQueries(0, "GET", url, status=status.HTTP_200_OK)
+
+
+class CatalogCdnTests(QueryBudgetTestCase):
+    def test_anonymous_responses_are_public(self):
+        product = self.products[0]
+        for _ in range(2):
+            # built, then from the response cache
+            response = self.client.get(f"/store/products/{product.id}/")
+            self.assertEqual(response["Cache-Control"], "public, max-age=60, s-maxage=3600")
+            self.assertEqual(response["Vary"], "Accept, Authorization")
+            self.assertEqual(
+                response["Surrogate-Key"], f"category-{product.category_id} product-{product.id}"
+            )
+        response = self.client.get(f"/store/products/?category_id={product.category_id}")
+        self.assertEqual(response["Cache-Control"], "public, max-age=60, s-maxage=300")
+        keys = response["Surrogate-Key"].split()
+        self.assertIn("products", keys)
+        self.assertIn(f"product-{product.id}", keys)
+        self.assertEqual(response["Cache-Tag"], ",".join(keys))
+
+    def test_user_responses_are_private(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get("/store/products/")
+        self.assertEqual(response["Cache-Control"], "private")
+        self.assertEqual(response["Vary"], "Accept, Authorization")
+
+    @override_settings(CDN_PURGE_URL="http://cdn.test/purge", CDN_PURGE_BATCH_SIZE=1)
+    def test_purges_are_batched_and_deduplicated(self):
+        product = self.products[0]
+        with mock.patch("core.tasks.purge_cdn_keys.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.title = "New title"
+                product.save()
+                product.images.first().save()
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+        # a single run for the purges of its delay
+        apply_async.assert_called_once()
+
+        with mock.patch("core.purge.requests.post") as post:
+            self.assertEqual(purge.send_pending(), 2)
+        self.assertEqual(
+            sorted(call.kwargs["json"]["keys"] for call in post.call_args_list),
+            [[f"product-{product.id}"], ["products"]],
+        )
+
+
+class AdminChangelistTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_category_products_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/store/category/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [category.products_count for category in response.context["cl"].result_list],
+            [self.PRODUCTS_PER_CATEGORY] * self.CATEGORIES,
+        )
+        # the counts are part of the changelist query, not one per category
+        category_queries = [query for query in queries if '"store_category"' in query["sql"]]
+        self.assertEqual(len(category_queries), 2, category_queries)
+
+    def test_product_search(self):
+        product = self.products[0]
+        for term, expected in [
+            (str(product.id), {product.id}),
+            (product.title[:9], {p.id for p in self.products if p.title.startswith(product.title[:9])}),
+            # a prefix, not a substring
+            (product.title[1:], set()),
+        ]:
+            with self.subTest(term=term):
+                response = self.client.get("/admin/store/product/", {"q": term})
+                self.assertEqual({p.id for p in response.context["cl"].result_list}, expected)
+
+    def test_estimated_count(self):
+        with mock.patch("core.pagination.estimate_count", return_value=50000):
+            response = self.client.get("/admin/store/product/")
+        self.assertEqual(response.context["cl"].result_count, 50000)
+        # below the threshold the rows are counted
+        with mock.patch("core.pagination.estimate_count", return_value=100):
+            response = self.client.get("/admin/store/product/")
+        self.assertEqual(response.context["cl"].result_count, len(self.products))
+
+    @skipUnless(connection.vendor == "postgresql", "planner estimates are PostgreSQL only")
+    def test_estimated_count_of_filtered_changelists(self):
+        self.assertIsInstance(estimate_count(Product.objects.filter(category=self.categories[0])), int)
+        self.assertEqual(estimate_count(Product.objects.filter(id__in=[])), 0)
+        for url, params in [
+            ("/admin/store/product/", {"q": "Product"}),
+            ("/admin/store/product/", {"category__id__exact": self.categories[0].id}),
+            ("/admin/store/customer/", {"q": "a"}),
+            ("/admin/store/category/", {"q": "a"}),
+        ]:
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self.client.get(url, params).status_code, status.HTTP_200_OK)
+
+    @skipUnless(connection.vendor == "postgresql", "query plans are PostgreSQL only")
+    def test_check_query_plans(self):
+        stdout = StringIO()
+        # the seeded tables are small, nothing is above the threshold
+        call_command("check_query_plans", rows=10**9, stdout=stdout)
+        self.assertNotIn("FLAG", stdout.getvalue())
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    # the benchmark's worker threads have their own database connection,
+    # they only see committed rows
+    def test_seed_and_benchmark(self):
+        call_command("seed_store", scale=0.01, stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 200)
+        with self.assertRaisesMessage(CommandError, "already seeded"):
+            call_command("seed_store", scale=0.01, stdout=StringIO())
+
+        output = Path(tempfile.mkdtemp()) / "benchmark.json"
+        self.addCleanup(shutil.rmtree, output.parent)
+        stdout = StringIO()
+        call_command(
+            "benchmark_store",
+            requests=6,
+            warmup=1,
+            concurrency=2,
+            no_throttle=True,
+            scenario=["product_list", "cart_add"],
+            output=str(output),
+            stdout=stdout,
+        )
+        report = json.loads(output.read_text())
+        self.assertFalse(report["throttling"])
+        for name in ["product_list", "cart_add"]:
+            with self.subTest(scenario=name):
+                result = report["scenarios"][name]
+                self.assertEqual((result["requests"], result["errors"], result["throttled"]), (6, 0, 0))
+                self.assertIsNotNone(result["p99"])
+        # restored after the run
+        self.assertTrue(settings.THROTTLE_ENABLED)
+
+    def test_benchmark_needs_seeded_data(self):
+        with self.assertRaisesMessage(CommandError, "run seed_store first"):
+            call_command("benchmark_store", output=os.devnull, stdout=StringIO())
@@ -1,16 +1,33 @@
-from django.db import connection
+import json
+import posixpath
+
+import msgpack
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import prefetch_related_objects
+from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework_extensions.cache.mixins import CacheResponseMixin
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.decorators import action, permission_classes
 from rest_framework.views import APIView
-from rest_framework.viewsets import ModelViewSet, ViewSet
+from rest_framework.mixins import ListModelMixin
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from rest_framework import permissions
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.filters import SearchFilter, OrderingFilter
-from core.views import Response
+from core.authentication import CachedTokenAuthentication
+from core.response_cache import StampedeCacheResponseMixin
+from core.media import sendfile
+from core.purge import set_surrogate_keys
+from core.views import ReplicaReadsMixin, Response
+from favorite.cache import get_favorited_product_ids
+from favorite.models import FavoriteItem
 from .models import (
     Cart,
     Customer,
@@ -21,12 +38,17 @@ from .models import (
     Review,
     CartItem,
 )
-from .permissions import IsOwnerOrAdmin, IsCartItemOwnerOrAdmin
+from .permissions import (
+    IsCartItemOwnerOrAdmin,
+    IsCartOwnerOrAdmin,
+    IsCustomerOwnerOrAdmin,
+    IsOwnerOrAdmin,
+)
 from .serializers import (
     CartItemSerializer,
     CartSerializer,
-    CustomerFavoriteProductSerializer,
     CustomerImageSerializer,
+    FavoriteProductSerializer,
     CustomerSerializer,
     OrderSerializer,
     ProductImageSerializer,
@@ -37,17 +59,36 @@ from .serializers import (
     CartItemSerializer,
     CreateOrderSerializer,
 )
-from .pagination import CustomPagination
+from . import warming
+from .carts import set_cart_token
+from .cache import (
+    PRODUCT_LIST_KEY,
+    get_list_keys,
+    get_product_keys,
+    get_surrogate_keys,
+    get_versions,
+)
+from .pagination import CustomPagination, FavoritePagination, ReviewPagination
 from .filters import ProductFilter
 from django.core.cache import cache
 
 
 
+# the formats of the cached product responses that can be decoded to add
+# is_favorited, the msgpack values are the ones of the json output
+CACHED_CONTENT_DECODERS = {
+    "json": json.loads,
+    "msgpack": msgpack.unpackb,
+}
+
+
 class CustomerViewSet(ModelViewSet):
     queryset = Customer.objects.select_related(
         "user").prefetch_related("image").all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated]
+    # a customer is created with its user (store.signals)
+    http_method_names = ["get", "put", "patch", "delete", "head", "options"]
 
     def get_serializer_class(self):
         if self.action in ["update", "partial_update"]:
@@ -65,6 +106,7 @@ class CustomerViewSet(ModelViewSet):
 
 class CustomerImageViewSet(ModelViewSet):
     serializer_class = CustomerImageSerializer
+    permission_classes = [IsAuthenticated, IsCustomerOwnerOrAdmin]
 
     # send the customer_id to serializer
     def get_serializer_context(self):
@@ -74,7 +116,7 @@ class CustomerImageViewSet(ModelViewSet):
         return CustomerImage.objects.filter(customer_id=self.kwargs["customer_pk"])
 
 
-class ProductViewSet(CacheResponseMixin, ModelViewSet):
+class ProductViewSet(ReplicaReadsMixin, StampedeCacheResponseMixin, ModelViewSet):
     serializer_class = ProductSerializer
     queryset = (
         Product.objects.prefetch_related(
@@ -86,20 +128,30 @@ class ProductViewSet(CacheResponseMixin, ModelViewSet):
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_class = ProductFilter
     search_fields = ["title", "description", "category__title"]
-    ordering_fields = ["title", "price"]
+    ordering_fields = ["title", "price", "favorite_count"]
+    # stable pages when no ?ordering= is given
+    ordering = ["id"]
 
-    cache_response_timeout = 60 * 15  # 15 minutes
+    # fresh for these many seconds, then served stale for as long again
+    # while a single worker rebuilds them (core.response_cache.StampedeCacheResponse)
+    list_cache_timeout = 60 * 5      # 5 minutes
+    object_cache_timeout = 60 * 60   # 1 hour
 
-    def get_cache_response_timeout(self, view_instance, view_method):
-        if view_method == 'list':
-            return 60 * 5    # 5 minutes
-        elif view_method == 'retrieve':
-            return 60 * 60   # 1 hour
-        elif view_method == 'favorite':
-            return 0         # disable caching
-        return self.cache_response_timeout
+    @property
+    def throttle_scope(self):
+        # a search scans the products, limit how fast it can be paged through
+        if self.action == "list" and self.request.query_params.get(SearchFilter.search_param):
+            return "search"
+        return None
 
 
+    def get_list_cache_version(self, request, *args, **kwargs):
+        # store.cache, an entry of an older version is rebuilt
+        return get_versions(get_list_keys())
+
+    def get_object_cache_version(self, request, *args, **kwargs):
+        return get_versions(get_product_keys(kwargs["pk"]))
+
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
             return [IsAdminUser()]
@@ -109,11 +161,73 @@ class ProductViewSet(CacheResponseMixin, ModelViewSet):
     
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
-        print("SQL queries executed:", len(connection.queries))  
-        for q in connection.queries:
-            print(q["sql"])
+        self.record_hit(response, warming.LIST)
+        return self.set_cache_headers(self.add_is_favorited(response))
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        self.record_hit(response, warming.DETAIL)
+        return self.set_cache_headers(self.add_is_favorited(response))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # also called before a response is cached (core.response_cache),
+        # so a cached response keeps its surrogate keys
+        data = getattr(response, "data", None)
+        if self.action in ["list", "retrieve"] and response.status_code == status.HTTP_200_OK and data is not None:
+            keys = get_surrogate_keys(data["results"] if "results" in data else [data])
+            if self.action == "list":
+                keys.add(PRODUCT_LIST_KEY)
+            set_surrogate_keys(response, keys)
+        return response
+
+    def set_cache_headers(self, response):
+        # the anonymous catalog is the same for everyone and can be kept by
+        # the CDN as long as by the response cache, a user's pages have the
+        # user's is_favorited flags
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        if self.request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        else:
+            timeout = self.list_cache_timeout if self.action == "list" else self.object_cache_timeout
+            patch_cache_control(
+                response, public=True, max_age=settings.CATALOG_BROWSER_MAX_AGE, s_maxage=timeout
+            )
+        # the API authenticates by token only, a Vary: Cookie would split the
+        # CDN's copies per visitor (analytics cookies...) for nothing
+        patch_vary_headers(response, ["Accept", "Authorization"])
         return response
 
+    def record_hit(self, response, kind):
+        # ranks the pages pre-rendered by the warm_catalog_cache task
+        if response.status_code == status.HTTP_200_OK:
+            warming.record_hit(self.request._request, kind, self.ordering_fields)
+
+    def add_is_favorited(self, response):
+        # the cached response is shared by all users, so the per-user
+        # is_favorited flag is added after it is read from the cache
+        request = self.request
+        if not request.user.is_authenticated or response.status_code != status.HTTP_200_OK:
+            return response
+
+        data = getattr(response, "data", None)
+        if data is None:
+            # cache hit, the cache only stores the rendered content
+            decode = CACHED_CONTENT_DECODERS.get(request.accepted_renderer.format)
+            if decode is None:
+                # the browsable API's html
+                return response
+            data = decode(response.content)
+
+        products = data["results"] if "results" in data else [data]
+        favorited = get_favorited_product_ids(
+            request.user.id, [product["id"] for product in products]
+        )
+        for product in products:
+            product["is_favorited"] = product["id"] in favorited
+        return Response(data)
+
     # set detail=True because it will get the product_id /products/{pk}/favorite
     @action(
         detail=True, methods=["post"], serializer_class=ToggleFavoriteProductSerializer
@@ -151,38 +265,50 @@ class ProductImageViewSet(ModelViewSet):
         return Response({"images": serializer.data})
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(ReplicaReadsMixin, ModelViewSet):
     serializer_class = ReviewSerializer
+    # keyset pagination on (created_at, id) or (rate, id), ?ordering=-rate
+    pagination_class = ReviewPagination
 
     def get_serializer_context(self):
         return {"request": self.request, "product_id": self.kwargs["product_pk"]}
 
     def get_permissions(self):
-        if self.action in ["update", "partial_update", "destroy"]:
-            # only allow Owner & Admin of the review to update or delete
-            return [IsOwnerOrAdmin()]
-        elif self.action == "create":
+        if self.action in ["create", "update", "partial_update", "destroy"]:
+            # get_queryset only returns the user's own reviews for these actions
             return [IsAuthenticated()]
         else:
             return [permissions.AllowAny()]
 
     def get_queryset(self):
         product_id = self.kwargs["product_pk"]
-        user_id = self.request.user.id
-        return Review.objects.select_related("product", "customer").filter(
-            product_id=product_id, customer__user_id=user_id
+        queryset = Review.objects.select_related("customer__user").filter(
+            product_id=product_id
         )
+        # everyone can read the reviews of a product
+        if self.action in ["list", "retrieve"] or self.request.user.is_staff:
+            return queryset
+        # only allow Owner & Admin of the review to update or delete
+        return queryset.filter(customer__user_id=self.request.user.id)
 
 
-class CustomerFavoriteViewSet(ViewSet):
+class CustomerFavoriteViewSet(ReplicaReadsMixin, ListModelMixin, GenericViewSet):
+    serializer_class = FavoriteProductSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FavoritePagination
 
-    def list(self, request):
-        customer = Customer.objects.get(user_id=self.request.user)
-        serializer = CustomerFavoriteProductSerializer(
-            customer, context={"request": request}
+    def get_queryset(self):
+        # resolve all the favorite products of a page with one query
+        # (plus one for their images) instead of one per GenericForeignKey
+        return FavoriteItem.objects.filter(
+            user_id=self.request.user.id,
+            content_type=ContentType.objects.get_for_model(Product),
+        ).prefetch_related(
+            GenericPrefetch(
+                "content_object",
+                [Product.objects.select_related("category").prefetch_related("images")],
+            )
         )
-        return Response(serializer.data)
 
 
 class CartItemViewSet(ModelViewSet):
@@ -195,20 +321,23 @@ class CartItemViewSet(ModelViewSet):
         # Updates/deletes require ownership check
         return [IsCartItemOwnerOrAdmin()]
 
+    @property
+    def throttle_scope(self):
+        return "cart" if self.request.method not in permissions.SAFE_METHODS else None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # a cart was just created for an anonymous user
+        token = getattr(request, "cart_token", None)
+        if token:
+            set_cart_token(response, token)
+        return response
+
     # define def get_queryset(self) so you can get the queryset
     # depending on if the user is authenticated or not
     def get_queryset(self):
-        request = self.request
-
-        if request.user.is_authenticated:
-            # get the cart from customer
-            customer = Customer.objects.filter(user=request.user).first()
-            cart = Cart.objects.filter(customer=customer).first()
-        else:
-            # get cart from session
-            cart_id = request.session.get("cart_id")
-            print(f'cart_id:: {cart_id}')
-            cart = Cart.objects.filter(pk=cart_id).first()
+        # customer's cart or the cart token's cart for anonymous users
+        cart = self.request.cart
 
         if cart:
             return CartItem.objects.select_related("product").filter(cart=cart)
@@ -217,18 +346,24 @@ class CartItemViewSet(ModelViewSet):
 
 
 class CartViewSet(ModelViewSet):
-    queryset = Cart.objects.all()
+    queryset = Cart.objects.prefetch_related("cart_items__product").all()
     serializer_class = CartSerializer
 
     def get_permissions(self):
         if self.action in ["list", "destroy"]:
             return [IsAdminUser()]
-        return [IsOwnerOrAdmin()]
-
-
-class OrderViewSet(ModelViewSet):
-    queryset = Order.objects.prefetch_related(
-        'items__product').prefetch_related('items__product__image').all()
+        return [IsCartOwnerOrAdmin()]
+
+
+class OrderViewSet(ReplicaReadsMixin, ModelViewSet):
+    # set to "checkout" by the create_order action
+    throttle_scope = None
+    # everything OrderSerializer renders for the items
+    items_prefetch = [
+        'items__product__category',
+        'items__product__images',
+    ]
+    queryset = Order.objects.prefetch_related(*items_prefetch).all()
     serializer_class = OrderSerializer
     pagination_class = CustomPagination
 
@@ -244,16 +379,24 @@ class OrderViewSet(ModelViewSet):
 
     def get_queryset(self):
         # check if the user is admin then get all orders
+        # newest first, store_order_customer_placed index
         if self.request.user.is_staff:
-            return Order.objects.select_related('customer').prefetch_related('items__product').all()
+            return Order.objects.select_related('customer').prefetch_related(*self.items_prefetch).order_by('-placed_at', '-id')
 
         # if the user is not admin only get his orders
-        customer_id = Customer.objects.only(
-            'id').get(user_id=self.request.user.id)
+        customer = self.request.customer
+        if not customer:
+            return Order.objects.none()
 
-        return Order.objects.prefetch_related('items__product').filter(customer_id=customer_id).all()
+        return Order.objects.prefetch_related(*self.items_prefetch).filter(customer=customer).order_by('-placed_at', '-id')
 
-    @action(detail=False, methods=['post'], serializer_class=CreateOrderSerializer, url_path='create-order')
+    @action(
+        detail=False,
+        methods=['post'],
+        serializer_class=CreateOrderSerializer,
+        url_path='create-order',
+        throttle_scope='checkout',
+    )
     def create_order(self, request, *args, **kwargs):
         # input serializer
         serializer = self.get_serializer(
@@ -261,11 +404,46 @@ class OrderViewSet(ModelViewSet):
                 'request': request,
             })
         order = serializer.save()
+        prefetch_related_objects([order], *self.items_prefetch)
         # output serializer
         order_serializer = OrderSerializer(order, context={'request': request})
         return Response(order_serializer.data, status=status.HTTP_201_CREATED)
 
 
+PRODUCT_IMAGES = ProductImage._meta.get_field("image").upload_to + "/"
+CUSTOMER_IMAGES = CustomerImage._meta.get_field("image").upload_to + "/"
+
+
+def get_media_user(request):
+    # browsers (admin thumbnails) have a session, api clients a token
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        result = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+@require_safe
+def media(request, path):
+    """
+    Product images are public, a customer image is only served to its
+    customer and to the staff (a 404 for the others, so its name isn't
+    confirmed). The bytes are sent by the front-end server, see core.media.
+    """
+    name = posixpath.normpath(path).lstrip("/")
+    if name.startswith(PRODUCT_IMAGES):
+        return sendfile(request, name)
+    if name.startswith(CUSTOMER_IMAGES):
+        user = get_media_user(request)
+        if user and (
+            user.is_staff
+            or CustomerImage.objects.filter(image=name, customer__user=user).exists()
+        ):
+            return sendfile(request, name, private=True)
+    raise Http404("No media matches the given path.")
+
 
 def test_redis():
     cache.set('test_key', 'test_value', 60)
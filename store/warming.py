@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+from django_redis import get_redis_connection
+from django_redis.cache import RedisCache
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+# Requests to the cached ProductViewSet pages are counted per hour in redis
+# sorted sets (one ZINCRBY per request), the last TRAFFIC_HOURS of them rank
+# the pages to pre-render after a deploy, a cache flush or a price update.
+TRAFFIC_KEY = "catalog:traffic:{kind}:{hour}"
+TRAFFIC_HOURS = 24
+# the list pages that are worth warming, a search or a price filter is not
+LIST_PARAMS = {"page", "category_id", "ordering"}
+LIST = "list"
+DETAIL = "detail"
+
+
+def get_hour(now=None):
+    return int((now or time.time()) // 3600)
+
+
+def has_redis():
+    return isinstance(caches["default"], RedisCache)
+
+
+def is_list_param_valid(name, value, ordering_fields):
+    # anything else is a page of its own (the view ignores an unknown
+    # ordering, accepts "1.0" as category 1), ranking junk urls by traffic
+    if name == "ordering":
+        return all(field.removeprefix("-") in ordering_fields for field in value.split(","))
+    return value.isdigit()
+
+
+def get_traffic_url(request, kind, ordering_fields=()):
+    """The url counted for a request, None when it shouldn't be warmed."""
+    params = request.GET
+    if kind == LIST:
+        if not set(params) <= LIST_PARAMS:
+            return None
+        if not all(is_list_param_valid(name, params[name], ordering_fields) for name in params):
+            return None
+        # one member per page whatever the order of the params
+        query = urlencode(sorted((name, params[name]) for name in params))
+    elif params:
+        return None
+    else:
+        query = ""
+    url = f"{request.scheme}://{request.get_host()}{request.path}"
+    return f"{url}?{query}" if query else url
+
+
+def record_hit(request, kind, ordering_fields=()):
+    url = get_traffic_url(request, kind, ordering_fields)
+    if url is None or getattr(request, "cache_warming", False):
+        return
+    key = TRAFFIC_KEY.format(kind=kind, hour=get_hour())
+    timeout = TRAFFIC_HOURS * 3600
+    cache = caches["default"]
+    if has_redis():
+        try:
+            # a single round trip
+            pipeline = get_redis_connection("default").pipeline(transaction=False)
+            key = cache.make_key(key)
+            pipeline.zincrby(key, 1, url)
+            pipeline.expire(key, timeout)
+            pipeline.execute()
+        except RedisError:
+            logger.warning("Could not record the catalog traffic", exc_info=True)
+        return
+    # without redis (tests, local dev), not atomic
+    counts = cache.get(key, {})
+    counts[url] = counts.get(url, 0) + 1
+    cache.set(key, counts, timeout)
+
+
+def get_top_urls(kind, count, hours=TRAFFIC_HOURS):
+    """The count most requested urls of the last hours, most requested first."""
+    if count <= 0:
+        return []
+    hour = get_hour()
+    keys = [TRAFFIC_KEY.format(kind=kind, hour=hour - index) for index in range(hours)]
+    cache = caches["default"]
+    if has_redis():
+        client = get_redis_connection("default")
+        keys = [cache.make_key(key) for key in keys]
+        total_key = cache.make_key(f"catalog:traffic:{kind}:total")
+        pipeline = client.pipeline()
+        pipeline.zunionstore(total_key, keys)
+        pipeline.zrevrange(total_key, 0, count - 1)
+        pipeline.delete(total_key)
+        _, urls, _ = pipeline.execute()
+        return [url.decode() for url in urls]
+    counts = Counter()
+    for hour_counts in cache.get_many(keys).values():
+        counts.update(hour_counts)
+    return [url for url, _ in counts.most_common(count)]
+
+
+class WarmRun:
+    def __init__(self):
+        self.warmed = 0
+        self.failed = []
+        self.duration = 0.0
+
+
+def warm_url(url):
+    """Render a url as an anonymous client would, returns its status code."""
+    parts = urlsplit(url)
+    match = resolve(parts.path)
+    request = RequestFactory().get(
+        f"{parts.path}?{parts.query}",
+        HTTP_HOST=parts.netloc,
+        secure=parts.scheme == "https",
+    )
+    request.user = AnonymousUser()
+    # not counted as traffic, see record_hit
+    request.cache_warming = True
+    response = match.func(request, *match.args, **match.kwargs)
+    response.close()
+    return response.status_code
+
+
+def warm_urls(urls, concurrency=4):
+    """
+    Render the urls through their views so their cached responses are built,
+    with at most concurrency renders (and database connections) at a time.
+    """
+    run = WarmRun()
+    pending = deque(urls)
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def work():
+        while True:
+            try:
+                url = pending.popleft()
+            except IndexError:
+                return
+            try:
+                status = warm_url(url)
+                error = None if status < 400 else f"status {status}"
+            except Resolver404:
+                error = "not found"
+            except Exception as exc:
+                logger.exception("Could not warm %s", url)
+                error = f"{type(exc).__name__}: {exc}"
+            with lock:
+                if error:
+                    run.failed.append((url, error))
+                else:
+                    run.warmed += 1
+
+    def worker():
+        try:
+            work()
+        finally:
+            # the thread's connections would only be closed when collected
+            connections.close_all()
+
+    if concurrency <= 1:
+        work()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(min(concurrency, len(pending)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    run.duration = time.perf_counter() - started
+    return run
+
+
+def warm_catalog_cache(pages=200, products=500, concurrency=4):
+    """Pre-render the most requested product list pages and product details."""
+    urls = get_top_urls(LIST, pages) + get_top_urls(DETAIL, products)
+    return warm_urls(urls, concurrency)